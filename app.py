@@ -6,10 +6,13 @@ from dotenv import load_dotenv
 from flask import Flask
 from werkzeug.security import generate_password_hash
 
+import refdata
+from audit import audit_sink
 from config import (  # ожидается: {"development": DevConfig, "production": ProdConfig, ...}
     config_map,
 )
 from extensions import db, login_manager, migrate
+from jobs import job_runner
 
 # =========================
 #  Загрузка .env и базовые настройки
@@ -57,6 +60,8 @@ def create_app() -> Flask:
     db.init_app(app)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    audit_sink.init_app(app)
+    job_runner.init_app(app)
     # страница логина задаётся в extensions.py (auth.login)
     login_manager.login_message = (
         None  # не показывать английское сообщение по умолчанию
@@ -104,6 +109,10 @@ def create_app() -> Flask:
     # Делает в Jinja доступной проверку наличия эндпойнта (для безопасного меню)
     app.jinja_env.globals["has_endpoint"] = lambda name: name in app.view_functions
 
+    # Наименования контрагентов из справочников в памяти (refdata.py)
+    app.jinja_env.globals["ref_name"] = refdata.ref_name
+    app.jinja_env.globals["counterparty"] = refdata.counterparty
+
     # =========================
     #  Flask-Login: user_loader
     # =========================
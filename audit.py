@@ -0,0 +1,177 @@
+# C:\tourismops\audit.py
+"""
+Журнал аудита с пакетной записью.
+
+Записи складываются в очередь процесса, а фоновый поток пишет их
+одним многострочным INSERT — по достижении AUDIT_BATCH_SIZE записей
+или раз в AUDIT_FLUSH_INTERVAL секунд. Запрос пользователя больше
+не платит отдельной транзакцией за каждую строку аудита.
+
+Если очередь отключена (AUDIT_ASYNC = False, тесты) или переполнена —
+запись идёт синхронно. При остановке процесса очередь дописывается.
+Если пакет не записался, строки пишутся по одной; те, что не записались
+и так, попадают в лог приложения уровня ERROR.
+"""
+
+import atexit
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from flask_login import current_user
+from sqlalchemy import insert
+
+from extensions import db
+
+_STOP = object()
+
+
+class AuditSink:
+    def __init__(self, app=None):
+        self._app = None
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._atexit = False
+        self._lock = threading.Lock()
+        self.enabled = False
+        self.batch_size = 100
+        self.interval = 2.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.enabled = app.config.get("AUDIT_ASYNC", True) and not app.testing
+        self.batch_size = int(app.config.get("AUDIT_BATCH_SIZE", 100))
+        self.interval = float(app.config.get("AUDIT_FLUSH_INTERVAL", 2.0))
+        self._queue = queue.Queue(maxsize=int(app.config.get("AUDIT_QUEUE_MAX", 10000)))
+        app.extensions["audit_sink"] = self
+        if not self._atexit:
+            atexit.register(self.shutdown)
+            self._atexit = True
+
+    # ---- API ---------------------------------------------------------------
+    def log(self, action: str, details: str = "", user_id=None):
+        entry = {
+            "user_id": user_id,
+            "action": action[:255],
+            "details": details or None,
+            "timestamp": datetime.utcnow(),
+        }
+        if self.enabled and self._ensure_thread():
+            try:
+                self._queue.put_nowait(entry)
+                return
+            except queue.Full:
+                pass
+        self._write([entry])  # синхронный запасной путь
+
+    def flush(self):
+        """Дописать всё, что лежит в очереди, в текущем потоке."""
+        if self._queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self):
+        thread = self._thread
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            self._queue.put(_STOP)
+            thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    # ---- внутреннее --------------------------------------------------------
+    def _ensure_thread(self) -> bool:
+        # после fork (gunicorn/pre-fork) поток родителя в дочернем процессе мёртв
+        if self._thread is not None and self._pid == os.getpid():
+            return self._thread.is_alive()
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-sink", daemon=True
+                )
+                self._thread.start()
+        return True
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                return
+
+    def _write(self, batch: list):
+        app = self._app
+        if app is None or not batch:
+            return
+        with app.app_context():
+            try:
+                self._insert(batch)
+                return
+            except Exception as exc:
+                app.logger.warning(
+                    "Аудит: пакет из %d строк не записан (%s), пишем построчно",
+                    len(batch),
+                    exc,
+                )
+            # одна битая строка не должна уносить с собой весь пакет
+            for entry in batch:
+                try:
+                    self._insert([entry])
+                except Exception as exc:
+                    app.logger.error(
+                        "Аудит: строка потеряна: %s %s user=%s details=%r: %s",
+                        entry["timestamp"].isoformat(),
+                        entry["action"],
+                        entry["user_id"],
+                        entry["details"],
+                        exc,
+                    )
+
+    @staticmethod
+    def _insert(rows: list):
+        from models import AuditLog
+
+        # отдельное соединение: не трогаем сессию запроса
+        with db.engine.begin() as conn:
+            conn.execute(insert(AuditLog.__table__), rows)
+
+
+audit_sink = AuditSink()
+
+
+def log_action(action: str, details: str = ""):
+    """Записать действие текущего пользователя в аудит (из любого блюпринта)."""
+    audit_sink.log(action, details, user_id=getattr(current_user, "id", None))
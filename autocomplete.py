@@ -0,0 +1,118 @@
+# C:\tourismops\autocomplete.py
+"""
+Автодополнение клиентов и поставщиков по индексу в памяти процесса.
+
+Индекс справочника — отсортированный список ключей с параллельным
+списком id: код (у клиента — 5 цифр) и поисковый ключ наименования
+(translit.name_key) начиная с каждого слова, так что «петр» находит
+«Иванов Пётр», а «ivanov pe» — «Иванов Пётр» целиком. Поиск по
+префиксу — два bisect по границам translit.prefix_range, без запросов
+к БД.
+
+Индекс строится лениво из справочника в памяти (refdata.py) и
+пересобирается, когда refdata перечитал справочник после его правки.
+"""
+
+import threading
+from bisect import bisect_left
+
+import refdata
+from translit import name_key, prefix_range
+
+KINDS = ("client", "supplier")
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+# сколько кандидатов просматривать на один запрос
+MAX_SCAN = 2000
+
+
+class _Index:
+    def __init__(self, source, keys: list, ids: list, items: dict):
+        self.source = source  # refdata.Directory, из которого построен индекс
+        self.keys = keys
+        self.ids = ids
+        self.items = items  # id → (код, наименование, ключ наименования)
+
+    def scan(self, prefix: str):
+        """id с ключом, начинающимся на prefix (не больше MAX_SCAN)."""
+        lo, hi = prefix_range(prefix)
+        start = bisect_left(self.keys, lo)
+        end = min(bisect_left(self.keys, hi, start), start + MAX_SCAN)
+        return self.ids[start:end]
+
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _build(source) -> _Index:
+    pairs, items = [], {}
+    for r in source.records.values():
+        key = name_key(r.name) or ""
+        items[r.id] = (r.code, r.name, key)
+        if r.code:
+            pairs.append((r.code.lower(), r.id))
+        words = key.split()
+        for i in range(len(words)):
+            pairs.append((" ".join(words[i:]), r.id))
+    pairs.sort()
+    return _Index(source, [k for k, _pk in pairs], [pk for _k, pk in pairs], items)
+
+
+def _index(kind: str) -> _Index:
+    source = refdata.directory(kind)
+    idx = _indexes.get(kind)
+    if idx is not None and idx.source is source:
+        return idx
+    with _lock:
+        idx = _indexes.get(kind)
+        if idx is None or idx.source is not source:
+            idx = _indexes[kind] = _build(source)
+    return idx
+
+
+def clear_cache(*kinds):
+    for kind in kinds or list(_indexes):
+        _indexes.pop(kind, None)
+
+
+def suggest(kind: str, text: str, limit: int = DEFAULT_LIMIT) -> list:
+    """
+    До limit записей справочника kind под строку text: сначала точное
+    совпадение кода, затем наименования, начинающиеся с text, затем
+    совпадения по любому слову; внутри — по наименованию.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    idx = _index(kind)
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    code = text.lower()
+    key = name_key(text) or ""
+    found = dict.fromkeys(idx.scan(code))
+    if key and key != code:
+        found.update(dict.fromkeys(idx.scan(key)))
+    words = key.split()
+    if len(found) < limit and len(words) > 1:
+        # слова в другом порядке: «петр иванов» → «Иванов Пётр»
+        for pk in idx.scan(max(words, key=len)):
+            name_words = idx.items[pk][2].split()
+            if all(any(nw.startswith(w) for nw in name_words) for w in words):
+                found[pk] = None
+
+    def rank(pk):
+        item_code, name, item_key = idx.items[pk]
+        if (item_code or "").lower() == code:
+            first = 0
+        elif key and item_key.startswith(key):
+            first = 1
+        else:
+            first = 2
+        return first, name.lower(), pk
+
+    return [
+        {"id": pk, "code": idx.items[pk][0], "name": idx.items[pk][1]}
+        for pk in sorted(found, key=rank)[:limit]
+    ]
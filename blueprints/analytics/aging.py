@@ -0,0 +1,378 @@
+# C:\tourismops\blueprints\analytics\aging.py
+"""
+Дебиторская задолженность клиентов по срокам (AR aging).
+
+Начисления — продажи клиенту: билеты (total_supplier на дату продажи) и
+туры (sale_price на дату заказа). Оплаты — приход кассы и входящие
+банковские платежи клиента. Всё в разрезе (клиент, валюта), без пересчёта
+курсов.
+
+Оплаты гасят самые старые начисления (FIFO). В БД это одна выборка с
+оконной функцией: нарастающий итог начислений клиента минус все его оплаты
+даёт непогашенный остаток каждого начисления, который раскладывается по
+корзинам 0–30 / 31–60 / 61–90 / 90+ дней от as_of.
+
+Результат кэшируется по дате as_of (ArAgingSnapshot / ArAgingLine).
+Изменение журналов помечает клиента устаревшим во всех снимках с as_of не
+раньше даты операции; при чтении пересчитываются только такие клиенты.
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import (
+    Date,
+    and_,
+    bindparam,
+    case,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    type_coerce,
+    union_all,
+)
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from incremental import FlushTracker
+from models import (
+    ArAgingLine,
+    ArAgingSnapshot,
+    BankOperation,
+    CashOperation,
+    ExternalTour,
+    InternalTour,
+    TicketSale,
+)
+
+BUCKETS = ("days_0_30", "days_31_60", "days_61_90", "days_90_plus")
+BUCKET_LABELS = {
+    "days_0_30": "0–30",
+    "days_31_60": "31–60",
+    "days_61_90": "61–90",
+    "days_90_plus": "90+",
+}
+ZERO = Decimal("0.00")
+# сколько дат as_of держать в кэше
+MAX_SNAPSHOTS = 24
+
+_ZERO_SQL = literal_column("0")
+
+
+def _day(dt_col):
+    return type_coerce(func.date(dt_col), Date)
+
+
+# журнал → (номер для ключа сортировки, сумма, дата операции, доп. условие)
+CHARGES = {
+    TicketSale: (
+        1,
+        TicketSale.total_supplier,
+        func.coalesce(TicketSale.sale_date, _day(TicketSale.created_at)),
+        None,
+    ),
+    InternalTour: (2, InternalTour.sale_price, _day(InternalTour.created_at), None),
+    ExternalTour: (3, ExternalTour.sale_price, _day(ExternalTour.created_at), None),
+}
+PAYMENTS = {
+    CashOperation: (
+        CashOperation.amount,
+        _day(CashOperation.created_at),
+        CashOperation.op_type == "income",
+    ),
+    BankOperation: (
+        BankOperation.amount,
+        func.coalesce(BankOperation.value_date, _day(BankOperation.created_at)),
+        BankOperation.op_type == "incoming",
+    ),
+}
+# поля, от которых зависит задолженность (правка прочих кэш не трогает)
+_RELEVANT = {
+    TicketSale: {"client_id", "currency", "total_supplier", "sale_date", "created_at"},
+    InternalTour: {"client_id", "currency", "sale_price", "created_at"},
+    ExternalTour: {"client_id", "currency", "sale_price", "created_at"},
+    CashOperation: {"client_id", "currency", "amount", "op_type", "created_at"},
+    BankOperation: {
+        "client_id",
+        "currency",
+        "amount",
+        "op_type",
+        "value_date",
+        "created_at",
+    },
+}
+
+
+@dataclass
+class AgingReport:
+    as_of: date
+    lines: list
+    computed_at: datetime | None = None
+    recomputed: int = 0  # клиентов пересчитано при этом чтении
+
+
+# ---- расчёт ----------------------------------------------------------------
+def _charges(as_of: date, client_ids=None):
+    parts = []
+    for model, (no, amount, day, extra) in CHARGES.items():
+        q = select(
+            model.client_id.label("client_id"),
+            model.currency.label("currency"),
+            day.label("day"),
+            (model.id * 4 + no).label("seq"),
+            amount.label("amount"),
+        ).where(model.client_id.isnot(None), amount.isnot(None), day <= as_of)
+        if extra is not None:
+            q = q.where(extra)
+        if client_ids is not None:
+            q = q.where(model.client_id.in_(client_ids))
+        parts.append(q)
+    return union_all(*parts).subquery("charges")
+
+
+def _payments(as_of: date, client_ids=None):
+    parts = []
+    for model, (amount, day, extra) in PAYMENTS.items():
+        q = select(
+            model.client_id.label("client_id"),
+            model.currency.label("currency"),
+            amount.label("amount"),
+        ).where(model.client_id.isnot(None), extra, day <= as_of)
+        if client_ids is not None:
+            q = q.where(model.client_id.in_(client_ids))
+        parts.append(q)
+    u = union_all(*parts).subquery("payments")
+    return (
+        select(u.c.client_id, u.c.currency, func.sum(u.c.amount).label("paid"))
+        .group_by(u.c.client_id, u.c.currency)
+        .subquery("paid")
+    )
+
+
+def compute(as_of: date, client_ids=None) -> list:
+    """
+    Строки задолженности на as_of: [{client_id, currency, sales, paid,
+    корзины…, advance}] для всех клиентов или только client_ids.
+    """
+    c = _charges(as_of, client_ids)
+    cum = func.sum(c.c.amount).over(
+        partition_by=(c.c.client_id, c.c.currency), order_by=(c.c.day, c.c.seq)
+    )
+    numbered = select(c, cum.label("cum")).subquery("numbered")
+    n = numbered.c
+    paid = _payments(as_of, client_ids)
+
+    # непогашенная часть начисления: нарастающий итог сверх всех оплат
+    left = n.cum - func.coalesce(paid.c.paid, _ZERO_SQL)
+    remaining = case(
+        (left <= _ZERO_SQL, _ZERO_SQL), (left >= n.amount, n.amount), else_=left
+    )
+    d30, d60, d90 = (as_of - timedelta(days=k) for k in (30, 60, 90))
+    bounds = {
+        "days_0_30": n.day >= d30,
+        "days_31_60": and_(n.day < d30, n.day >= d60),
+        "days_61_90": and_(n.day < d60, n.day >= d90),
+        "days_90_plus": n.day < d90,
+    }
+    stmt = (
+        select(
+            n.client_id,
+            n.currency,
+            func.sum(n.amount).label("sales"),
+            func.max(func.coalesce(paid.c.paid, _ZERO_SQL)).label("paid"),
+            *(
+                func.sum(case((cond, remaining), else_=_ZERO_SQL)).label(name)
+                for name, cond in bounds.items()
+            ),
+        )
+        .select_from(
+            numbered.outerjoin(
+                paid,
+                and_(paid.c.client_id == n.client_id, paid.c.currency == n.currency),
+            )
+        )
+        .group_by(n.client_id, n.currency)
+    )
+
+    lines = {}
+    for row in db.session.execute(stmt):
+        line = {k: row._mapping[k] for k in ("client_id", "currency")}
+        for k in ("sales", "paid") + BUCKETS:
+            line[k] = Decimal(row._mapping[k] or 0).quantize(ZERO)
+        line["advance"] = max(ZERO, line["paid"] - line["sales"])
+        lines[(line["client_id"], line["currency"])] = line
+    # только оплаты, без начислений — целиком аванс
+    for client_id, currency, total in db.session.execute(select(paid)):
+        if (client_id, currency) not in lines:
+            total = Decimal(total or 0).quantize(ZERO)
+            lines[(client_id, currency)] = dict(
+                client_id=client_id,
+                currency=currency,
+                sales=ZERO,
+                paid=total,
+                advance=max(ZERO, total),
+                **{k: ZERO for k in BUCKETS},
+            )
+    return [
+        line
+        for _key, line in sorted(lines.items())
+        if any(line[k] for k in BUCKETS) or line["advance"]
+    ]
+
+
+# ---- кэш -------------------------------------------------------------------
+def _store(as_of: date, lines: list, client_ids=None):
+    t = ArAgingLine.__table__
+    q = delete(t).where(t.c.as_of == as_of)
+    if client_ids is not None:
+        q = q.where(t.c.client_id.in_(client_ids))
+    db.session.execute(q)
+    rows = [dict(line, as_of=as_of, stale=False) for line in lines]
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(t), rows[i : i + 1000])
+
+
+def _prune():
+    keep = (
+        select(ArAgingSnapshot.as_of)
+        .order_by(ArAgingSnapshot.computed_at.desc())
+        .limit(MAX_SNAPSHOTS)
+    )
+    old = [
+        d
+        for (d,) in db.session.execute(
+            select(ArAgingSnapshot.as_of).where(
+                ArAgingSnapshot.as_of.notin_(keep.scalar_subquery())
+            )
+        )
+    ]
+    if old:
+        db.session.execute(delete(ArAgingLine).where(ArAgingLine.as_of.in_(old)))
+        db.session.execute(
+            delete(ArAgingSnapshot).where(ArAgingSnapshot.as_of.in_(old))
+        )
+
+
+def report(as_of: date, refresh: bool = False) -> AgingReport:
+    """Дебиторка на as_of из кэша; недостающее/устаревшее пересчитывается."""
+    snap = db.session.execute(
+        select(ArAgingSnapshot).where(ArAgingSnapshot.as_of == as_of)
+    ).scalar_one_or_none()
+    recomputed = 0
+    try:
+        if snap is None or refresh:
+            lines = compute(as_of)
+            _store(as_of, lines)
+            if snap is None:
+                snap = ArAgingSnapshot(as_of=as_of)
+                db.session.add(snap)
+            snap.computed_at = datetime.utcnow()
+            _prune()
+            recomputed = len({line["client_id"] for line in lines})
+            db.session.commit()
+        else:
+            stale = [
+                cid
+                for (cid,) in db.session.execute(
+                    select(ArAgingLine.client_id)
+                    .where(ArAgingLine.as_of == as_of, ArAgingLine.stale.is_(True))
+                    .distinct()
+                )
+            ]
+            if stale:
+                _store(as_of, compute(as_of, stale), stale)
+                snap.computed_at = datetime.utcnow()
+                recomputed = len(stale)
+                db.session.commit()
+    except IntegrityError:
+        # параллельный запрос успел записать тот же снимок — читаем его
+        db.session.rollback()
+        snap = db.session.execute(
+            select(ArAgingSnapshot).where(ArAgingSnapshot.as_of == as_of)
+        ).scalar_one_or_none()
+
+    lines = (
+        ArAgingLine.query.filter_by(as_of=as_of, stale=False)
+        .order_by(ArAgingLine.currency, ArAgingLine.client_id)
+        .all()
+    )
+    return AgingReport(
+        as_of=as_of,
+        lines=lines,
+        computed_at=snap.computed_at if snap else None,
+        recomputed=recomputed,
+    )
+
+
+# ---- инвалидация при изменении журналов ------------------------------------
+def _day_of(values: dict) -> date:
+    """Дата операции журнала, как в CHARGES / PAYMENTS."""
+    day = values.get("sale_date") or values.get("value_date")
+    if day is None:
+        created_at = values["created_at"]
+        day = created_at.date() if created_at else date.min
+    return day
+
+
+def _touch_row(touched, model, values, sign):
+    # прежняя и новая версии строки помечают своего клиента одинаково
+    touch(touched, values["client_id"], _day_of(values))
+
+
+def touch(touched: dict, client_id, day: date):
+    """Запомнить самую раннюю дату изменения журналов клиента."""
+    if client_id is not None:
+        touched[client_id] = min(day, touched.get(client_id, date.max))
+
+
+def invalidate(conn, touched: dict):
+    """
+    Пометить устаревшими клиентов во всех снимках с as_of >= даты изменения.
+    touched: {client_id: самая ранняя дата}. Массовые загрузки (executemany
+    мимо ORM) вызывают это сами перед commit.
+    """
+    if not touched:
+        return
+    snaps = [
+        d
+        for (d,) in conn.execute(
+            select(ArAgingSnapshot.as_of).where(
+                ArAgingSnapshot.as_of >= min(touched.values())
+            )
+        )
+    ]
+    marks = [
+        {"as_of": s, "client_id": cid}
+        for s in snaps
+        for cid, since in touched.items()
+        if s >= since
+    ]
+    if not marks:
+        return
+    t = ArAgingLine.__table__
+    conn.execute(
+        delete(t).where(
+            t.c.as_of == bindparam("as_of"),
+            t.c.client_id == bindparam("client_id"),
+        ),
+        marks,
+    )
+    conn.execute(
+        insert(t),
+        [
+            dict(m, currency="", stale=True, sales=0, paid=0, advance=0)
+            | {k: 0 for k in BUCKETS}
+            for m in marks
+        ],
+    )
+
+
+FlushTracker(
+    "ar",
+    {model: sorted(fields) for model, fields in _RELEVANT.items()},
+    _touch_row,
+    invalidate,
+)
@@ -1,10 +1,51 @@
-from flask import render_template
-from flask_login import login_required
+from datetime import date
 
-from . import bp
+from flask import render_template, request
+from flask_login import current_user, login_required
+
+import refdata
+from security import ROLE, roles_required
+
+from . import aging, bp
 
 
 @bp.route("/ar-aging")
 @login_required
+@roles_required(ROLE["ACCOUNTANT"], ROLE["FINANCIER"], ROLE["EXEC"], ROLE["ADMIN"])
 def ar_aging():
-    return render_template("analytics/ar_aging.html")
+    """
+    Дебиторка клиентов по срокам на ?as_of=YYYY-MM-DD (по умолчанию сегодня).
+    ?refresh=1 — пересчитать снимок целиком (админ/руководство).
+    """
+    try:
+        as_of = date.fromisoformat(request.args.get("as_of") or "")
+    except ValueError:
+        as_of = date.today()
+    refresh = request.args.get("refresh") == "1" and current_user.role in (
+        ROLE["ADMIN"],
+        ROLE["EXEC"],
+    )
+    currency = (request.args.get("currency") or "").strip().upper()
+
+    rep = aging.report(as_of, refresh=refresh)
+    lines = [ln for ln in rep.lines if not currency or ln.currency == currency]
+
+    totals = {}
+    for ln in lines:
+        acc = totals.setdefault(
+            ln.currency, dict.fromkeys(aging.BUCKETS + ("advance",), 0)
+        )
+        for k in acc:
+            acc[k] += getattr(ln, k)
+
+    return render_template(
+        "analytics/ar_aging.html",
+        report=rep,
+        lines=lines,
+        clients=refdata.records("client"),
+        totals=totals,
+        buckets=aging.BUCKETS,
+        labels=aging.BUCKET_LABELS,
+        currency=currency,
+        currencies=sorted({ln.currency for ln in rep.lines}),
+    )
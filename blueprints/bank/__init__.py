@@ -1,4 +1,4 @@
 from flask import Blueprint
 
 bp = Blueprint("bank", __name__)
-from . import routes  # noqa
+from . import api, routes  # noqa
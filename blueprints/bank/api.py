@@ -0,0 +1,182 @@
+# C:\tourismops\blueprints\bank\api.py
+"""
+JSON API банковского журнала для казначейского дашборда.
+
+GET /bank/api/operations
+  ?type=incoming|outgoing&currency=USD&from=YYYY-MM-DD&to=YYYY-MM-DD
+  &client_id=N&supplier_id=N&fields=id,amount,currency&per_page=N
+  &after=<курсор>|before=<курсор>
+
+Страницы — keyset по (created_at, id). ETag строится по значениям
+выбранных колонок строк окна и параметрам запроса, поэтому при
+If-None-Match с тем же значением ответ 304 отдаётся до сериализации
+страницы.
+"""
+
+import hashlib
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import Response, jsonify, request
+from flask_login import login_required
+
+from models import BankOperation
+from pagination import keyset_paginate, page_url, per_page_arg
+from security import ROLE, roles_required
+
+from . import bp
+
+# имя поля в ответе → колонка
+FIELDS = {
+    "id": BankOperation.id,
+    "created_at": BankOperation.created_at,
+    "value_date": BankOperation.value_date,
+    "doc_number": BankOperation.doc_number,
+    "type": BankOperation.op_type,
+    "amount": BankOperation.amount,
+    "currency": BankOperation.currency,
+    "rate": BankOperation.rate,
+    "description": BankOperation.description,
+    "client_id": BankOperation.client_id,
+    "supplier_id": BankOperation.supplier_id,
+    "user_id": BankOperation.user_id,
+}
+
+OP_TYPES = ("incoming", "outgoing")
+
+
+class _BadRequest(ValueError):
+    pass
+
+
+def _date_arg(name: str):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(raw, "%Y-%m-%d").date()
+    except ValueError:
+        raise _BadRequest(f"{name}: ожидается YYYY-MM-DD")
+
+
+def _int_arg(name: str):
+    raw = request.args.get(name)
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise _BadRequest(f"{name}: ожидается целое число")
+
+
+def _fields_arg() -> list:
+    raw = request.args.get("fields")
+    if not raw:
+        return list(FIELDS)
+    names = [n.strip() for n in raw.split(",") if n.strip()]
+    unknown = [n for n in names if n not in FIELDS]
+    if unknown:
+        raise _BadRequest(f"fields: неизвестные поля {', '.join(unknown)}")
+    return names
+
+
+def _apply_filters(q):
+    """
+    Фильтры по query-параметрам; from/to — по дате валютирования.
+    """
+    kind = request.args.get("type")
+    if kind:
+        if kind not in OP_TYPES:
+            raise _BadRequest("type: ожидается incoming|outgoing")
+        q = q.filter(BankOperation.op_type == kind)
+
+    curr = request.args.get("currency")
+    if curr:
+        q = q.filter(BankOperation.currency == curr.upper())
+
+    fdate, tdate = _date_arg("from"), _date_arg("to")
+    if fdate:
+        q = q.filter(BankOperation.value_date >= fdate)
+    if tdate:
+        q = q.filter(BankOperation.value_date <= tdate)
+
+    client_id, supplier_id = _int_arg("client_id"), _int_arg("supplier_id")
+    if client_id is not None:
+        q = q.filter(BankOperation.client_id == client_id)
+    if supplier_id is not None:
+        q = q.filter(BankOperation.supplier_id == supplier_id)
+    return q
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _window_etag(rows) -> str:
+    """
+    ETag окна: параметры запроса + значения уже выбранных колонок строк,
+    поэтому правка суммы, описания или даты валютирования меняет ETag.
+    """
+    h = hashlib.sha1(request.query_string)
+    for row in rows:
+        h.update("\x1f".join(map(str, row)).encode())
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+@bp.route("/api/operations")
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def api_operations():
+    try:
+        fields = _fields_arg()
+        q = _apply_filters(BankOperation.query)
+    except _BadRequest as exc:
+        return jsonify(error=str(exc)), 400
+
+    # ключи пагинации и ETag нужны всегда, даже если их нет в fields
+    columns = {name: FIELDS[name] for name in fields}
+    columns.setdefault("id", BankOperation.id)
+    columns.setdefault("created_at", BankOperation.created_at)
+    q = q.with_entities(*(col.label(name) for name, col in columns.items()))
+
+    page = keyset_paginate(
+        q,
+        BankOperation.created_at,
+        BankOperation.id,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg(),
+    )
+
+    etag = _window_etag(page.items)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+        resp.set_etag(etag)
+        return resp
+
+    resp = jsonify(
+        items=[
+            {name: _json_value(getattr(row, name)) for name in fields}
+            for row in page.items
+        ],
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+        next_url=(
+            page_url("bank.api_operations", after=page.next_cursor)
+            if page.has_next
+            else None
+        ),
+        prev_url=(
+            page_url("bank.api_operations", before=page.prev_cursor)
+            if page.has_prev
+            else None
+        ),
+    )
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
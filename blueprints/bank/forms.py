@@ -0,0 +1,27 @@
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
+from wtforms import DateField, IntegerField, SelectField
+from wtforms.validators import DataRequired, NumberRange
+
+from .reconcile import DEFAULT_TOLERANCE_DAYS
+
+STATEMENT_FORMAT_CHOICES = [
+    ("", "Определить по расширению"),
+    ("csv", "CSV"),
+    ("mt940", "MT940"),
+]
+
+
+class StatementImportForm(FlaskForm):
+    file = FileField("Файл выписки", validators=[FileRequired()])
+    fmt = SelectField("Формат", choices=STATEMENT_FORMAT_CHOICES, default="")
+
+
+class ReconcileForm(FlaskForm):
+    date_from = DateField("С", validators=[DataRequired()])
+    date_to = DateField("По", validators=[DataRequired()])
+    tolerance = IntegerField(
+        "Допуск, дней",
+        default=DEFAULT_TOLERANCE_DAYS,
+        validators=[NumberRange(min=0, max=31)],
+    )
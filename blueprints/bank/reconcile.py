@@ -0,0 +1,248 @@
+# C:\tourismops\blueprints\bank\reconcile.py
+"""
+Сверка банковских списаний с учётом: TicketSale.total_supplier и
+себестоимостью туров (InternalTour / ExternalTour.cost).
+
+Кандидаты за окно дат загружаются один раз, по ним строятся хэш-индексы
+по номеру документа (номер билета / заказа) и по (сумма, валюта), после
+чего каждая банковская строка сопоставляется за O(1) в среднем вместо
+перебора всех пар. Результат сохраняется в BankMatch.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, delete, insert, or_, select
+
+from extensions import db
+from models import BankMatch, BankOperation, ExternalTour, InternalTour, TicketSale
+
+DEFAULT_TOLERANCE_DAYS = 3
+CENT = Decimal("0.01")
+
+# тип учёта → (модель, колонка суммы, колонка даты, колонки-референсы)
+LEDGERS = {
+    "ticket": (
+        TicketSale,
+        TicketSale.total_supplier,
+        TicketSale.sale_date,
+        (TicketSale.ticket_number, TicketSale.order_number),
+    ),
+    "internal_tour": (InternalTour, InternalTour.cost, InternalTour.start_date, ()),
+    "external_tour": (ExternalTour, ExternalTour.cost, ExternalTour.start_date, ()),
+}
+
+
+@dataclass
+class LedgerEntry:
+    ledger_type: str
+    id: int
+    amount: Decimal
+    currency: str
+    day: date
+    supplier_id: int | None
+    refs: tuple = ()
+    taken: bool = False
+
+
+@dataclass
+class ReconcileResult:
+    matched: list = field(
+        default_factory=list
+    )  # [(BankOperation, LedgerEntry, method)]
+    ambiguous: list = field(default_factory=list)  # [(BankOperation, [LedgerEntry])]
+    unmatched_bank: list = field(default_factory=list)  # [BankOperation]
+    unmatched_ledger: list = field(default_factory=list)  # [LedgerEntry]
+
+
+def _norm_amount(value) -> Decimal:
+    return Decimal(value or 0).quantize(CENT)
+
+
+def _norm_ref(value) -> str:
+    return "".join(ch for ch in str(value or "") if ch.isalnum()).upper()
+
+
+# ---- загрузка кандидатов ---------------------------------------------------
+def _load_ledgers(lo: date, hi: date) -> list:
+    entries = []
+    for ledger_type, (model, amount_col, date_col, ref_cols) in LEDGERS.items():
+        rows = db.session.execute(
+            select(
+                model.id,
+                amount_col,
+                model.currency,
+                date_col,
+                model.supplier_id,
+                *ref_cols,
+            ).where(date_col.between(lo, hi), amount_col.isnot(None))
+        )
+        for row in rows:
+            entries.append(
+                LedgerEntry(
+                    ledger_type=ledger_type,
+                    id=row[0],
+                    amount=_norm_amount(row[1]),
+                    currency=row[2],
+                    day=row[3],
+                    supplier_id=row[4],
+                    refs=tuple(_norm_ref(r) for r in row[5:] if r),
+                )
+            )
+    return entries
+
+
+def _taken_outside(date_from: date, date_to: date, tolerance: int) -> set:
+    """
+    Строки учёта, уже сопоставленные банковским операциям вне окна.
+    Достаточно смотреть на полосу шириной 2*tolerance по краям окна.
+    """
+    t, b = BankMatch.__table__, BankOperation.__table__
+    pad = timedelta(days=2 * tolerance)
+    rows = db.session.execute(
+        select(t.c.ledger_type, t.c.ledger_id)
+        .join(b, b.c.id == t.c.bank_operation_id)
+        .where(
+            t.c.status == "matched",
+            or_(
+                and_(b.c.value_date >= date_from - pad, b.c.value_date < date_from),
+                and_(b.c.value_date > date_to, b.c.value_date <= date_to + pad),
+            ),
+        )
+    )
+    return {(r[0], r[1]) for r in rows}
+
+
+# ---- сопоставление ---------------------------------------------------------
+def _fits(e: LedgerEntry, op, amount: Decimal, tolerance: int) -> bool:
+    return (
+        not e.taken
+        and e.amount == amount
+        and e.currency == op.currency
+        and abs((e.day - op.value_date).days) <= tolerance
+    )
+
+
+def reconcile(
+    date_from: date,
+    date_to: date,
+    tolerance: int = DEFAULT_TOLERANCE_DAYS,
+    persist: bool = True,
+) -> ReconcileResult:
+    """Сверить исходящие банковские операции с value_date в [date_from, date_to]."""
+    pad = timedelta(days=tolerance)
+    bank_ops = (
+        BankOperation.query.filter(
+            BankOperation.op_type == "outgoing",
+            BankOperation.value_date.between(date_from, date_to),
+        )
+        .order_by(BankOperation.value_date, BankOperation.id)
+        .all()
+    )
+
+    taken = _taken_outside(date_from, date_to, tolerance)
+    ledger = [
+        e
+        for e in _load_ledgers(date_from - pad, date_to + pad)
+        if (e.ledger_type, e.id) not in taken
+    ]
+
+    # хэш-индексы
+    by_ref = defaultdict(list)
+    by_amount = defaultdict(list)
+    for e in ledger:
+        by_amount[(e.amount, e.currency)].append(e)
+        for ref in e.refs:
+            by_ref[ref].append(e)
+
+    result = ReconcileResult()
+    for op in bank_ops:
+        amount = _norm_amount(op.amount)
+        method = "doc_number"
+        cands = [
+            e
+            for e in by_ref.get(_norm_ref(op.doc_number), [])
+            if _fits(e, op, amount, tolerance)
+        ]
+        if not cands:
+            method = "amount"
+            cands = [
+                e
+                for e in by_amount.get((amount, op.currency), [])
+                if _fits(e, op, amount, tolerance)
+            ]
+            if op.supplier_id and len(cands) > 1:
+                same = [e for e in cands if e.supplier_id == op.supplier_id]
+                cands = same or cands
+
+        if not cands:
+            result.unmatched_bank.append(op)
+        elif len(cands) == 1:
+            cands[0].taken = True
+            result.matched.append((op, cands[0], method))
+        else:
+            result.ambiguous.append((op, cands))
+
+    result.unmatched_ledger = [
+        e for e in ledger if not e.taken and date_from <= e.day <= date_to
+    ]
+
+    if persist:
+        _save(bank_ops, result)
+    return result
+
+
+def _save(bank_ops: list, result: ReconcileResult):
+    t = BankMatch.__table__
+    ids = [op.id for op in bank_ops]
+    for i in range(0, len(ids), 1000):
+        db.session.execute(
+            delete(t).where(t.c.bank_operation_id.in_(ids[i : i + 1000]))
+        )
+
+    now = datetime.utcnow()
+    rows = []
+    for op, e, method in result.matched:
+        rows.append(
+            {
+                "bank_operation_id": op.id,
+                "status": "matched",
+                "ledger_type": e.ledger_type,
+                "ledger_id": e.id,
+                "method": method,
+                "day_diff": (e.day - op.value_date).days,
+                "candidates": None,
+                "created_at": now,
+            }
+        )
+    for op, cands in result.ambiguous:
+        rows.append(
+            {
+                "bank_operation_id": op.id,
+                "status": "ambiguous",
+                "ledger_type": None,
+                "ledger_id": None,
+                "method": None,
+                "day_diff": None,
+                "candidates": ",".join(f"{e.ledger_type}:{e.id}" for e in cands[:50]),
+                "created_at": now,
+            }
+        )
+    for op in result.unmatched_bank:
+        rows.append(
+            {
+                "bank_operation_id": op.id,
+                "status": "unmatched",
+                "ledger_type": None,
+                "ledger_id": None,
+                "method": None,
+                "day_diff": None,
+                "candidates": None,
+                "created_at": now,
+            }
+        )
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(t), rows[i : i + 1000])
+    db.session.commit()
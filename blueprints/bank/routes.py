@@ -1,10 +1,14 @@
-from flask import render_template
-from flask_login import login_required
+from flask import flash, render_template
+from flask_login import current_user, login_required
 
+from audit import log_action
 from models import BankOperation
-from security import ROLE, roles_required
+from security import ROLE, read_only_for, roles_required
 
 from . import bp
+from .forms import ReconcileForm, StatementImportForm
+from .reconcile import reconcile as run_reconcile
+from .statements import StatementError, import_file
 
 
 @bp.route("/")
@@ -12,6 +16,64 @@ from . import bp
 @roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def list_ops():
     items = (
-        BankOperation.query.order_by(BankOperation.timestamp.desc()).limit(200).all()
+        BankOperation.query.order_by(BankOperation.created_at.desc()).limit(200).all()
     )
     return render_template("bank/list.html", items=items)
+
+
+@bp.route("/import", methods=["GET", "POST"])
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["ADMIN"])
+@read_only_for(ROLE["CURATOR"])
+def import_statement():
+    form = StatementImportForm()
+    result = None
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            result = import_file(
+                upload.stream,
+                upload.filename or "",
+                current_user.id,
+                fmt=form.fmt.data or None,
+            )
+        except StatementError as exc:
+            flash(str(exc), "danger")
+        else:
+            log_action(
+                "bank:import",
+                f"file={upload.filename} new={result.inserted} "
+                f"dup={result.duplicates} errors={result.error_count}",
+            )
+            flash(
+                f"Новых операций: {result.inserted}, уже загружено ранее: {result.duplicates}",
+                "success",
+            )
+
+    return render_template("bank/import.html", form=form, result=result)
+
+
+@bp.route("/reconcile", methods=["GET", "POST"])
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["ADMIN"])
+@read_only_for(ROLE["CURATOR"])
+def reconcile():
+    form = ReconcileForm()
+    result = None
+
+    if form.validate_on_submit():
+        if form.date_from.data > form.date_to.data:
+            flash("Начало периода позже конца", "danger")
+        else:
+            result = run_reconcile(
+                form.date_from.data, form.date_to.data, form.tolerance.data or 0
+            )
+            log_action(
+                "bank:reconcile",
+                f"{form.date_from.data}..{form.date_to.data} "
+                f"matched={len(result.matched)} ambiguous={len(result.ambiguous)} "
+                f"unmatched={len(result.unmatched_bank)}",
+            )
+
+    return render_template("bank/reconcile.html", form=form, result=result)
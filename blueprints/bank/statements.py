@@ -0,0 +1,389 @@
+# C:\tourismops\blueprints\bank\statements.py
+"""
+Загрузка банковских выписок (CSV и MT940) в BankOperation.
+
+Выписка читается потоком и обрабатывается пачками. Для каждой пачки
+из индекса (value_date, doc_number) догружается множество уже
+известных документов за её диапазон дат, и в БД уходят только новые
+строки — одним executemany. Повторная загрузка той же выписки ничего
+не добавляет.
+"""
+
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert, select
+
+import refdata
+import search
+from blueprints.analytics import aging
+from blueprints.core import dashboard
+from extensions import db
+from models import BankOperation
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+_CURRENCY = re.compile(r"^[A-Z]{3}$")
+
+# заголовок CSV → поле
+COLUMNS = {
+    "date": "value_date",
+    "value_date": "value_date",
+    "дата": "value_date",
+    "дата валютирования": "value_date",
+    "doc_number": "doc_number",
+    "document": "doc_number",
+    "номер документа": "doc_number",
+    "№ документа": "doc_number",
+    "type": "op_type",
+    "тип": "op_type",
+    "amount": "amount",
+    "сумма": "amount",
+    "debit": "debit",
+    "дебет": "debit",
+    "credit": "credit",
+    "кредит": "credit",
+    "currency": "currency",
+    "валюта": "currency",
+    "description": "description",
+    "назначение платежа": "description",
+    "описание": "description",
+    "client": "client_code",
+    "код клиента": "client_code",
+    "supplier": "supplier_code",
+    "код поставщика": "supplier_code",
+}
+
+OP_TYPES = {
+    "incoming": "incoming",
+    "in": "incoming",
+    "c": "incoming",
+    "credit": "incoming",
+    "приход": "incoming",
+    "поступление": "incoming",
+    "outgoing": "outgoing",
+    "out": "outgoing",
+    "d": "outgoing",
+    "debit": "outgoing",
+    "расход": "outgoing",
+    "списание": "outgoing",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%Y%m%d")
+
+
+class StatementError(Exception):
+    """Выписку нельзя разобрать целиком (формат, заголовок)."""
+
+
+@dataclass
+class StatementResult:
+    total: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    errors: list = field(default_factory=list)  # [(номер строки, сообщение)]
+    error_count: int = 0
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# ---- разбор значений -------------------------------------------------------
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _parse_date(value) -> date:
+    raw = _text(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw[:10], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"неверная дата «{raw}»")
+
+
+def _parse_amount(value) -> Decimal:
+    raw = _text(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+    try:
+        return Decimal(raw)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"сумма: не число «{_text(value)}»")
+
+
+# ---- CSV -------------------------------------------------------------------
+def iter_csv(stream):
+    """
+    (номер строки, запись) из CSV. Тип — колонкой «Тип» либо парой
+    колонок «Дебет»/«Кредит»; без них знак суммы задаёт направление.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    mapping = [COLUMNS.get(_text(h).lower()) for h in header]
+    if "value_date" not in mapping or "doc_number" not in mapping:
+        raise StatementError("В выписке нужны колонки «Дата» и «Номер документа»")
+    if "amount" not in mapping and not {"debit", "credit"} & set(mapping):
+        raise StatementError("В выписке нет колонки суммы")
+
+    for line, values in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not any(_text(v) for v in values):
+            continue
+        data = {name: v for name, v in zip(mapping, values) if name}
+        try:
+            yield line, _csv_record(data)
+        except ValueError as exc:
+            yield line, exc
+
+
+def _csv_record(data: dict) -> dict:
+    if _text(data.get("debit")) or _text(data.get("credit")):
+        if _text(data.get("credit")):
+            amount, op_type = _parse_amount(data["credit"]), "incoming"
+        else:
+            amount, op_type = _parse_amount(data["debit"]), "outgoing"
+    else:
+        if not _text(data.get("amount")):
+            raise ValueError("сумма: обязательное поле")
+        amount = _parse_amount(data["amount"])
+        op_type = OP_TYPES.get(_text(data.get("op_type")).lower())
+        if op_type is None:
+            if _text(data.get("op_type")):
+                raise ValueError(f"тип: «{_text(data['op_type'])}» не распознан")
+            op_type = "incoming" if amount >= 0 else "outgoing"
+
+    doc_number = _text(data.get("doc_number"))
+    if not doc_number:
+        raise ValueError("номер документа: обязательное поле")
+
+    return {
+        "value_date": _parse_date(data.get("value_date")),
+        "doc_number": doc_number[:64],
+        "op_type": op_type,
+        "amount": abs(amount),
+        "currency": _text(data.get("currency")).upper() or None,
+        "description": _text(data.get("description")) or None,
+        "client_code": _text(data.get("client_code")),
+        "supplier_code": _text(data.get("supplier_code")),
+    }
+
+
+# ---- MT940 -----------------------------------------------------------------
+_TAG = re.compile(r"^:(\d{2}[A-Z]?):(.*)$")
+_BALANCE = re.compile(r"^[CD](\d{6})([A-Z]{3})")
+_LINE61 = re.compile(
+    r"^(?P<date>\d{6})(?P<entry>\d{4})?(?P<mark>R?[CD])[A-Z]?"
+    r"(?P<amount>\d+,\d{0,2})(?P<tx>[NSF][A-Z0-9]{3})"
+    r"(?P<ref>[^/\n]*)(?://(?P<bank_ref>\S*))?"
+)
+
+
+def _mt940_date(raw: str) -> date:
+    return datetime.strptime(raw, "%y%m%d").date()
+
+
+def iter_mt940(stream):
+    """
+    (номер строки, запись) из MT940: :20: (референс выписки), :60F:
+    (валюта), :61: (проводка) и :86: (назначение платежа).
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="replace")
+    stmt_ref, currency, seq = "", None, 0
+    pending = None  # (номер строки, запись) ждёт возможного :86:
+    tag, line_no = None, 0
+
+    for line_no, raw in enumerate(text, start=1):
+        line = raw.rstrip("\r\n")
+        m = _TAG.match(line)
+        if not m:
+            # продолжение многострочного :86:
+            if (
+                tag == "86"
+                and pending
+                and isinstance(pending[1], dict)
+                and line
+                and not line.startswith("-")
+            ):
+                rec = pending[1]
+                rec["description"] = (
+                    f"{rec['description'] or ''} {line.strip()}".strip()
+                )
+            continue
+
+        tag, value = m.group(1), m.group(2)
+        if tag != "86" and pending:
+            yield pending
+            pending = None
+
+        if tag == "20":
+            stmt_ref, seq = value.strip(), 0
+        elif tag in ("60F", "60M"):
+            b = _BALANCE.match(value)
+            currency = b.group(2) if b else currency
+        elif tag == "61":
+            seq += 1
+            t = _LINE61.match(value)
+            if not t:
+                pending = (line_no, ValueError(f":61: не распознана строка «{value}»"))
+                continue
+            ref = t.group("ref").strip()
+            if not ref or ref.upper() == "NONREF":
+                ref = (t.group("bank_ref") or "").strip()
+            pending = (
+                line_no,
+                {
+                    "value_date": _mt940_date(t.group("date")),
+                    "doc_number": (ref or f"{stmt_ref}/{seq}")[:64],
+                    "op_type": (
+                        "incoming" if t.group("mark").endswith("C") else "outgoing"
+                    ),
+                    "amount": Decimal(t.group("amount").replace(",", ".")),
+                    "currency": currency,
+                    "description": None,
+                    "client_code": "",
+                    "supplier_code": "",
+                },
+            )
+        elif tag == "86" and pending and isinstance(pending[1], dict):
+            pending[1]["description"] = value.strip() or None
+
+    if pending:
+        yield pending
+
+
+def iter_statement(stream, filename: str, fmt: str | None = None):
+    fmt = fmt or (
+        "mt940"
+        if filename.lower().endswith((".sta", ".mt940", ".940", ".txt"))
+        else "csv"
+    )
+    if fmt == "mt940":
+        return iter_mt940(stream)
+    return iter_csv(stream)
+
+
+# ---- загрузка --------------------------------------------------------------
+class _KnownDocs:
+    """
+    Множество (value_date, doc_number, op_type) уже загруженных документов.
+    Диапазон дат растёт по мере чтения выписки; из БД догружается
+    только ещё не покрытая часть.
+    """
+
+    def __init__(self):
+        self.keys = set()
+        self.lo = None
+        self.hi = None
+
+    def _load(self, lo: date, hi: date):
+        t = BankOperation.__table__
+        rows = db.session.execute(
+            select(t.c.value_date, t.c.doc_number, t.c.op_type).where(
+                t.c.value_date.between(lo, hi), t.c.doc_number.isnot(None)
+            )
+        )
+        self.keys.update(tuple(r) for r in rows)
+
+    def cover(self, lo: date, hi: date):
+        if self.lo is None:
+            self._load(lo, hi)
+            self.lo, self.hi = lo, hi
+            return
+        if lo < self.lo:
+            self._load(lo, date.fromordinal(self.lo.toordinal() - 1))
+            self.lo = lo
+        if hi > self.hi:
+            self._load(date.fromordinal(self.hi.toordinal() + 1), hi)
+            self.hi = hi
+
+
+def import_statement(records, user_id: int, default_currency: str = "UZS"):
+    """
+    records — итератор (номер строки, запись | ValueError).
+    Ошибочные строки попадают в отчёт, корректные новые — в БД.
+    """
+    result = StatementResult()
+    clients = refdata.ids_by_code("client")
+    suppliers = refdata.ids_by_code("supplier")
+    known = _KnownDocs()
+    table = BankOperation.__table__
+    mark = search.bulk_mark(db.session.connection(), "bank")
+    now = datetime.utcnow()
+    touched = {}
+    chunk = []
+
+    def flush():
+        if not chunk:
+            return
+        known.cover(
+            min(r["value_date"] for r in chunk), max(r["value_date"] for r in chunk)
+        )
+        batch = []
+        for rec in chunk:
+            key = (rec["value_date"], rec["doc_number"], rec["op_type"])
+            if key in known.keys:
+                result.duplicates += 1
+                continue
+            known.keys.add(key)  # дубли внутри самой выписки
+            batch.append(rec)
+            aging.touch(touched, rec["client_id"], rec["value_date"])
+        if batch:
+            db.session.execute(insert(table), batch)
+            result.inserted += len(batch)
+        chunk.clear()
+
+    try:
+        for line, rec in records:
+            result.total += 1
+            if isinstance(rec, Exception):
+                result.add_error(line, str(rec))
+                continue
+
+            currency = rec.pop("currency") or default_currency
+            if not _CURRENCY.match(currency):
+                result.add_error(line, f"валюта: «{currency}» не поддерживается")
+                continue
+            client_code, supplier_code = rec.pop("client_code"), rec.pop(
+                "supplier_code"
+            )
+            client_id = clients.get(client_code) if client_code else None
+            if client_code and client_id is None:
+                result.add_error(line, f"клиент с кодом {client_code} не найден")
+                continue
+            supplier_id = suppliers.get(supplier_code) if supplier_code else None
+            if supplier_code and supplier_id is None:
+                result.add_error(line, f"поставщик с кодом {supplier_code} не найден")
+                continue
+
+            rec.update(
+                user_id=user_id,
+                currency=currency,
+                client_id=client_id,
+                supplier_id=supplier_id,
+                rate=None,
+                created_at=now,
+            )
+            chunk.append(rec)
+            if len(chunk) >= BATCH_SIZE:
+                flush()
+        flush()
+        aging.invalidate(db.session.connection(), touched)
+        dashboard.touch(db.session, "bank")
+        search.index_since(db.session.connection(), "bank", mark)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def import_file(stream, filename: str, user_id: int, fmt: str | None = None, **kw):
+    return import_statement(iter_statement(stream, filename, fmt), user_id, **kw)
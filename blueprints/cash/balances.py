@@ -0,0 +1,199 @@
+# C:\tourismops\blueprints\cash\balances.py
+"""
+Остатки кассы через дневные снимки (CashDailyBalance).
+
+Каждая вставка/правка/удаление CashOperation в той же транзакции
+сдвигает обороты своего дня и остаток на конец этого и последующих дней
+(обычно это одна строка — сегодняшняя). «Остаток на момент X» — это
+последний снимок до дня X плюс короткий хвост операций за сам день X.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from sqlalchemy import and_, func, insert, select, update
+
+from extensions import db
+from incremental import FlushTracker, upsert_add
+from models import CashDailyBalance, CashOperation
+
+_FIELDS = ("user_id", "currency", "created_at", "op_type", "amount")
+ZERO = Decimal("0.00")
+REBUILD_BATCH = 1000
+
+
+# ---- инкрементальное ведение -----------------------------------------------
+def contribution(values: dict):
+    """(ключ снимка, приход, расход) для одной операции."""
+    created_at = values["created_at"] or datetime.utcnow()
+    key = (values["user_id"], values["currency"], created_at.date())
+    amount = Decimal(values["amount"] or 0)
+    if values["op_type"] == "income":
+        return key, amount, ZERO
+    if values["op_type"] == "expense":
+        return key, ZERO, amount
+    return key, ZERO, ZERO
+
+
+def apply_delta(conn, user_id, currency, day: date, d_income, d_expense):
+    """Сдвинуть снимок дня и остатки всех последующих дней на дельту."""
+    t = CashDailyBalance.__table__
+    key = and_(t.c.user_id == user_id, t.c.currency == currency)
+    d_net = d_income - d_expense
+
+    # остаток на начало нужен, только если строки дня ещё нет, но читать
+    # его приходится заранее: вставка и прибавка — один upsert
+    opening = conn.execute(
+        select(t.c.closing).where(key, t.c.day < day).order_by(t.c.day.desc()).limit(1)
+    ).scalar()
+    upsert_add(
+        conn,
+        t,
+        {"user_id": user_id, "currency": currency, "day": day},
+        {"income": d_income, "expense": d_expense, "closing": d_net},
+        initial={
+            "income": d_income,
+            "expense": d_expense,
+            "closing": (opening or ZERO) + d_net,
+        },
+    )
+    if d_net:
+        conn.execute(
+            update(t).where(key, t.c.day > day).values(closing=t.c.closing + d_net)
+        )
+
+
+def apply_deltas(conn, deltas: dict):
+    """deltas: {(user_id, currency, day): [приход, расход]}"""
+    for (user_id, currency, day), (d_income, d_expense) in sorted(deltas.items()):
+        if d_income or d_expense:
+            apply_delta(conn, user_id, currency, day, d_income, d_expense)
+
+
+def _add(deltas, model, values, sign):
+    key, inc, exp = contribution(values)
+    deltas[key][0] += sign * inc
+    deltas[key][1] += sign * exp
+
+
+FlushTracker(
+    "cash",
+    {CashOperation: _FIELDS},
+    _add,
+    apply_deltas,
+    new=lambda: defaultdict(lambda: [ZERO, ZERO]),
+)
+
+
+# ---- чтение ----------------------------------------------------------------
+def _closings_before(day: date, user_id=None):
+    """Последний остаток до дня day по каждой паре (кассир, валюта)."""
+    t = CashDailyBalance.__table__
+    latest = select(t.c.user_id, t.c.currency, func.max(t.c.day).label("day")).where(
+        t.c.day < day
+    )
+    if user_id is not None:
+        latest = latest.where(t.c.user_id == user_id)
+    latest = latest.group_by(t.c.user_id, t.c.currency).subquery()
+
+    return db.session.execute(
+        select(t.c.user_id, t.c.currency, t.c.closing).join(
+            latest,
+            and_(
+                t.c.user_id == latest.c.user_id,
+                t.c.currency == latest.c.currency,
+                t.c.day == latest.c.day,
+            ),
+        )
+    ).all()
+
+
+def balance_as_of(as_of: datetime, user_id=None) -> dict:
+    """
+    Остаток кассы по валютам на момент as_of (включительно):
+    снимки до дня as_of + операции с начала этого дня до as_of.
+    """
+    totals = defaultdict(lambda: ZERO)
+    for _uid, currency, closing in _closings_before(as_of.date(), user_id):
+        totals[currency] += closing or ZERO
+
+    tail = db.session.query(
+        CashOperation.currency, CashOperation.op_type, func.sum(CashOperation.amount)
+    ).filter(
+        CashOperation.created_at >= datetime.combine(as_of.date(), time.min),
+        CashOperation.created_at <= as_of,
+    )
+    if user_id is not None:
+        tail = tail.filter(CashOperation.user_id == user_id)
+    for currency, op_type, amount in tail.group_by(
+        CashOperation.currency, CashOperation.op_type
+    ):
+        if op_type == "income":
+            totals[currency] += amount or ZERO
+        elif op_type == "expense":
+            totals[currency] -= amount or ZERO
+
+    return dict(sorted(totals.items()))
+
+
+# ---- полная пересборка -----------------------------------------------------
+def rebuild(date_from: date | None = None) -> int:
+    """
+    Пересчитать снимки с date_from (или целиком) по CashOperation.
+    Возвращает число записанных строк снимков.
+    """
+    t = CashDailyBalance.__table__
+    day_col = func.date(CashOperation.created_at, type_=db.Date).label("day")
+
+    running = defaultdict(lambda: ZERO)
+    q = db.session.query(
+        CashOperation.user_id,
+        CashOperation.currency,
+        day_col,
+        CashOperation.op_type,
+        func.sum(CashOperation.amount),
+    )
+    delete = t.delete()
+    if date_from is not None:
+        for user_id, currency, closing in _closings_before(date_from):
+            running[(user_id, currency)] = closing or ZERO
+        q = q.filter(CashOperation.created_at >= datetime.combine(date_from, time.min))
+        delete = delete.where(t.c.day >= date_from)
+    db.session.execute(delete)
+
+    q = q.group_by(
+        CashOperation.user_id, CashOperation.currency, day_col, CashOperation.op_type
+    ).order_by(CashOperation.user_id, CashOperation.currency, day_col)
+
+    rows = {}  # (user_id, currency, day) -> row; упорядочено по ключу
+    for user_id, currency, day, op_type, amount in q:
+        row = rows.setdefault(
+            (user_id, currency, day),
+            {
+                "user_id": user_id,
+                "currency": currency,
+                "day": day,
+                "income": ZERO,
+                "expense": ZERO,
+            },
+        )
+        if op_type in ("income", "expense"):
+            row[op_type] += amount or ZERO
+
+    written = 0
+    batch = []
+    for (user_id, currency, _day), row in rows.items():
+        running[(user_id, currency)] += row["income"] - row["expense"]
+        row["closing"] = running[(user_id, currency)]
+        batch.append(row)
+        if len(batch) >= REBUILD_BATCH:
+            db.session.execute(insert(t), batch)
+            written += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(t), batch)
+        written += len(batch)
+
+    db.session.commit()
+    return written
@@ -0,0 +1,200 @@
+# C:\tourismops\blueprints\cash\exports.py
+"""
+Выгрузки кассы: фильтры истории, CSV и пакет ордеров KO-1/KO-2.
+
+Одни и те же функции работают и в запросе (потоковая отдача), и в
+фоновом задании (jobs.py) — там фильтры приходят параметрами задания,
+а права берутся у его владельца, а не у current_user.
+"""
+
+import csv
+import io
+import os
+from datetime import datetime
+
+from flask import current_app
+
+import jobs
+from audit import audit_sink
+from models import CashOperation
+
+from . import orders
+
+EXPORT_BATCH = 1000  # строк за один fetch с сервера и за один chunk ответа
+ORDER_BATCH_LIMIT = 1000  # максимум ордеров в одном ZIP
+# параметры истории, которые уходят в задание
+FILTER_ARGS = ("from", "to", "type", "currency", "mine")
+
+
+def apply_filters(q, args, user):
+    """
+    Фильтры истории по параметрам:
+      from=YYYY-MM-DD, to=YYYY-MM-DD, type=income|expense,
+      currency=USD|EUR|UZS, mine=1 (не-руководство видит только свои записи)
+    """
+    fdate = args.get("from")
+    tdate = args.get("to")
+    kind = args.get("type")
+    curr = args.get("currency")
+    mine = args.get("mine")  # если указать mine=1 — только мои записи
+
+    if fdate:
+        try:
+            dt = datetime.strptime(fdate, "%Y-%m-%d")
+            q = q.filter(CashOperation.created_at >= dt)
+        except ValueError:
+            pass
+
+    if tdate:
+        try:
+            # включительно до конца дня
+            dt = datetime.strptime(tdate, "%Y-%m-%d")
+            dt = dt.replace(hour=23, minute=59, second=59, microsecond=999999)
+            q = q.filter(CashOperation.created_at <= dt)
+        except ValueError:
+            pass
+
+    if kind in ("income", "expense"):
+        q = q.filter(CashOperation.op_type == kind)
+
+    if curr in ("USD", "EUR", "UZS"):
+        q = q.filter(CashOperation.currency == curr)
+
+    # ограничение видимости по пользователю (для не-руководителей)
+    if mine == "1" or getattr(user, "role", "") not in ("admin", "executive"):
+        q = q.filter(CashOperation.user_id == user.id)
+
+    return q
+
+
+def filter_params(args) -> dict:
+    return {k: args[k] for k in FILTER_ARGS if args.get(k)}
+
+
+def timestamped(prefix: str, ext: str) -> str:
+    return f"{prefix}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{ext}"
+
+
+# ---- CSV -------------------------------------------------------------------
+def export_query(q):
+    return (
+        q.with_entities(
+            CashOperation.created_at,
+            CashOperation.op_type,
+            CashOperation.amount,
+            CashOperation.currency,
+            CashOperation.user_id,
+            CashOperation.description,
+        )
+        .order_by(CashOperation.created_at.asc(), CashOperation.id.asc())
+        .execution_options(stream_results=True)  # серверный курсор
+        .yield_per(EXPORT_BATCH)
+    )
+
+
+def iter_csv(q, counter: list | None = None):
+    """
+    CSV по запросу export_query кусками по EXPORT_BATCH строк.
+    counter[0] — сколько строк уже выгружено (для прогресса и аудита).
+    """
+    counter = counter if counter is not None else [0]
+    buf = io.StringIO()
+    writer = csv.writer(buf, delimiter=";")
+
+    def flush():
+        chunk = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return chunk.encode("utf-8")
+
+    yield "\ufeff".encode("utf-8")  # BOM для Excel — один раз в начале
+    writer.writerow(["Дата", "Тип", "Сумма", "Валюта", "Пользователь", "Описание"])
+    yield flush()
+
+    for created_at, op_type, amount, currency, user_id, description in q:
+        writer.writerow(
+            [
+                created_at.strftime("%Y-%m-%d %H:%M") if created_at else "",
+                op_type,
+                f"{amount}",
+                currency,
+                user_id,
+                (description or "").replace("\n", " ").strip(),
+            ]
+        )
+        counter[0] += 1
+        if counter[0] % EXPORT_BATCH == 0:
+            yield flush()
+    tail = flush()
+    if tail:
+        yield tail
+
+
+# ---- ордера ----------------------------------------------------------------
+def order_jobs(q) -> list:
+    """
+    (tpl_path, order_context) по операциям запроса для iter_orders_zip.
+    LookupError — операций или шаблона нет, ValueError — операций больше
+    ORDER_BATCH_LIMIT.
+    """
+    items = (
+        q.order_by(CashOperation.created_at.asc(), CashOperation.id.asc())
+        .limit(ORDER_BATCH_LIMIT + 1)
+        .all()
+    )
+    if not items:
+        raise LookupError("Нет операций для печати")
+    if len(items) > ORDER_BATCH_LIMIT:
+        raise ValueError(
+            f"Слишком много операций (> {ORDER_BATCH_LIMIT}), сузьте период"
+        )
+    result = []
+    for item in items:
+        tpl_path = orders.template_path(current_app.root_path, item.op_type)
+        if not os.path.exists(tpl_path):
+            raise LookupError(f"Шаблон не найден: {tpl_path}")
+        result.append((tpl_path, orders.order_context(item)))
+    return result
+
+
+# ---- фоновые задания -------------------------------------------------------
+def _job_filters(ctx):
+    """Фильтры истории от имени владельца задания."""
+    user = ctx.user
+    if user is None:
+        # пока задание ждало очереди, владельца удалили: без него не понять,
+        # какие записи ему видны
+        raise jobs.JobError("Пользователь, поставивший задание, удалён")
+    return apply_filters(CashOperation.query, ctx.params, user)
+
+
+@jobs.handler("cash_export", "Экспорт кассы (CSV)")
+def export_csv_job(ctx):
+    q = _job_filters(ctx)
+    total = q.order_by(None).count()
+    counter = [0]
+    with ctx.open("wb") as fh:
+        for chunk in iter_csv(export_query(q), counter):
+            fh.write(chunk)
+            ctx.progress(counter[0], total, f"{counter[0]} из {total} строк")
+    audit_sink.log("cash:export", f"rows={counter[0]} job={ctx.job_id}", ctx.user_id)
+    return timestamped("cash", "csv"), "text/csv"
+
+
+@jobs.handler("cash_orders", "Кассовые ордера (ZIP)")
+def orders_zip_job(ctx):
+    q = _job_filters(ctx)
+    try:
+        batch = order_jobs(q)
+    except (LookupError, ValueError) as exc:
+        raise jobs.JobError(str(exc))
+    workers = current_app.config.get("ORDER_RENDER_WORKERS")
+    with ctx.open("wb") as fh:
+        # по куску ZIP на каждый готовый ордер (и один завершающий)
+        for done, chunk in enumerate(orders.iter_orders_zip(batch, workers)):
+            fh.write(chunk)
+            ctx.progress(done, len(batch), f"{min(done, len(batch))} из {len(batch)}")
+    audit_sink.log(
+        "cash:orders_zip", f"rows={len(batch)} job={ctx.job_id}", ctx.user_id
+    )
+    return timestamped("cash_orders", "zip"), "application/zip"
@@ -1,12 +1,16 @@
 from flask_wtf import FlaskForm
-from wtforms import DecimalField, SelectField, StringField
+from flask_wtf.file import FileField, FileRequired
+from wtforms import BooleanField, DecimalField, SelectField, StringField
 from wtforms.validators import DataRequired, NumberRange
 
+OP_TYPE_CHOICES = [("income", "Приход"), ("expense", "Расход")]
+CURRENCY_CHOICES = [("UZS", "UZS"), ("USD", "USD"), ("EUR", "EUR")]
+
 
 class CashForm(FlaskForm):
     type = SelectField(
         "Тип",
-        choices=[("income", "Приход"), ("expense", "Расход")],
+        choices=OP_TYPE_CHOICES,
         validators=[DataRequired()],
     )
     amount = DecimalField(
@@ -16,7 +20,13 @@ class CashForm(FlaskForm):
     )
     currency = SelectField(
         "Валюта",
-        choices=[("UZS", "UZS"), ("USD", "USD"), ("EUR", "EUR")],
+        choices=CURRENCY_CHOICES,
         validators=[DataRequired()],
     )
     description = StringField("Описание")
+
+
+class CashImportForm(FlaskForm):
+    file = FileField("Файл CSV/XLSX", validators=[FileRequired()])
+    skip_invalid = BooleanField("Пропускать строки с ошибками")
+    dry_run = BooleanField("Только проверить, не сохранять")
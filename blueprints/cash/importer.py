@@ -0,0 +1,281 @@
+# C:\tourismops\blueprints\cash\importer.py
+"""
+Массовая загрузка кассовых операций из CSV / XLSX.
+
+Файл читается построчно (XLSX — openpyxl в режиме read_only), строки
+проверяются по тем же правилам, что и CashForm, коды клиентов и
+поставщиков разрешаются по заранее загруженным словарям, а вставка идёт
+пачками executemany в одной транзакции. Снимки остатков (balances)
+обновляются в той же транзакции одной дельтой на день.
+"""
+
+import csv
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import insert
+
+import refdata
+import search
+from blueprints.analytics import aging
+from blueprints.core import dashboard
+from extensions import db
+from models import CashOperation
+
+from . import balances
+from .forms import CURRENCY_CHOICES, OP_TYPE_CHOICES
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+# заголовок файла → поле; русские заголовки совпадают с экспортом CSV
+COLUMNS = {
+    "date": "created_at",
+    "дата": "created_at",
+    "type": "op_type",
+    "тип": "op_type",
+    "amount": "amount",
+    "сумма": "amount",
+    "currency": "currency",
+    "валюта": "currency",
+    "rate": "rate",
+    "курс": "rate",
+    "description": "description",
+    "описание": "description",
+    "fio": "fio",
+    "фио": "fio",
+    "client": "client_code",
+    "клиент": "client_code",
+    "код клиента": "client_code",
+    "supplier": "supplier_code",
+    "поставщик": "supplier_code",
+    "код поставщика": "supplier_code",
+}
+
+# значения «Тип» из выгрузки и человекочитаемые подписи
+OP_TYPES = {value: value for value, _label in OP_TYPE_CHOICES}
+OP_TYPES.update({label.lower(): value for value, label in OP_TYPE_CHOICES})
+CURRENCIES = {value for value, _label in CURRENCY_CHOICES}
+
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%Y-%m-%d",
+    "%d.%m.%Y %H:%M",
+    "%d.%m.%Y",
+)
+
+
+class ImportFileError(Exception):
+    """Файл нельзя разобрать целиком (формат, заголовок)."""
+
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    inserted: int = 0
+    errors: list = field(default_factory=list)  # [(номер строки, сообщение)]
+    error_count: int = 0
+    committed: bool = False
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# ---- чтение файла ----------------------------------------------------------
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    yield next(csv.reader([first], delimiter=delimiter), [])
+    yield from csv.reader(text, delimiter=delimiter)
+
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError as exc:  # необязательная зависимость
+        raise ImportFileError("Для XLSX установите пакет openpyxl") from exc
+
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        for row in wb.worksheets[0].iter_rows(values_only=True):
+            yield ["" if v is None else v for v in row]
+    finally:
+        wb.close()
+
+
+def iter_rows(stream, filename: str):
+    """Строки файла как списки значений (первая — заголовок)."""
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        return _iter_xlsx(stream)
+    return _iter_csv(stream)
+
+
+# ---- проверка строки -------------------------------------------------------
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value
+    raw = _text(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"неверная дата «{raw}»")
+
+
+def _parse_decimal(value, name: str):
+    raw = _text(value).replace(" ", "").replace(",", ".")
+    try:
+        return Decimal(raw)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{name}: не число «{_text(value)}»")
+
+
+class _RowValidator:
+    """Правила CashForm + разрешение кодов по предзагруженным словарям."""
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.clients = refdata.ids_by_code("client")
+        self.suppliers = refdata.ids_by_code("supplier")
+
+    def __call__(self, data: dict) -> dict:
+        op_type = OP_TYPES.get(_text(data.get("op_type")).lower())
+        if not op_type:
+            raise ValueError(
+                f"тип: «{_text(data.get('op_type'))}» — ожидается приход/расход"
+            )
+
+        if not _text(data.get("amount")):
+            raise ValueError("сумма: обязательное поле")
+        amount = _parse_decimal(data["amount"], "сумма").quantize(Decimal("0.01"))
+        if amount <= 0:  # DataRequired + NumberRange(min=0) в CashForm
+            raise ValueError("сумма: должна быть больше нуля")
+
+        currency = _text(data.get("currency")).upper()
+        if currency not in CURRENCIES:
+            raise ValueError(f"валюта: «{currency}» не поддерживается")
+
+        row = {
+            "user_id": self.user_id,
+            "op_type": op_type,
+            "amount": amount,
+            "currency": currency,
+            "description": _text(data.get("description")) or None,
+            "fio": _text(data.get("fio")) or None,
+            "rate": None,
+            "client_id": None,
+            "supplier_id": None,
+            "created_at": (
+                _parse_date(data["created_at"])
+                if _text(data.get("created_at"))
+                else datetime.utcnow()
+            ),
+        }
+        if _text(data.get("rate")):
+            row["rate"] = _parse_decimal(data["rate"], "курс")
+
+        code = _text(data.get("client_code"))
+        if code:
+            row["client_id"] = self.clients.get(code)
+            if row["client_id"] is None:
+                raise ValueError(f"клиент с кодом {code} не найден")
+        code = _text(data.get("supplier_code"))
+        if code:
+            row["supplier_id"] = self.suppliers.get(code)
+            if row["supplier_id"] is None:
+                raise ValueError(f"поставщик с кодом {code} не найден")
+        return row
+
+
+# ---- загрузка --------------------------------------------------------------
+def import_rows(
+    rows,
+    user_id: int,
+    *,
+    skip_invalid: bool = False,
+    dry_run: bool = False,
+    progress=None,
+) -> ImportResult:
+    """
+    rows — итератор списков значений, первая строка — заголовок.
+    Без skip_invalid любая ошибка откатывает весь импорт.
+    """
+    result = ImportResult()
+    rows = iter(rows)
+    header = next(rows, None)
+    if not header:
+        raise ImportFileError("Пустой файл")
+    mapping = [COLUMNS.get(_text(h).lower()) for h in header]
+    missing = {"op_type", "amount", "currency"} - set(mapping)
+    if missing:
+        raise ImportFileError(f"Нет обязательных колонок: {', '.join(sorted(missing))}")
+
+    validate = _RowValidator(user_id)
+    table = CashOperation.__table__
+    conn = db.session.connection()
+    mark = search.bulk_mark(conn, "cash")
+    deltas = defaultdict(lambda: [balances.ZERO, balances.ZERO])
+    touched = {}
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            conn.execute(insert(table), batch)
+        result.inserted += len(batch)
+        batch.clear()
+        if progress:
+            progress(result)
+
+    try:
+        for line, values in enumerate(rows, start=2):
+            if not any(_text(v) for v in values):
+                continue
+            result.total += 1
+            data = {name: v for name, v in zip(mapping, values) if name}
+            try:
+                row = validate(data)
+            except ValueError as exc:
+                result.add_error(line, str(exc))
+                continue
+
+            batch.append(row)
+            aging.touch(touched, row["client_id"], row["created_at"].date())
+            key, inc, exp = balances.contribution(row)
+            deltas[key][0] += inc
+            deltas[key][1] += exp
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        flush()
+
+        if dry_run or (result.error_count and not skip_invalid):
+            db.session.rollback()
+            if not dry_run:
+                result.inserted = 0
+            return result
+
+        balances.apply_deltas(conn, deltas)
+        aging.invalidate(conn, touched)
+        dashboard.touch(db.session, "cash")
+        search.index_since(conn, "cash", mark)
+        db.session.commit()
+        result.committed = True
+        return result
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def import_file(stream, filename: str, user_id: int, **kwargs) -> ImportResult:
+    return import_rows(iter_rows(stream, filename), user_id, **kwargs)
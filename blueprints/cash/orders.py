@@ -0,0 +1,105 @@
+# C:\tourismops\blueprints\cash\orders.py
+"""
+Кассовые ордера KO-1 / KO-2 (DOCX): шаблоны, контекст операции и
+пакетная печать.
+
+Сам рендер с кэшем скомпилированных шаблонов — в ko_render.py. Пакетная
+печать раскладывает его по пулу процессов и собирает результат в ZIP,
+который отдаётся потоком.
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+# render_order нужен и здесь: routes печатает одиночный ордер через orders
+from ko_render import render_job, render_order  # noqa: F401
+
+KO_INCOME = "ko-1.docx"
+KO_EXPENSE = "ko-2.docx"
+
+# пакеты меньше этого размера рендерим в текущем процессе — IPC дороже
+POOL_THRESHOLD = 8
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# ---- шаблоны ---------------------------------------------------------------
+def template_path(root_path: str, op_type: str) -> str:
+    doc_name = KO_INCOME if op_type == "income" else KO_EXPENSE
+    return os.path.join(root_path, "static", "docs", doc_name)
+
+
+def order_context(item) -> dict:
+    """Данные операции для шаблона — только простые типы (уходят в пул)."""
+    return {
+        "id": item.id,
+        "op_type": item.op_type,
+        "date": item.created_at.strftime("%d.%m.%Y") if item.created_at else "",
+        "from": getattr(item, "fio", "") or "",
+        "basis": item.description or "",
+        "amount": str(item.amount if item.amount is not None else 0),
+        "currency": item.currency,
+    }
+
+
+# ---- пакетная печать -------------------------------------------------------
+def _get_pool(max_workers: int | None) -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # не fork: процесс приложения многопоточный, и fork копирует
+            # в рабочий процесс чужие захваченные блокировки — он может
+            # зависнуть навсегда. spawn поднимает чистый интерпретатор:
+            # задание (ko_render.render_job) импортирует только ko_render.py,
+            # но главный скрипт процесса spawn тоже выполняет заново — при
+            # запуске `python app.py` рабочий процесс повторит create_app().
+            # Сервер поднимается через flask run / WSGI-сервер, где главный
+            # скрипт — их собственный.
+            _pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+class _ZipStream(io.RawIOBase):
+    """Приёмник для ZipFile без seek: копит байты до выдачи наружу."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def pop(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_orders_zip(jobs: list, max_workers: int | None = None):
+    """
+    jobs — список (tpl_path, order_context(item)).
+    Отдаёт ZIP по кускам по мере готовности ордеров (порядок сохраняется).
+    """
+    if len(jobs) < POOL_THRESHOLD:
+        rendered = map(render_job, jobs)
+    else:
+        chunksize = max(1, len(jobs) // ((max_workers or os.cpu_count() or 1) * 4))
+        rendered = _get_pool(max_workers).map(render_job, jobs, chunksize=chunksize)
+
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as zf:
+        for fname, blob in rendered:
+            zf.writestr(fname, blob)  # DOCX уже сжат — повторно не жмём
+            yield sink.pop()
+    yield sink.pop()
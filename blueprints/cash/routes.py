@@ -1,40 +1,41 @@
 # C:\tourismops\blueprints\cash\routes.py
 
-import csv
 import io
+import os
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
 
-from flask import abort, flash, redirect, render_template, request, send_file, url_for
+from flask import (
+    Response,
+    abort,
+    current_app,
+    flash,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    stream_with_context,
+    url_for,
+)
 from flask_login import current_user, login_required
+from sqlalchemy import func
 
+from audit import log_action
 from extensions import db
-from models import AuditLog, CashOperation
+from jobs import submit as submit_job
+from models import CashOperation
+from pagination import keyset_paginate, page_url, per_page_arg
 from security import ROLE, read_only_for, roles_required
 
-from . import bp
-from .forms import CashForm
+from . import balances, bp, exports, orders
+from .forms import CashForm, CashImportForm
+from .importer import ImportFileError, import_file
 
 # =========================
 # ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ
 # =========================
 
 
-def _log(action: str, details: str = ""):
-    """Запись действия в аудит."""
-    try:
-        db.session.add(
-            AuditLog(
-                user_id=getattr(current_user, "id", None),
-                action=action if not details else f"{action} | {details}",
-                timestamp=datetime.utcnow(),
-            )
-        )
-        db.session.commit()
-    except Exception:
-        db.session.rollback()  # не валим основной поток из-за лога
-
-
 def _parse_decimal(value, default=None):
     if value is None or value == "":
         return default
@@ -45,43 +46,38 @@ def _parse_decimal(value, default=None):
 
 
 def _apply_filters(q):
-    """
-    Фильтры истории по query-параметрам:
-      ?from=YYYY-MM-DD&to=YYYY-MM-DD&type=income|expense&currency=USD|EUR|UZS&mine=1
-    """
-    fdate = request.args.get("from")
-    tdate = request.args.get("to")
-    kind = request.args.get("type")
-    curr = request.args.get("currency")
-    mine = request.args.get("mine")  # если указать mine=1 — только мои записи
+    """Фильтры истории по query-параметрам запроса (см. exports.apply_filters)."""
+    return exports.apply_filters(q, request.args, current_user)
 
-    if fdate:
-        try:
-            dt = datetime.strptime(fdate, "%Y-%m-%d")
-            q = q.filter(CashOperation.timestamp >= dt)
-        except ValueError:
-            pass
 
-    if tdate:
-        try:
-            # включительно до конца дня
-            dt = datetime.strptime(tdate, "%Y-%m-%d")
-            dt = dt.replace(hour=23, minute=59, second=59, microsecond=999999)
-            q = q.filter(CashOperation.timestamp <= dt)
-        except ValueError:
-            pass
-
-    if kind in ("income", "expense"):
-        q = q.filter(CashOperation.type == kind)
-
-    if curr in ("USD", "EUR", "UZS"):
-        q = q.filter(CashOperation.currency == curr)
-
-    # ограничение видимости по пользователю (для не-руководителей)
-    if mine == "1" or getattr(current_user, "role", "") not in ("admin", "executive"):
-        q = q.filter(CashOperation.user_id == current_user.id)
+def _totals_by_currency(q):
+    """
+    Приход/расход/баланс по каждой валюте одним запросом
+    GROUP BY op_type, currency (с теми же фильтрами, что и q).
+    Возвращает {"USD": {"income": ..., "expense": ..., "balance": ...}, ...}
+    """
+    rows = (
+        q.with_entities(
+            CashOperation.op_type,
+            CashOperation.currency,
+            func.sum(CashOperation.amount),
+        )
+        .group_by(CashOperation.op_type, CashOperation.currency)
+        .order_by(None)
+        .all()
+    )
 
-    return q
+    totals = {}
+    for op_type, currency, amount in rows:
+        zero = Decimal("0.00")
+        t = totals.setdefault(
+            currency, {"income": zero, "expense": zero, "balance": zero}
+        )
+        if op_type in ("income", "expense"):
+            t[op_type] += amount or Decimal()
+    for t in totals.values():
+        t["balance"] = t["income"] - t["expense"]
+    return dict(sorted(totals.items()))
 
 
 # =========================
@@ -99,7 +95,7 @@ def list_ops():
     if request.method == "POST" and form.validate_on_submit():
         item = CashOperation(
             user_id=current_user.id,
-            type=form.type.data,
+            op_type=form.type.data,
             currency=form.currency.data,
             amount=_parse_decimal(form.amount.data, Decimal("0.00")),
             description=form.description.data,
@@ -109,7 +105,9 @@ def list_ops():
         )
         db.session.add(item)
         db.session.commit()
-        _log("cash:create", f"id={item.id} {item.type} {item.amount} {item.currency}")
+        log_action(
+            "cash:create", f"id={item.id} {item.op_type} {item.amount} {item.currency}"
+        )
         flash("Операция сохранена", "success")
         return redirect(url_for("cash.list_ops"))
 
@@ -118,7 +116,7 @@ def list_ops():
     if getattr(current_user, "role", "") not in ("admin", "executive"):
         q = q.filter_by(user_id=current_user.id)
 
-    items = q.order_by(CashOperation.timestamp.desc()).limit(200).all()
+    items = q.order_by(CashOperation.created_at.desc()).limit(200).all()
     return render_template("cash/list.html", items=items, form=form)
 
 
@@ -132,19 +130,101 @@ def list_ops():
 @roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def history():
     q = _apply_filters(CashOperation.query)
-    items = q.order_by(CashOperation.timestamp.desc()).all()
 
-    # агрегаты (итоги)
-    total_income = sum((op.amount for op in items if op.type == "income"), Decimal())
-    total_expense = sum((op.amount for op in items if op.type == "expense"), Decimal())
-    balance = (total_income or Decimal()) - (total_expense or Decimal())
+    # keyset по (created_at, id): идёт по ix_cash_user_time / ix_cash_type_time
+    page = keyset_paginate(
+        q,
+        CashOperation.created_at,
+        CashOperation.id,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg(),
+    )
+
+    # итоги по валютам — по всей выборке, а не по странице
+    totals = _totals_by_currency(q)
 
     return render_template(
         "cash/history.html",
-        items=items,
-        total_income=total_income,
-        total_expense=total_expense,
-        balance=balance,
+        items=page.items,
+        page=page,
+        next_url=page_url("cash.history", after=page.next_cursor),
+        prev_url=page_url("cash.history", before=page.prev_cursor),
+        totals=totals,
+    )
+
+
+# =========================
+# МАССОВЫЙ ИМПОРТ CSV / XLSX
+# =========================
+
+
+@bp.route("/import", methods=["GET", "POST"])
+@login_required
+@roles_required(ROLE["ACCOUNTANT"], ROLE["ADMIN"])
+@read_only_for(ROLE["CURATOR"])
+def import_ops():
+    form = CashImportForm()
+    result = None
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            result = import_file(
+                upload.stream,
+                upload.filename or "",
+                current_user.id,
+                skip_invalid=form.skip_invalid.data,
+                dry_run=form.dry_run.data,
+            )
+        except ImportFileError as exc:
+            flash(str(exc), "danger")
+        else:
+            if result.committed:
+                log_action(
+                    "cash:import",
+                    f"file={upload.filename} rows={result.inserted} errors={result.error_count}",
+                )
+                flash(f"Загружено операций: {result.inserted}", "success")
+            elif form.dry_run.data:
+                flash("Проверка завершена, данные не сохранялись", "info")
+            else:
+                flash("Импорт отменён: в файле есть ошибки", "danger")
+
+    return render_template("cash/import.html", form=form, result=result)
+
+
+# =========================
+# ОСТАТОК НА ДАТУ
+# =========================
+
+
+@bp.route("/balance")
+@login_required
+@roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def balance():
+    """Остаток кассы по валютам на конец дня ?as_of=YYYY-MM-DD (по умолчанию — сейчас)."""
+    as_of = datetime.utcnow()
+    raw = request.args.get("as_of")
+    if raw:
+        try:
+            as_of = datetime.strptime(raw, "%Y-%m-%d").replace(
+                hour=23, minute=59, second=59, microsecond=999999
+            )
+        except ValueError:
+            pass
+
+    user_id = None
+    if request.args.get("mine") == "1" or getattr(current_user, "role", "") not in (
+        "admin",
+        "executive",
+    ):
+        user_id = current_user.id
+
+    return render_template(
+        "cash/balance.html",
+        as_of=as_of,
+        totals=balances.balance_as_of(as_of, user_id=user_id),
     )
 
 
@@ -170,15 +250,17 @@ def edit(item_id):
         abort(403)
 
     form = CashForm(obj=item)
+    if request.method == "GET":
+        form.type.data = item.op_type  # поле формы называется type
     if form.validate_on_submit():
-        item.type = form.type.data
+        item.op_type = form.type.data
         item.currency = form.currency.data
         item.amount = _parse_decimal(form.amount.data, item.amount)
         item.description = form.description.data
         # item.fio = getattr(form, "fio", None) and form.fio.data
         # item.rate = _parse_decimal(getattr(form, "rate", None) and form.rate.data, item.rate)
         db.session.commit()
-        _log("cash:update", f"id={item.id}")
+        log_action("cash:update", f"id={item.id}")
         flash("Операция обновлена", "success")
         return redirect(url_for("cash.history"))
 
@@ -202,7 +284,7 @@ def delete(item_id):
 
     db.session.delete(item)
     db.session.commit()
-    _log("cash:delete", f"id={item_id}")
+    log_action("cash:delete", f"id={item_id}")
     flash("Операция удалена", "success")
     return redirect(url_for("cash.history"))
 
@@ -248,57 +330,46 @@ def order_docx(item_id):
     ):
         abort(403)
 
-    import os
-    from decimal import Decimal
-
-    from docxtpl import DocxTemplate
-    from flask import current_app
-    from num2words import num2words
-
-    # выбираем шаблон
-    doc_name = "ko-1.docx" if item.type == "income" else "ko-2.docx"
-    tpl_path = os.path.join(current_app.root_path, "static", "docs", doc_name)
+    tpl_path = orders.template_path(current_app.root_path, item.op_type)
     if not os.path.exists(tpl_path):
         abort(404, f"Шаблон не найден: {tpl_path}")
 
-    # сумма цифрами (две цифры после запятой)
-    try:
-        amount_rub = f"{Decimal(item.amount or 0):.2f}"
-    except Exception:
-        amount_rub = f"{item.amount}"
-
-    # сумма прописью (ru)
-    try:
-        amount_words_base = num2words(Decimal(item.amount or 0), lang="ru").capitalize()
-    except Exception:
-        amount_words_base = ""
-
-    # контекст под твои плейсхолдеры (doc_no, date, from, basis, amount_rub, amount_words)
-    ctx = {
-        "doc_no": str(item.id),
-        "date": item.timestamp.strftime("%d.%m.%Y") if item.timestamp else "",
-        "from": getattr(item, "fio", "") or "",
-        "basis": item.description or "",
-        "amount_rub": amount_rub,
-        "amount_words": f"{amount_words_base} {item.currency}".strip(),
-    }
-
-    doc = DocxTemplate(tpl_path)
-    doc.render(ctx)
-
-    mem = io.BytesIO()
-    doc.save(mem)
-    mem.seek(0)
-    fname = f"{'KO-1' if item.type == 'income' else 'KO-2'}_{item.id}.docx"
-    _log("cash:order_docx", f"id={item.id}")
+    fname, blob = orders.render_order(tpl_path, orders.order_context(item))
+    log_action("cash:order_docx", f"id={item.id}")
     return send_file(
-        mem,
+        io.BytesIO(blob),
         as_attachment=True,
         download_name=fname,
         mimetype="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
     )
 
 
+@bp.route("/orders.zip")
+@login_required
+@roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def orders_zip():
+    """Пакетная печать KO-1/KO-2 по фильтрам истории (?from=&to=&type=...)."""
+    try:
+        jobs = exports.order_jobs(_apply_filters(CashOperation.query))
+    except LookupError as exc:
+        abort(404, str(exc))
+    except ValueError as exc:
+        abort(400, str(exc))
+
+    log_action("cash:orders_zip", f"rows={len(jobs)}")
+    return Response(
+        orders.iter_orders_zip(
+            jobs, max_workers=current_app.config.get("ORDER_RENDER_WORKERS")
+        ),
+        mimetype="application/zip",
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{exports.timestamped("cash_orders", "zip")}"'
+            )
+        },
+    )
+
+
 # =========================
 # ЭКСПОРТ CSV
 # =========================
@@ -308,28 +379,47 @@ def order_docx(item_id):
 @login_required
 @roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def export_csv():
-    q = _apply_filters(CashOperation.query)
-    items = q.order_by(CashOperation.timestamp.asc()).all()
-
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=";")
-    writer.writerow(["Дата", "Тип", "Сумма", "Валюта", "Пользователь", "Описание"])
-
-    for i in items:
-        writer.writerow(
-            [
-                i.timestamp.strftime("%Y-%m-%d %H:%M") if i.timestamp else "",
-                i.type,
-                f"{i.amount}",
-                i.currency,
-                i.user_id,
-                (i.description or "").replace("\n", " ").strip(),
-            ]
-        )
+    q = exports.export_query(_apply_filters(CashOperation.query))
+
+    def generate():
+        counter = [0]
+        yield from exports.iter_csv(q, counter)
+        # курсор уже вычитан — можно коммитить запись аудита
+        log_action("cash:export", f"rows={counter[0]}")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{exports.timestamped("cash", "csv")}"'
+            )
+        },
+    )
 
-    mem = io.BytesIO(output.getvalue().encode("utf-8-sig"))  # с BOM для Excel
-    filename = f"cash_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.csv"
-    _log("cash:export", f"rows={len(items)}")
-    return send_file(
-        mem, mimetype="text/csv", as_attachment=True, download_name=filename
+
+# =========================
+# ФОНОВЫЕ ВЫГРУЗКИ
+# =========================
+
+
+@bp.route("/export-job", methods=["POST"])
+@login_required
+@roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def export_job():
+    """Экспорт CSV фоновым заданием (фильтры — как у истории)."""
+    job = submit_job(
+        "cash_export", current_user.id, exports.filter_params(request.form)
+    )
+    return redirect(url_for("core.job_status", job_id=job.id))
+
+
+@bp.route("/orders-job", methods=["POST"])
+@login_required
+@roles_required(ROLE["CASHIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def orders_job():
+    """Пакет ордеров ZIP фоновым заданием (фильтры — как у истории)."""
+    job = submit_job(
+        "cash_orders", current_user.id, exports.filter_params(request.form)
     )
+    return redirect(url_for("core.job_status", job_id=job.id))
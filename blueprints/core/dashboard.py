@@ -0,0 +1,232 @@
+# C:\tourismops\blueprints\core\dashboard.py
+"""
+Плитки панели (core.dashboard): остаток кассы, банк, билеты, маржа туров.
+
+Каждая плитка — один агрегатный запрос, по возможности по сводам
+(CashDailyBalance, SalesRollup), а не по журналам. Результат держится
+в памяти процесса до TTL плитки или до первого коммита, изменившего её
+исходные данные: after_flush отмечает затронутые плитки в session.info,
+after_commit их сбрасывает (после отката отметки просто забываются).
+Массовые импорты пишут мимо ORM и отмечают плитки сами — touch().
+Правки из других процессов видны не позже чем через TTL.
+
+Страница панели запросов к БД не делает: плитки подгружаются
+браузером параллельно, каждая своим запросом (core.dashboard_tile).
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, time
+from decimal import Decimal
+from time import monotonic
+
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.orm import Session
+
+from blueprints.cash import balances
+from extensions import db
+from models import (
+    BankOperation,
+    CashOperation,
+    ExternalTour,
+    InternalTour,
+    SalesRollup,
+    TicketSale,
+)
+from security import ROLE
+
+ZERO = Decimal("0.00")
+
+
+@dataclass(frozen=True)
+class Tile:
+    name: str
+    title: str
+    roles: tuple  # кроме админа и руководителя
+    sources: tuple  # модели, правка которых сбрасывает плитку
+    ttl: int  # секунд
+    per_user: bool = False  # не руководителям — только свои данные
+
+
+TILES = {
+    t.name: t
+    for t in (
+        Tile(
+            "cash",
+            "Остаток кассы",
+            (ROLE["CASHIER"], ROLE["ACCOUNTANT"]),
+            (CashOperation,),
+            30,
+            per_user=True,
+        ),
+        Tile(
+            "bank",
+            "Банк за месяц",
+            (ROLE["FINANCIER"], ROLE["ACCOUNTANT"]),
+            (BankOperation,),
+            60,
+        ),
+        Tile(
+            "tickets",
+            "Продано билетов",
+            (ROLE["FINANCIER"], ROLE["ACCOUNTANT"]),
+            (TicketSale,),
+            60,
+        ),
+        Tile(
+            "tours",
+            "Маржа туров за месяц",
+            (ROLE["MANAGER_INT"], ROLE["MANAGER_EXT"], ROLE["ACCOUNTANT"]),
+            (InternalTour, ExternalTour),
+            120,
+        ),
+    )
+}
+_TILES_BY_MODEL = defaultdict(set)
+for _tile in TILES.values():
+    for _model in _tile.sources:
+        _TILES_BY_MODEL[_model].add(_tile.name)
+
+
+def is_boss(role: str) -> bool:
+    return role in (ROLE["ADMIN"], ROLE["EXEC"])
+
+
+def tiles_for(role: str) -> list:
+    """Плитки, доступные роли (в порядке TILES)."""
+    return [t for t in TILES.values() if is_boss(role) or role in t.roles]
+
+
+# ---- запросы плиток --------------------------------------------------------
+def _cash(today: date, user_id=None) -> dict:
+    """{валюта: остаток} на сейчас — снимки до сегодня + операции за сегодня."""
+    return balances.balance_as_of(datetime.utcnow(), user_id=user_id)
+
+
+def _bank(today: date, user_id=None) -> dict:
+    """{валюта: {"incoming": …, "outgoing": …}} с начала месяца."""
+    b = BankOperation
+    start = today.replace(day=1)
+    # без даты валютирования (ручной ввод) — по дате создания
+    by_created = and_(
+        b.value_date.is_(None),
+        b.op_type.in_(("incoming", "outgoing")),
+        b.created_at >= datetime.combine(start, time.min),
+    )
+    q = (
+        select(b.currency, b.op_type, func.sum(b.amount))
+        .where(or_(and_(b.value_date >= start, b.value_date <= today), by_created))
+        .group_by(b.currency, b.op_type)
+    )
+    totals = defaultdict(lambda: {"incoming": ZERO, "outgoing": ZERO})
+    for currency, op_type, amount in db.session.execute(q):
+        if op_type in ("incoming", "outgoing"):
+            totals[currency][op_type] += amount or ZERO
+    return dict(sorted(totals.items()))
+
+
+def _rollup_totals(grain: str, period: date, segments) -> dict:
+    """{(сегмент, валюта): (заказов, выручка, себестоимость)} из SalesRollup."""
+    r = SalesRollup.__table__
+    q = (
+        select(
+            r.c.segment,
+            r.c.currency,
+            func.sum(r.c.orders),
+            func.sum(r.c.revenue),
+            func.sum(r.c.cost),
+        )
+        .where(r.c.grain == grain, r.c.period == period, r.c.segment.in_(segments))
+        .group_by(r.c.segment, r.c.currency)
+        .order_by(r.c.segment, r.c.currency)
+    )
+    return {
+        (segment, currency): (orders or 0, revenue or ZERO, cost or ZERO)
+        for segment, currency, orders, revenue, cost in db.session.execute(q)
+    }
+
+
+def _tickets(today: date, user_id=None) -> dict:
+    """Билеты за сегодня и за месяц: {"today"|"month": {валюта: (штук, выручка)}}."""
+    result = {}
+    for key, grain, period in (
+        ("today", "d", today),
+        ("month", "m", today.replace(day=1)),
+    ):
+        rows = _rollup_totals(grain, period, ("ticket",))
+        result[key] = {
+            currency: (orders, revenue)
+            for (_segment, currency), (orders, revenue, _cost) in rows.items()
+        }
+    return result
+
+
+def _tours(today: date, user_id=None) -> dict:
+    """{(вид тура, валюта): (заказов, выручка, маржа)} за текущий месяц."""
+    segments = {"internal_tour": "internal", "external_tour": "external"}
+    rows = _rollup_totals("m", today.replace(day=1), tuple(segments))
+    return {
+        (segments[segment], currency): (orders, revenue, revenue - cost)
+        for (segment, currency), (orders, revenue, cost) in rows.items()
+    }
+
+
+_QUERIES = {"cash": _cash, "bank": _bank, "tickets": _tickets, "tours": _tours}
+
+
+# ---- кэш -------------------------------------------------------------------
+class _TileCache:
+    """{(плитка, пользователь | None): (день, значение, срок годности)}."""
+
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, name: str, user_id=None):
+        today = date.today()
+        entry = self.entries.get((name, user_id))
+        if entry and entry[0] == today and entry[2] > monotonic():
+            return entry[1]
+        value = _QUERIES[name](today, user_id)
+        self.entries[(name, user_id)] = (today, value, monotonic() + TILES[name].ttl)
+        return value
+
+    def drop(self, names):
+        for key in [k for k in self.entries if k[0] in names]:
+            self.entries.pop(key, None)
+
+
+_cache = _TileCache()
+
+
+def value(name: str, user):
+    """Значение плитки для пользователя: из кэша или одним запросом."""
+    per_user = TILES[name].per_user and not is_boss(user.role)
+    return _cache.get(name, user.id if per_user else None)
+
+
+def clear_cache():
+    _cache.entries.clear()
+
+
+def touch(session, *names):
+    """Сбросить плитки после коммита session (массовые импорты мимо ORM)."""
+    session.info.setdefault("dashboard_dirty", set()).update(names)
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_dirty_tiles(session, flush_context):
+    names = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        names |= _TILES_BY_MODEL.get(type(obj), set())
+    if names:
+        touch(session, *names)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_dirty_tiles(session):
+    _cache.drop(session.info.pop("dashboard_dirty", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_dirty_tiles(session):
+    session.info.pop("dashboard_dirty", None)
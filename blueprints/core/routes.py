@@ -1,16 +1,381 @@
-from flask import render_template
-from flask_login import login_required
+import os
+from datetime import date, timedelta
+
+from flask import abort, jsonify, render_template, request, send_file, url_for
+from flask_login import current_user, login_required
+
+import autocomplete
+import jobs
+import orders
+import schedule
+import search as fulltext
+from extensions import db
+from models import Job
+from pagination import page_url, per_page_arg
+from security import ROLE
 
 from . import bp
+from . import dashboard as tiles
+
+# вид поиска → роли, которым виден соответствующий журнал (как в меню)
+SEARCH_ROLES = {
+    "cash": (ROLE["CASHIER"], ROLE["ACCOUNTANT"]),
+    "bank": (ROLE["FINANCIER"], ROLE["ACCOUNTANT"]),
+    "ticket": (ROLE["FINANCIER"], ROLE["ACCOUNTANT"]),
+    "internal_tour": (ROLE["MANAGER_INT"], ROLE["ACCOUNTANT"]),
+    "external_tour": (ROLE["MANAGER_EXT"], ROLE["ACCOUNTANT"]),
+}
+SEARCH_LABELS = {
+    "cash": "Касса",
+    "bank": "Банк",
+    "ticket": "Билеты",
+    "internal_tour": "Внутр. туризм",
+    "external_tour": "Внешн. туризм",
+}
+
+# вид туров → роли, которым доступны расписание и заказы (как в меню)
+TOUR_ROLES = {
+    "internal": (ROLE["MANAGER_INT"], ROLE["ACCOUNTANT"]),
+    "external": (ROLE["MANAGER_EXT"], ROLE["ACCOUNTANT"]),
+}
+TOUR_LABELS = {"internal": "Внутр. туризм", "external": "Внешн. туризм"}
+SCHEDULE_DAYS = 14
+
+
+def _date_arg(name: str, default: date | None) -> date | None:
+    try:
+        return date.fromisoformat(request.args.get(name) or "")
+    except ValueError:
+        return default
+
+
+def _tour_kinds() -> list:
+    """Виды туров, доступные текущему пользователю (403, если ни одного)."""
+    role = current_user.role
+    boss = role in (ROLE["ADMIN"], ROLE["EXEC"])
+    allowed = [k for k, roles in TOUR_ROLES.items() if boss or role in roles]
+    if not allowed:
+        abort(403)
+    return allowed
+
+
+def _tour_json(t):
+    return {
+        "id": t.id,
+        "fio": t.fio,
+        "direction": t.direction,
+        "start_date": t.start_date.isoformat() if t.start_date else None,
+        "end_date": t.end_date.isoformat() if t.end_date else None,
+    }
 
 
 @bp.route("/")
 @login_required
 def index():
-    return render_template("core/dashboard.html")
+    return dashboard()
 
 
 @bp.route("/dashboard")
 @login_required
 def dashboard():
-    return render_template("core/dashboard.html")
+    """Каркас панели без запросов к БД: плитки браузер грузит параллельно."""
+    return render_template(
+        "core/dashboard.html", tiles=tiles.tiles_for(current_user.role)
+    )
+
+
+@bp.route("/dashboard/tiles/<name>")
+@login_required
+def dashboard_tile(name):
+    tile = tiles.TILES.get(name)
+    if tile is None:
+        abort(404)
+    if tile not in tiles.tiles_for(current_user.role):
+        abort(403)
+    data = tiles.value(name, current_user)
+    if name == "tours":
+        kinds = _tour_kinds()
+        data = {key: v for key, v in data.items() if key[0] in kinds}
+    return render_template(
+        "core/_dashboard_tile.html",
+        tile=tile,
+        data=data,
+        labels=TOUR_LABELS,
+    )
+
+
+@bp.route("/autocomplete/<kind>")
+@login_required
+def autocomplete_lookup(kind):
+    """
+    Подбор клиента или поставщика для форм: ?q=код или часть наименования
+    (кириллица или латиница), &limit=N. Ответ — из индекса в памяти.
+    """
+    if kind not in autocomplete.KINDS:
+        abort(404)
+    limit = request.args.get("limit", type=int) or autocomplete.DEFAULT_LIMIT
+    return jsonify(items=autocomplete.suggest(kind, request.args.get("q"), limit))
+
+
+@bp.route("/search")
+@login_required
+def search():
+    """
+    Поиск по описаниям/заметкам/маршрутам всех доступных журналов.
+    ?q=...&in=cash,bank&limit=N; JSON при ?format=json.
+    """
+    role = current_user.role
+    boss = role in (ROLE["ADMIN"], ROLE["EXEC"])
+    allowed = [k for k, roles in SEARCH_ROLES.items() if boss or role in roles]
+    wanted = [k for v in request.args.getlist("in") for k in v.split(",") if k]
+    kinds = [k for k in allowed if not wanted or k in wanted]
+    # касса: не-руководители видят только свои операции (как в истории)
+    user_ids = {} if boss else {"cash": current_user.id}
+
+    q = (request.args.get("q") or "").strip()
+    limit = request.args.get("limit", type=int) or fulltext.DEFAULT_LIMIT
+    hits = fulltext.search(q, kinds, user_ids, limit) if q and kinds else []
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            query=q,
+            hits=[
+                {
+                    "kind": h.kind,
+                    "id": h.id,
+                    "score": round(h.score, 4),
+                    "snippet": h.snippet,
+                    "created_at": h.created_at.isoformat() if h.created_at else None,
+                }
+                for h in hits
+            ],
+        )
+    return render_template(
+        "core/search.html",
+        q=q,
+        hits=hits,
+        kinds=allowed,
+        wanted=wanted,
+        labels=SEARCH_LABELS,
+    )
+
+
+@bp.route("/schedule")
+@login_required
+def tour_schedule():
+    """
+    Расписание туров: идущие в окне, выезды этой недели, загрузка направлений
+    по дням. ?kind=internal|external&from=YYYY-MM-DD&to=YYYY-MM-DD&direction=…;
+    JSON при ?format=json.
+    """
+    allowed = _tour_kinds()
+    kind = request.args.get("kind")
+    if kind not in allowed:
+        kind = allowed[0]
+
+    today = date.today()
+    date_from = _date_arg("from", today)
+    date_to = _date_arg("to", date_from + timedelta(days=SCHEDULE_DAYS - 1))
+    if date_to < date_from:
+        date_to = date_from
+    date_to = min(date_to, date_from + timedelta(days=schedule.MAX_WINDOW_DAYS - 1))
+    direction = (request.args.get("direction") or "").strip() or None
+
+    model = schedule.KINDS[kind]
+    active = (
+        schedule.active_between(kind, date_from, date_to)
+        .order_by(model.start_date, model.id)
+        .limit(per_page_arg(200))
+        .all()
+    )
+    week = schedule.week_of(today)
+    departing = (
+        schedule.departing_this_week(kind, today)
+        .order_by(model.start_date, model.id)
+        .all()
+    )
+    grid = schedule.occupancy(kind, date_from, date_to, direction)
+    days = [
+        date_from + timedelta(days=i) for i in range((date_to - date_from).days + 1)
+    ]
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            kind=kind,
+            date_from=date_from.isoformat(),
+            date_to=date_to.isoformat(),
+            active=[_tour_json(t) for t in active],
+            departing_this_week=[_tour_json(t) for t in departing],
+            occupancy={
+                d: {day.isoformat(): n for day, n in by_day.items()}
+                for d, by_day in grid.items()
+            },
+        )
+    return render_template(
+        "core/schedule.html",
+        kind=kind,
+        kinds=allowed,
+        labels=TOUR_LABELS,
+        date_from=date_from,
+        date_to=date_to,
+        direction=direction or "",
+        active=active,
+        departing=departing,
+        week=week,
+        grid=grid,
+        days=days,
+    )
+
+
+@bp.route("/orders")
+@login_required
+def tour_orders():
+    """
+    Заказы внутреннего и внешнего туризма одним списком (orders.py).
+    ?segment=internal|external&client_id=&supplier_id=&currency=&from=&to=
+    (по дате начала тура); keyset-пагинация after/before; JSON при ?format=json.
+    """
+    allowed = _tour_kinds()
+    wanted = [s for s in request.args.getlist("segment") if s in allowed]
+    date_from = _date_arg("from", None)
+    date_to = _date_arg("to", None)
+    currency = (request.args.get("currency") or "").strip().upper() or None
+    f = orders.OrderFilters(
+        segments=wanted or allowed,
+        client_id=request.args.get("client_id", type=int),
+        supplier_id=request.args.get("supplier_id", type=int),
+        currency=currency,
+        date_from=date_from,
+        date_to=date_to,
+    )
+
+    page = orders.page(
+        f,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg(),
+    )
+    totals = orders.totals(f)
+
+    if request.args.get("format") == "json":
+        return jsonify(
+            items=[
+                {
+                    "segment": r.segment,
+                    "id": r.id,
+                    "fio": r.fio,
+                    "direction": r.direction,
+                    "start_date": r.start_date.isoformat() if r.start_date else None,
+                    "end_date": r.end_date.isoformat() if r.end_date else None,
+                    "currency": r.currency,
+                    "cost": str(r.cost) if r.cost is not None else None,
+                    "sale_price": (
+                        str(r.sale_price) if r.sale_price is not None else None
+                    ),
+                    "net_profit": str(r.net_profit),
+                    "created_at": r.created_at.isoformat(),
+                }
+                for r in page.items
+            ],
+            totals=[
+                {
+                    "segment": t.segment,
+                    "currency": t.currency,
+                    "orders": t.orders,
+                    "sale_price": str(t.sale_price or 0),
+                    "net_profit": str(t.net_profit or 0),
+                }
+                for t in totals
+            ],
+            next_cursor=page.next_cursor,
+            prev_cursor=page.prev_cursor,
+        )
+    return render_template(
+        "core/orders.html",
+        items=page.items,
+        page=page,
+        next_url=page_url("core.tour_orders", after=page.next_cursor),
+        prev_url=page_url("core.tour_orders", before=page.prev_cursor),
+        totals=totals,
+        kinds=allowed,
+        wanted=wanted,
+        labels=TOUR_LABELS,
+        date_from=date_from,
+        date_to=date_to,
+        currency=currency or "",
+    )
+
+
+# ---- фоновые задания -------------------------------------------------------
+JOBS_SHOWN = 50
+
+
+def _own_job(job_id: int) -> Job:
+    job = db.session.get(Job, job_id)
+    if job is None:
+        abort(404)
+    if job.user_id != current_user.id and current_user.role != ROLE["ADMIN"]:
+        abort(403)
+    return job
+
+
+def _job_json(job: Job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "title": jobs.title_of(job.kind),
+        "status": job.status,
+        "status_label": jobs.STATUS_LABELS.get(job.status, job.status),
+        "progress": job.progress,
+        "message": job.message,
+        "finished": job.finished,
+        "download_url": (
+            url_for("core.job_download", job_id=job.id)
+            if job.status == "done"
+            else None
+        ),
+    }
+
+
+@bp.route("/jobs")
+@login_required
+def job_list():
+    """Мои фоновые задания, новые сверху."""
+    items = (
+        Job.query.filter(Job.user_id == current_user.id)
+        .order_by(Job.created_at.desc(), Job.id.desc())
+        .limit(JOBS_SHOWN)
+        .all()
+    )
+    jobs.job_runner.wake()
+    return render_template(
+        "core/jobs.html", items=items, titles=jobs.title_of, labels=jobs.STATUS_LABELS
+    )
+
+
+@bp.route("/jobs/<int:job_id>")
+@login_required
+def job_status(job_id):
+    """Страница задания с прогрессом; ?format=json — для опроса со страницы."""
+    job = _own_job(job_id)
+    if not job.finished:
+        jobs.job_runner.wake()
+    if request.args.get("format") == "json":
+        return jsonify(_job_json(job))
+    return render_template("core/job.html", job=_job_json(job))
+
+
+@bp.route("/jobs/<int:job_id>/download")
+@login_required
+def job_download(job_id):
+    job = _own_job(job_id)
+    if job.status != "done" or not job.result_path:
+        abort(404)
+    if not os.path.exists(job.result_path):
+        abort(404)
+    return send_file(
+        job.result_path,
+        as_attachment=True,
+        download_name=job.result_name,
+        mimetype=job.mimetype,
+    )
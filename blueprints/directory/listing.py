@@ -0,0 +1,40 @@
+# C:\tourismops\blueprints\directory\listing.py
+"""
+Списки справочников: keyset-пагинация по (name, id) вместо выдачи всех
+строк и число записей без COUNT(*) по всей таблице.
+"""
+
+from flask import request
+
+import refdata
+from pagination import capped_count, keyset_paginate, page_url, per_page_arg
+
+
+def listing(kind: str, query, filtered: bool, endpoint: str) -> dict:
+    """
+    Страница справочника kind по (name, id) для шаблона списка.
+    Число записей без фильтра берётся из справочника в памяти (refdata),
+    с фильтром — capped_count.
+    """
+    model = refdata.KINDS[kind]
+    page = keyset_paginate(
+        query,
+        model.name,
+        model.id,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=per_page_arg(),
+        descending=False,
+    )
+    if filtered:
+        total, total_exact = capped_count(query, model.id)
+    else:
+        total, total_exact = len(refdata.records(kind)), True
+    return {
+        "items": page.items,
+        "page": page,
+        "total": total,
+        "total_exact": total_exact,
+        "next_url": page_url(endpoint, after=page.next_cursor),
+        "prev_url": page_url(endpoint, before=page.prev_cursor),
+    }
@@ -6,6 +6,7 @@ from models import Subagent, Supplier
 from security import ROLE, roles_required
 
 from . import bp
+from .listing import listing
 
 
 @bp.route("/suppliers")
@@ -17,8 +18,11 @@ def suppliers_list():
     if q:
         like = f"%{q}%"
         qry = qry.filter((Supplier.code.ilike(like)) | (Supplier.name.ilike(like)))
-    items = qry.order_by(Supplier.name.asc()).all()
-    return render_template("directory/suppliers_list.html", items=items, q=q)
+    return render_template(
+        "directory/suppliers_list.html",
+        q=q,
+        **listing("supplier", qry, bool(q), "directory.suppliers_list"),
+    )
 
 
 @bp.route("/suppliers/new", methods=["GET", "POST"])
@@ -63,8 +67,11 @@ def subagents_list():
     if q:
         like = f"%{q}%"
         qry = qry.filter((Subagent.code.ilike(like)) | (Subagent.name.ilike(like)))
-    items = qry.order_by(Subagent.name.asc()).all()
-    return render_template("directory/subagents_list.html", items=items, q=q)
+    return render_template(
+        "directory/subagents_list.html",
+        q=q,
+        **listing("subagent", qry, bool(q), "directory.subagents_list"),
+    )
 
 
 @bp.route("/subagents/new", methods=["GET", "POST"])
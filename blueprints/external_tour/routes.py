@@ -1,15 +1,64 @@
-from flask import render_template
+from flask import render_template, request
 from flask_login import login_required
+from sqlalchemy import func
 
+from extensions import db
 from models import ExternalTour
+from pagination import per_page_arg
 from security import ROLE, roles_required
 
 from . import bp
 
+# ?sort= → порядок; net_profit/margin считаются в БД (гибриды, есть индексы)
+SORTS = {
+    "start_date": (ExternalTour.start_date.desc(), ExternalTour.id.desc()),
+    "net_profit": (ExternalTour.net_profit.asc(), ExternalTour.id),
+    "-net_profit": (ExternalTour.net_profit.desc(), ExternalTour.id.desc()),
+    "margin": (ExternalTour.margin.asc(), ExternalTour.id),
+    "-margin": (ExternalTour.margin.desc(), ExternalTour.id.desc()),
+}
+
 
 @bp.route("/")
 @login_required
 @roles_required(ROLE["MANAGER_EXT"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def list_tours():
-    items = ExternalTour.query.order_by(ExternalTour.start_date.desc()).limit(200).all()
-    return render_template("external_tour/list.html", items=items)
+    sort = request.args.get("sort", "start_date")
+    if sort not in SORTS:
+        sort = "start_date"
+    profit = request.args.get("profit", "")
+
+    filters = []
+    if profit == "negative":
+        filters.append(ExternalTour.net_profit < 0)
+    elif profit == "positive":
+        filters.append(ExternalTour.net_profit > 0)
+
+    items = (
+        ExternalTour.query.filter(*filters)
+        .order_by(*SORTS[sort])
+        .limit(per_page_arg(200))
+        .all()
+    )
+
+    # итоги по валютам — агрегатом в БД, без загрузки всех туров
+    totals = (
+        db.session.query(
+            ExternalTour.currency,
+            func.count(ExternalTour.id),
+            func.sum(ExternalTour.sale_price),
+            func.sum(ExternalTour.net_profit),
+        )
+        .filter(*filters)
+        .group_by(ExternalTour.currency)
+        .order_by(ExternalTour.currency)
+        .all()
+    )
+
+    return render_template(
+        "external_tour/list.html",
+        items=items,
+        totals=totals,
+        sort=sort,
+        profit=profit,
+    )
@@ -1,15 +1,64 @@
-from flask import render_template
+from flask import render_template, request
 from flask_login import login_required
+from sqlalchemy import func
 
+from extensions import db
 from models import InternalTour
+from pagination import per_page_arg
 from security import ROLE, roles_required
 
 from . import bp
 
+# ?sort= → порядок; net_profit/margin считаются в БД (гибриды, есть индексы)
+SORTS = {
+    "start_date": (InternalTour.start_date.desc(), InternalTour.id.desc()),
+    "net_profit": (InternalTour.net_profit.asc(), InternalTour.id),
+    "-net_profit": (InternalTour.net_profit.desc(), InternalTour.id.desc()),
+    "margin": (InternalTour.margin.asc(), InternalTour.id),
+    "-margin": (InternalTour.margin.desc(), InternalTour.id.desc()),
+}
+
 
 @bp.route("/")
 @login_required
 @roles_required(ROLE["MANAGER_INT"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def list_tours():
-    items = InternalTour.query.order_by(InternalTour.start_date.desc()).limit(200).all()
-    return render_template("internal_tour/list.html", items=items)
+    sort = request.args.get("sort", "start_date")
+    if sort not in SORTS:
+        sort = "start_date"
+    profit = request.args.get("profit", "")
+
+    filters = []
+    if profit == "negative":
+        filters.append(InternalTour.net_profit < 0)
+    elif profit == "positive":
+        filters.append(InternalTour.net_profit > 0)
+
+    items = (
+        InternalTour.query.filter(*filters)
+        .order_by(*SORTS[sort])
+        .limit(per_page_arg(200))
+        .all()
+    )
+
+    # итоги по валютам — агрегатом в БД, без загрузки всех туров
+    totals = (
+        db.session.query(
+            InternalTour.currency,
+            func.count(InternalTour.id),
+            func.sum(InternalTour.sale_price),
+            func.sum(InternalTour.net_profit),
+        )
+        .filter(*filters)
+        .group_by(InternalTour.currency)
+        .order_by(InternalTour.currency)
+        .all()
+    )
+
+    return render_template(
+        "internal_tour/list.html",
+        items=items,
+        totals=totals,
+        sort=sort,
+        profit=profit,
+    )
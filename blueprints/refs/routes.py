@@ -3,6 +3,7 @@ from flask import flash, redirect, render_template, request, url_for
 from flask_login import login_required
 from sqlalchemy.exc import IntegrityError
 
+from blueprints.directory.listing import listing
 from extensions import db
 from models import Client
 
@@ -72,11 +73,17 @@ def clients():
         like = f"%{term}%"
         q = q.filter((Client.code.ilike(like)) | (Client.name.ilike(like)))
 
-    items = q.order_by(Client.name.asc()).all()
+    listed = listing("client", q, bool(status or acc_type or term), "refs.clients")
     return render_template(
         "refs/clients.html",
         form=form,
-        items=items,
+        clients=listed["items"],
+        pagination=listed["page"],
+        total=listed["total"],
+        total_exact=listed["total_exact"],
+        next_url=listed["next_url"],
+        prev_url=listed["prev_url"],
+        q=term,
         status=status,
         acc_type=acc_type,
         term=term,
@@ -1,10 +1,126 @@
-from flask import render_template
+from datetime import date, timedelta
+
+from flask import render_template, request
 from flask_login import login_required
 
-from . import bp
+import fx
+from extensions import db
+from models import SalesRollup, User
+from security import ROLE, roles_required
+
+from . import bp, sales
+
+# окно дневной разбивки
+MAX_DAYS = 366
+
+
+def _date_arg(name: str, default: date) -> date:
+    try:
+        return date.fromisoformat(request.args.get(name) or "")
+    except ValueError:
+        return default
+
+
+def _month_end(month: date, today: date) -> date:
+    """Последний день месяца, но не позже сегодняшнего (курса на будущее нет)."""
+    end = sales.month_of(month + timedelta(days=32)) - timedelta(days=1)
+    return min(end, today)
 
 
 @bp.route("/sales-summary")
 @login_required
+@roles_required(ROLE["ACCOUNTANT"], ROLE["FINANCIER"], ROLE["EXEC"], ROLE["ADMIN"])
 def sales_summary():
-    return render_template("reports/sales_summary.html")
+    """
+    Выручка, себестоимость и маржа по сегментам из свода SalesRollup:
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&by=day|month&segment=…&currency=…&users=1.
+    По месяцам диапазон округляется до целых месяцев. ?in=USD — итоги всех
+    валют в одной по курсу на день строки (для месяца — на его последний день).
+    """
+    today = date.today()
+    date_from = _date_arg("from", today.replace(month=1, day=1))
+    date_to = _date_arg("to", today)
+    if date_to < date_from:
+        date_to = date_from
+    by = "day" if request.args.get("by") == "day" else "month"
+    if by == "day":
+        date_to = min(date_to, date_from + timedelta(days=MAX_DAYS - 1))
+    else:
+        date_from = sales.month_of(date_from)
+    segment = request.args.get("segment") or ""
+    currency = (request.args.get("currency") or "").strip().upper()
+    by_user = request.args.get("users") == "1"
+    target = (request.args.get("in") or "").strip().upper()[:3]
+
+    r = SalesRollup
+    keys = [r.period, r.segment, r.currency]
+    if by_user:
+        keys.append(r.user_id)
+    q = db.session.query(
+        *keys,
+        db.func.sum(r.orders).label("orders"),
+        db.func.sum(r.revenue).label("revenue"),
+        db.func.sum(r.cost).label("cost"),
+    ).filter(
+        r.grain == ("d" if by == "day" else "m"),
+        r.period >= date_from,
+        r.period <= date_to,
+    )
+    if segment in sales.SEGMENTS:
+        q = q.filter(r.segment == segment)
+    if currency:
+        q = q.filter(r.currency == currency)
+    rows = q.group_by(*keys).order_by(*keys).all()
+
+    totals = {}
+    for row in rows:
+        acc = totals.setdefault(
+            (row.segment, row.currency), {"orders": 0, "revenue": 0, "cost": 0}
+        )
+        acc["orders"] += row.orders
+        acc["revenue"] += row.revenue
+        acc["cost"] += row.cost
+    consolidated, no_rate = {}, set()
+    if target:
+        points = [
+            {
+                "currency": row.currency,
+                "day": row.period if by == "day" else _month_end(row.period, today),
+                "revenue": row.revenue,
+                "cost": row.cost,
+            }
+            for row in rows
+        ]
+        converted = fx.convert_many(points, target, fields=("revenue", "cost"))
+        for row, (revenue, cost) in zip(rows, converted):
+            if revenue is None:
+                no_rate.add(row.currency)
+                continue
+            acc = consolidated.setdefault(
+                row.segment, {"orders": 0, "revenue": 0, "cost": 0}
+            )
+            acc["orders"] += row.orders
+            acc["revenue"] += revenue
+            acc["cost"] += cost
+
+    users = {}
+    if by_user:
+        ids = {row.user_id for row in rows}
+        users = {u.id: u.username for u in User.query.filter(User.id.in_(ids))}
+
+    return render_template(
+        "reports/sales_summary.html",
+        rows=rows,
+        totals=dict(sorted(totals.items())),
+        users=users,
+        by=by,
+        by_user=by_user,
+        date_from=date_from,
+        date_to=date_to,
+        segment=segment,
+        currency=currency,
+        target=target,
+        consolidated=consolidated,
+        no_rate=sorted(no_rate),
+        labels=sales.SEGMENT_LABELS,
+    )
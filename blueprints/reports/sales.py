@@ -0,0 +1,197 @@
+# C:\tourismops\blueprints\reports\sales.py
+"""
+Свод продаж по сегментам (SalesRollup): билеты, внутренние и внешние туры.
+
+Каждая вставка/правка/удаление продажи в той же транзакции сдвигает две
+строки свода — дневную и месячную — по ключу (период, сегмент,
+пользователь, валюта). Отчёт читает только строки своего диапазона,
+поэтому время ответа не зависит от длины истории.
+
+Выручка и себестоимость: у билета — total_supplier и total_supplier минус
+наш сбор; у тура — sale_price и cost. Дата продажи — sale_date билета
+(иначе дата создания) и дата создания тура.
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import Date, and_, func, insert, select, type_coerce
+
+from extensions import db
+from incremental import FlushTracker, upsert_add
+from models import ExternalTour, InternalTour, SalesRollup, TicketSale
+
+ZERO = Decimal("0.00")
+
+SEGMENTS = {
+    "ticket": TicketSale,
+    "internal_tour": InternalTour,
+    "external_tour": ExternalTour,
+}
+SEGMENT_LABELS = {
+    "ticket": "Билеты",
+    "internal_tour": "Внутр. туризм",
+    "external_tour": "Внешн. туризм",
+}
+_SEGMENT_BY_MODEL = {model: segment for segment, model in SEGMENTS.items()}
+
+# поля модели, из которых складывается вклад в свод
+_FIELDS = {
+    TicketSale: (
+        "user_id",
+        "currency",
+        "sale_date",
+        "created_at",
+        "total_supplier",
+        "our_fee_supplier",
+    ),
+    InternalTour: ("user_id", "currency", "created_at", "sale_price", "cost"),
+    ExternalTour: ("user_id", "currency", "created_at", "sale_price", "cost"),
+}
+
+
+def month_of(day: date) -> date:
+    return day.replace(day=1)
+
+
+def zero_delta():
+    return [0, ZERO, ZERO]
+
+
+def _amount(value) -> Decimal:
+    return Decimal(value or 0)
+
+
+# ---- инкрементальное ведение -----------------------------------------------
+def contribution(segment: str, values: dict):
+    """(день, пользователь, валюта, [заказов, выручка, себестоимость])."""
+    if segment == "ticket":
+        day = values.get("sale_date")
+        revenue = _amount(values.get("total_supplier"))
+        cost = revenue - _amount(values.get("our_fee_supplier"))
+    else:
+        day = None
+        revenue = _amount(values.get("sale_price"))
+        cost = _amount(values.get("cost"))
+    if day is None:
+        day = (values.get("created_at") or datetime.utcnow()).date()
+    return day, values["user_id"], values.get("currency") or "USD", [1, revenue, cost]
+
+
+def add_contribution(deltas: dict, segment: str, values: dict, sign: int = 1):
+    day, user_id, currency, vector = contribution(segment, values)
+    for key in (
+        ("d", day, segment, user_id, currency),
+        ("m", month_of(day), segment, user_id, currency),
+    ):
+        acc = deltas[key]
+        for i, v in enumerate(vector):
+            acc[i] += sign * v
+
+
+def apply_deltas(conn, deltas: dict):
+    """deltas: {(зерно, период, сегмент, пользователь, валюта): [заказов, выручка, себест.]}"""
+    t = SalesRollup.__table__
+    for (grain, period, segment, user_id, currency), vec in sorted(deltas.items()):
+        if not any(vec):
+            continue
+        key = {
+            "grain": grain,
+            "period": period,
+            "segment": segment,
+            "user_id": user_id,
+            "currency": currency,
+        }
+        upsert_add(conn, t, key, dict(zip(("orders", "revenue", "cost"), vec)))
+
+
+def _add(deltas, model, values, sign):
+    add_contribution(deltas, _SEGMENT_BY_MODEL[model], values, sign)
+
+
+FlushTracker("sales", _FIELDS, _add, apply_deltas, new=lambda: defaultdict(zero_delta))
+
+
+# ---- пересборка ------------------------------------------------------------
+def _day_sql(model):
+    created = type_coerce(func.date(model.created_at), Date)
+    if model is TicketSale:
+        return func.coalesce(TicketSale.sale_date, created)
+    return created
+
+
+def _measures_sql(model):
+    if model is TicketSale:
+        revenue = func.coalesce(TicketSale.total_supplier, 0)
+        return revenue, revenue - func.coalesce(TicketSale.our_fee_supplier, 0)
+    return func.coalesce(model.sale_price, 0), func.coalesce(model.cost, 0)
+
+
+def _in_range(model, date_from: date, date_to: date):
+    start = datetime.combine(date_from, time.min)
+    end = datetime.combine(date_to + timedelta(days=1), time.min)
+    by_created = and_(model.created_at >= start, model.created_at < end)
+    if model is TicketSale:
+        return and_(
+            TicketSale.sale_date >= date_from, TicketSale.sale_date <= date_to
+        ) | and_(TicketSale.sale_date.is_(None), by_created)
+    return by_created
+
+
+def rebuild(date_from: date, date_to: date) -> int:
+    """
+    Пересчитать свод за [date_from, date_to], расширенный до целых месяцев
+    (месячные строки иначе были бы неполными). Группировка по дню — в SQL,
+    в месяцы дни сворачиваются здесь. Возвращает число записанных строк.
+    """
+    date_from = month_of(date_from)
+    date_to = month_of(month_of(date_to) + timedelta(days=32)) - timedelta(days=1)
+    t = SalesRollup.__table__
+
+    deltas = defaultdict(zero_delta)
+    for segment, model in SEGMENTS.items():
+        day = _day_sql(model)
+        revenue, cost = _measures_sql(model)
+        q = (
+            select(
+                day.label("day"),
+                model.user_id,
+                model.currency,
+                func.count(),
+                func.sum(revenue),
+                func.sum(cost),
+            )
+            .where(_in_range(model, date_from, date_to))
+            .group_by(day, model.user_id, model.currency)
+        )
+        for d, user_id, currency, count, rev, cst in db.session.execute(q):
+            if isinstance(d, str):  # SQLite: coalesce(...) без типа колонки
+                d = date.fromisoformat(d)
+            for key in (
+                ("d", d, segment, user_id, currency),
+                ("m", month_of(d), segment, user_id, currency),
+            ):
+                acc = deltas[key]
+                acc[0] += count
+                acc[1] += _amount(rev)
+                acc[2] += _amount(cst)
+
+    db.session.execute(t.delete().where(t.c.period >= date_from, t.c.period <= date_to))
+    rows = [
+        {
+            "grain": grain,
+            "period": period,
+            "segment": segment,
+            "user_id": user_id,
+            "currency": currency,
+            "orders": vec[0],
+            "revenue": vec[1],
+            "cost": vec[2],
+        }
+        for (grain, period, segment, user_id, currency), vec in sorted(deltas.items())
+    ]
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(t), rows[i : i + 1000])
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,449 @@
+# C:\tourismops\blueprints\tickets\bsp.py
+"""
+Загрузка расчётных файлов BSP (HOT и CSV) в TicketSale.
+
+Файл читается потоком, записи собираются в пачки по BATCH_SIZE. Для
+каждой пачки по индексу ticket_number запрашиваются только её номера —
+уже загруженные билеты пропускаются, в БД уходит один executemany.
+Память ограничена размером пачки, а не файла. Поставщик определяется
+по колонке кода поставщика, иначе по коду авиакомпании — через
+словарь Supplier.code → id из справочника в памяти (refdata).
+"""
+
+import csv
+import io
+from calendar import month_abbr
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+
+from sqlalchemy import insert, select
+
+import refdata
+import search
+from blueprints.core import dashboard
+from blueprints.reports import sales
+from extensions import db
+from models import TicketSale
+from translit import name_key
+
+from . import rollups
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+# заголовок CSV → поле
+COLUMNS = {
+    "airline": "airline_code",
+    "airline_code": "airline_code",
+    "код а/к": "airline_code",
+    "ticket": "ticket_number",
+    "ticket_number": "ticket_number",
+    "document": "ticket_number",
+    "tdnr": "ticket_number",
+    "номер а/б": "ticket_number",
+    "passenger": "passenger_name",
+    "passenger_name": "passenger_name",
+    "фио": "passenger_name",
+    "пассажир": "passenger_name",
+    "pnr": "order_number",
+    "order_number": "order_number",
+    "номер заказа": "order_number",
+    "route": "route",
+    "маршрут": "route",
+    "flight": "flight_number",
+    "flight_number": "flight_number",
+    "№ рейс": "flight_number",
+    "issue_date": "sale_date",
+    "sale_date": "sale_date",
+    "дата продажи": "sale_date",
+    "departure_date": "departure_date",
+    "дата вылета": "departure_date",
+    "currency": "currency",
+    "валюта": "currency",
+    "fare": "fare_supplier",
+    "тариф": "fare_supplier",
+    "tax": "tax_supplier",
+    "taxes": "tax_supplier",
+    "сборы": "tax_supplier",
+    "fees": "other_fees_supplier",
+    "прочие сборы": "other_fees_supplier",
+    "our_fee": "our_fee_supplier",
+    "наши сборы": "our_fee_supplier",
+    "total": "total_supplier",
+    "итого": "total_supplier",
+    "supplier": "supplier_code",
+    "код поставщика": "supplier_code",
+}
+
+AMOUNT_FIELDS = (
+    "fare_supplier",
+    "tax_supplier",
+    "other_fees_supplier",
+    "our_fee_supplier",
+    "total_supplier",
+)
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%Y%m%d", "%y%m%d")
+
+
+class BspFileError(Exception):
+    """Файл нельзя разобрать целиком (формат, заголовок)."""
+
+
+@dataclass
+class BspResult:
+    total: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    errors: list = field(default_factory=list)  # [(номер строки, сообщение)]
+    error_count: int = 0
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# ---- разбор значений -------------------------------------------------------
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _parse_date(value) -> date | None:
+    raw = _text(value)
+    if not raw:
+        return None
+    return _parse_date_str(raw)
+
+
+@lru_cache(maxsize=4096)  # в файле BSP всего несколько десятков разных дат
+def _parse_date_str(raw: str) -> date:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"неверная дата «{raw}»")
+
+
+def _parse_amount(value, name: str) -> Decimal | None:
+    raw = _text(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+    if not raw:
+        return None
+    try:
+        return Decimal(raw)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{name}: не число «{_text(value)}»")
+
+
+# ---- CSV -------------------------------------------------------------------
+def iter_csv(stream):
+    """(номер строки, запись | ValueError) из CSV-выгрузки BSP."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    mapping = [COLUMNS.get(_text(h).lower()) for h in header]
+    if "ticket_number" not in mapping:
+        raise BspFileError("В файле нет колонки номера билета")
+
+    for line, values in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not any(_text(v) for v in values):
+            continue
+        data = {name: v for name, v in zip(mapping, values) if name}
+        try:
+            rec = {
+                name: _text(data.get(name)) or None
+                for name in (
+                    "airline_code",
+                    "ticket_number",
+                    "passenger_name",
+                    "order_number",
+                    "route",
+                    "flight_number",
+                    "supplier_code",
+                )
+            }
+            rec["currency"] = _text(data.get("currency")).upper() or None
+            rec["sale_date"] = _parse_date(data.get("sale_date"))
+            rec["departure_date"] = _parse_date(data.get("departure_date"))
+            for name in AMOUNT_FIELDS:
+                rec[name] = _parse_amount(data.get(name), name)
+            yield line, rec
+        except ValueError as exc:
+            yield line, exc
+
+
+# ---- HOT -------------------------------------------------------------------
+# Подмножество записей DISH: позиции 1-based, включительно. Каждая запись
+# начинается с SMSG (3), SQNR (8), STNQ (2) — например «BKS» + … + «24».
+HOT_LAYOUT = {
+    "BKS24": {"dais": (14, 19), "tdnr": (26, 40), "pnrr": (80, 92)},
+    "BKS30": {
+        "tdnr": (26, 40),
+        "cobl": (42, 52),
+        "tmfa1": (72, 82),
+        "tmfa2": (91, 101),
+        "tdam": (102, 112),
+        "cutp": (113, 116),
+    },
+    "BAR65": {"tdnr": (26, 40), "pxnm": (42, 90)},
+    "BKI63": {
+        "tdnr": (26, 40),
+        "orac": (47, 51),
+        "dstc": (52, 56),
+        "carr": (62, 64),
+        "ftnr": (65, 69),
+        "ftda": (73, 77),
+    },
+}
+# конец транзакции / файла
+HOT_BREAKS = ("BKT06", "BCT95", "BOT93", "BOT94", "BFT99")
+
+# знаковый «overpunch» в последнем символе числовых полей
+_OVERPUNCH = {c: (str(i), 1) for i, c in enumerate("{ABCDEFGHI")}
+_OVERPUNCH.update({c: (str(i), -1) for i, c in enumerate("}JKLMNOPQR")})
+
+_MONTHS = {name.upper(): i for i, name in enumerate(month_abbr) if name}
+
+
+def _hot_field(line: str, pos) -> str:
+    return line[pos[0] - 1 : pos[1]].strip()
+
+
+def _hot_amount(raw: str, places: int) -> Decimal | None:
+    if not raw:
+        return None
+    digit, sign = _OVERPUNCH.get(raw[-1], (raw[-1], 1))
+    digits = raw[:-1] + digit
+    if not digits.isdigit():
+        raise ValueError(f"сумма: не число «{raw}»")
+    return sign * Decimal(digits).scaleb(-places)
+
+
+def _hot_date(raw: str) -> date | None:
+    """DAIS — YYMMDD."""
+    if not raw:
+        return None
+    try:
+        return date(2000 + int(raw[:2]), int(raw[2:4]), int(raw[4:6]))
+    except ValueError:
+        raise ValueError(f"неверная дата «{raw}»")
+
+
+def _hot_flight_date(raw: str, issued: date | None) -> date | None:
+    """FTDA — «15MAR» без года: берём ближайший год не раньше даты выписки."""
+    month = _MONTHS.get(raw[2:5]) if len(raw) >= 5 else None
+    if not month or not raw[:2].isdigit():
+        return None
+    base = issued or date.today()
+    for year in (base.year, base.year + 1):
+        try:
+            d = date(year, month, int(raw[:2]))
+        except ValueError:  # 29FEB не в високосный год
+            continue
+        if d >= base:
+            return d
+    return None
+
+
+def _hot_record(parts: dict) -> dict:
+    bks24 = parts.get("BKS24", {})
+    bks30 = parts.get("BKS30", {})
+    issued = _hot_date(bks24.get("dais"))
+    cutp = bks30.get("cutp", "")
+    currency = cutp[:3] or None
+    places = int(cutp[3]) if len(cutp) > 3 and cutp[3].isdigit() else 2
+
+    taxes = [_hot_amount(bks30.get(k, ""), places) for k in ("tmfa1", "tmfa2")]
+    taxes = [t for t in taxes if t is not None]
+    segments = parts.get("BKI63", [])
+    first = segments[0] if segments else {}
+
+    route = None
+    if segments:
+        points = [segments[0].get("orac")] + [s.get("dstc") for s in segments]
+        route = "-".join(p for p in points if p)
+
+    tdnr = bks24.get("tdnr") or bks30.get("tdnr")
+    return {
+        "airline_code": first.get("carr") or (tdnr[:3] if tdnr else None),
+        "ticket_number": tdnr,
+        "passenger_name": parts.get("BAR65", {}).get("pxnm") or None,
+        "order_number": bks24.get("pnrr") or None,
+        "route": route,
+        "flight_number": (
+            f"{first.get('carr', '')}{first.get('ftnr', '')}".strip() or None
+        ),
+        "sale_date": issued,
+        "departure_date": _hot_flight_date(first.get("ftda"), issued),
+        "currency": currency,
+        "fare_supplier": _hot_amount(bks30.get("cobl", ""), places),
+        "tax_supplier": sum(taxes) if taxes else None,
+        "other_fees_supplier": None,
+        "our_fee_supplier": None,
+        "total_supplier": _hot_amount(bks30.get("tdam", ""), places),
+        "supplier_code": None,
+    }
+
+
+def iter_hot(stream):
+    """
+    (номер строки, запись | ValueError) из HOT: одна запись на документ,
+    собранная из BKS24 / BKS30 / BAR65 / BKI63 одной транзакции.
+    """
+    text = io.TextIOWrapper(stream, encoding="latin-1", newline="")
+    parts, start = {}, 0
+
+    def emit():
+        if not parts.get("BKS24") and not parts.get("BKS30"):
+            return None
+        try:
+            return start, _hot_record(parts)
+        except ValueError as exc:
+            return start, exc
+
+    for line_no, raw in enumerate(text, start=1):
+        line = raw.rstrip("\r\n")
+        rid = line[:3] + line[11:13]
+        if rid in HOT_BREAKS:
+            item = emit()
+            if item:
+                yield item
+            parts, start = {}, line_no
+            continue
+        layout = HOT_LAYOUT.get(rid)
+        if layout is None:
+            continue
+        values = {k: _hot_field(line, pos) for k, pos in layout.items()}
+        # новый документ внутри той же транзакции (conjunction tickets)
+        if rid == "BKS24" and parts.get("BKS24"):
+            item = emit()
+            if item:
+                yield item
+            parts = {}
+        if not parts:
+            start = line_no
+        if rid == "BKI63":
+            parts.setdefault(rid, []).append(values)
+        else:
+            parts.setdefault(rid, values)
+
+    item = emit()
+    if item:
+        yield item
+
+
+def iter_file(stream, filename: str, fmt: str | None = None):
+    fmt = fmt or ("csv" if filename.lower().endswith(".csv") else "hot")
+    if fmt == "hot":
+        return iter_hot(stream)
+    return iter_csv(stream)
+
+
+# ---- загрузка --------------------------------------------------------------
+class _SupplierMap:
+    """Supplier.code → id по справочнику в памяти (refdata)."""
+
+    def __init__(self):
+        self.codes = refdata.ids_by_code("supplier")
+
+    def resolve(self, supplier_code, airline_code):
+        for code in (supplier_code, airline_code):
+            if code and code in self.codes:
+                return self.codes[code]
+        return None
+
+
+def _existing(numbers) -> set:
+    t = TicketSale.__table__
+    return set(
+        db.session.execute(
+            select(t.c.ticket_number).where(t.c.ticket_number.in_(numbers))
+        ).scalars()
+    )
+
+
+def import_records(
+    records, user_id: int, default_currency: str = "USD", progress=None
+) -> BspResult:
+    """
+    records — итератор (номер строки, запись | ValueError).
+    Ошибочные строки попадают в отчёт, новые билеты — в БД.
+    """
+    result = BspResult()
+    suppliers = _SupplierMap()
+    table = TicketSale.__table__
+    mark = search.bulk_mark(db.session.connection(), "ticket")
+    deltas = defaultdict(rollups.zero_delta)
+    sales_deltas = defaultdict(sales.zero_delta)
+    now = datetime.utcnow()
+    chunk = []
+
+    def flush():
+        if not chunk:
+            return
+        known = _existing({r["ticket_number"] for r in chunk})
+        batch = []
+        for rec in chunk:
+            if rec["ticket_number"] in known:
+                result.duplicates += 1
+                continue
+            known.add(rec["ticket_number"])  # повтор внутри пачки
+            batch.append(rec)
+            rollups.add_contribution(deltas, rec)
+            sales.add_contribution(sales_deltas, "ticket", rec)
+        if batch:
+            db.session.execute(insert(table), batch)
+            result.inserted += len(batch)
+        chunk.clear()
+        if progress:
+            progress(result)
+
+    try:
+        for line, rec in records:
+            result.total += 1
+            if isinstance(rec, Exception):
+                result.add_error(line, str(rec))
+                continue
+            if not rec["ticket_number"]:
+                result.add_error(line, "номер билета: обязательное поле")
+                continue
+
+            total = rec["total_supplier"]
+            if total is None:
+                parts = [rec[n] for n in AMOUNT_FIELDS[:-1] if rec[n] is not None]
+                total = sum(parts) if parts else None
+
+            supplier_code = rec.pop("supplier_code")
+            rec.update(
+                user_id=user_id,
+                client_id=None,
+                supplier_id=suppliers.resolve(supplier_code, rec["airline_code"]),
+                ticket_number=rec["ticket_number"][:32],
+                passenger_key=name_key(rec["passenger_name"]),
+                currency=rec["currency"] or default_currency,
+                total_supplier=total,
+                rate=None,
+                created_at=now,
+            )
+            chunk.append(rec)
+            if len(chunk) >= BATCH_SIZE:
+                flush()
+        flush()
+        rollups.apply_deltas(db.session.connection(), deltas)
+        sales.apply_deltas(db.session.connection(), sales_deltas)
+        dashboard.touch(db.session, "tickets")
+        search.index_since(db.session.connection(), "ticket", mark)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return result
+
+
+def import_file(stream, filename: str, user_id: int, fmt: str | None = None, **kw):
+    return import_records(iter_file(stream, filename, fmt), user_id, **kw)
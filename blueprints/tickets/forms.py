@@ -0,0 +1,14 @@
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired
+from wtforms import SelectField
+
+BSP_FORMAT_CHOICES = [
+    ("", "Определить по расширению"),
+    ("hot", "HOT (DISH)"),
+    ("csv", "CSV"),
+]
+
+
+class BspImportForm(FlaskForm):
+    file = FileField("Файл BSP", validators=[FileRequired()])
+    fmt = SelectField("Формат", choices=BSP_FORMAT_CHOICES, default="")
@@ -0,0 +1,139 @@
+# C:\tourismops\blueprints\tickets\rollups.py
+"""
+Месячные своды продаж билетов (TicketSaleMonthly).
+
+Каждая вставка/правка/удаление TicketSale в той же транзакции сдвигает
+счётчик и суммы своей строки свода (месяц sale_date, код А/К, поставщик,
+валюта). Билеты без sale_date в своды не попадают. Отчёты по
+авиакомпаниям читают сотни строк свода вместо всего реестра.
+"""
+
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import func, insert, select
+
+from extensions import db
+from incremental import FlushTracker, upsert_add
+from models import TicketSale, TicketSaleMonthly
+
+AMOUNTS = (
+    "fare_supplier",
+    "tax_supplier",
+    "other_fees_supplier",
+    "our_fee_supplier",
+    "total_supplier",
+)
+_FIELDS = ("sale_date", "airline_code", "supplier_id", "currency") + AMOUNTS
+ZERO = Decimal("0.00")
+
+
+def month_of(day: date) -> date:
+    return day.replace(day=1)
+
+
+def zero_delta():
+    return [0] + [ZERO] * len(AMOUNTS)
+
+
+# ---- инкрементальное ведение -----------------------------------------------
+def contribution(values: dict):
+    """(ключ свода, [билетов, суммы…]) для одного билета или None без даты."""
+    if not values.get("sale_date"):
+        return None
+    key = (
+        month_of(values["sale_date"]),
+        values.get("airline_code") or "",
+        values.get("supplier_id") or 0,
+        values.get("currency") or "USD",
+    )
+    return key, [1] + [Decimal(values.get(f) or 0) for f in AMOUNTS]
+
+
+def add_contribution(deltas: dict, values: dict, sign: int = 1):
+    item = contribution(values)
+    if item is None:
+        return
+    key, vector = item
+    acc = deltas[key]
+    for i, v in enumerate(vector):
+        acc[i] += sign * v
+
+
+def apply_deltas(conn, deltas: dict):
+    """deltas: {(месяц, А/К, поставщик, валюта): [билетов, суммы…]}"""
+    t = TicketSaleMonthly.__table__
+    for (month, airline, supplier_id, currency), vec in sorted(deltas.items()):
+        if not any(vec):
+            continue
+        key = {
+            "month": month,
+            "airline_code": airline,
+            "supplier_id": supplier_id,
+            "currency": currency,
+        }
+        upsert_add(conn, t, key, dict(zip(("tickets",) + AMOUNTS, vec)))
+
+
+FlushTracker(
+    "ticket",
+    {TicketSale: _FIELDS},
+    lambda deltas, model, values, sign: add_contribution(deltas, values, sign),
+    apply_deltas,
+    new=lambda: defaultdict(zero_delta),
+)
+
+
+# ---- пересборка ------------------------------------------------------------
+def rebuild(month: date | None = None) -> int:
+    """
+    Пересчитать своды за месяц month (или целиком) по TicketSale.
+    Группировка по дню sale_date переносима между СУБД; в месяцы
+    дни сворачиваются здесь. Возвращает число записанных строк.
+    """
+    t = TicketSaleMonthly.__table__
+    s = TicketSale.__table__
+
+    q = select(
+        s.c.sale_date,
+        s.c.airline_code,
+        s.c.supplier_id,
+        s.c.currency,
+        func.count(),
+        *(func.sum(s.c[f]) for f in AMOUNTS),
+    ).where(s.c.sale_date.isnot(None))
+    delete = t.delete()
+    if month is not None:
+        month = month_of(month)
+        nxt = month_of(date.fromordinal(month.toordinal() + 31))
+        q = q.where(s.c.sale_date >= month, s.c.sale_date < nxt)
+        delete = delete.where(t.c.month == month)
+    q = q.group_by(s.c.sale_date, s.c.airline_code, s.c.supplier_id, s.c.currency)
+
+    deltas = defaultdict(zero_delta)
+    for sale_date, airline, supplier_id, currency, count, *sums in db.session.execute(
+        q
+    ):
+        key = (month_of(sale_date), airline or "", supplier_id or 0, currency)
+        acc = deltas[key]
+        acc[0] += count
+        for i, v in enumerate(sums, start=1):
+            acc[i] += v or ZERO
+
+    db.session.execute(delete)
+    rows = []
+    for (m, airline, supplier_id, currency), vec in sorted(deltas.items()):
+        row = {
+            "month": m,
+            "airline_code": airline,
+            "supplier_id": supplier_id,
+            "currency": currency,
+            "tickets": vec[0],
+        }
+        row.update(zip(AMOUNTS, vec[1:]))
+        rows.append(row)
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(t), rows[i : i + 1000])
+    db.session.commit()
+    return len(rows)
@@ -1,15 +1,144 @@
-from flask import render_template
-from flask_login import login_required
+from datetime import date, datetime
 
-from models import TicketSale
-from security import ROLE, roles_required
+from flask import flash, jsonify, render_template, request
+from flask_login import current_user, login_required
 
-from . import bp
+from audit import log_action
+from extensions import db
+from models import TicketSale, TicketSaleMonthly
+from security import ROLE, read_only_for, roles_required
+from translit import name_key, prefix_range
+
+from . import bp, rollups
+from .bsp import BspFileError, import_file
+from .forms import BspImportForm
 
 
 @bp.route("/")
 @login_required
 @roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
 def list_sales():
-    items = TicketSale.query.order_by(TicketSale.sale_date.desc()).limit(200).all()
-    return render_template("tickets/list.html", items=items)
+    q = TicketSale.query
+    passenger = (request.args.get("passenger") or "").strip()
+    if passenger:
+        q = _passenger_filter(q, passenger)
+    items = q.order_by(TicketSale.sale_date.desc()).limit(200).all()
+    return render_template("tickets/list.html", items=items, passenger=passenger)
+
+
+def _passenger_filter(q, text: str):
+    """Префикс по passenger_key — диапазон по индексу, без LIKE '%...%'."""
+    key = name_key(text)
+    if not key:
+        return q.filter(db.false())
+    lo, hi = prefix_range(key)
+    return q.filter(TicketSale.passenger_key >= lo, TicketSale.passenger_key < hi)
+
+
+@bp.route("/passengers/suggest")
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def passenger_suggest():
+    """Автодополнение ФИО пассажира: ?q=... (кириллица или латиница)."""
+    text = (request.args.get("q") or "").strip()
+    limit = min(request.args.get("limit", type=int) or 10, 50)
+    if len(text) < 2:
+        return jsonify(items=[])
+
+    rows = _passenger_filter(
+        TicketSale.query.with_entities(
+            TicketSale.passenger_key, TicketSale.passenger_name
+        ),
+        text,
+    ).order_by(TicketSale.passenger_key)
+
+    # один вариант написания на ключ; читаем с запасом на дубли
+    items, seen = [], set()
+    for key, name in rows.limit(limit * 10):
+        if key in seen:
+            continue
+        seen.add(key)
+        items.append({"key": key, "name": name})
+        if len(items) >= limit:
+            break
+    return jsonify(items=items)
+
+
+@bp.route("/import", methods=["GET", "POST"])
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["ADMIN"])
+@read_only_for(ROLE["CURATOR"])
+def import_bsp():
+    form = BspImportForm()
+    result = None
+
+    if form.validate_on_submit():
+        upload = form.file.data
+        try:
+            result = import_file(
+                upload.stream,
+                upload.filename or "",
+                current_user.id,
+                fmt=form.fmt.data or None,
+            )
+        except BspFileError as exc:
+            flash(str(exc), "danger")
+        else:
+            log_action(
+                "tickets:import",
+                f"file={upload.filename} new={result.inserted} "
+                f"dup={result.duplicates} errors={result.error_count}",
+            )
+            flash(
+                f"Новых билетов: {result.inserted}, уже загружено ранее: {result.duplicates}",
+                "success",
+            )
+
+    return render_template("tickets/import.html", form=form, result=result)
+
+
+def _month_arg(name: str, default: date) -> date:
+    raw = request.args.get(name)
+    if raw:
+        try:
+            return datetime.strptime(raw, "%Y-%m").date()
+        except ValueError:
+            pass
+    return default
+
+
+@bp.route("/airlines")
+@login_required
+@roles_required(ROLE["FINANCIER"], ROLE["ACCOUNTANT"], ROLE["EXEC"], ROLE["ADMIN"])
+def airline_report():
+    """
+    Продажи и сборы по авиакомпаниям из месячных сводов:
+    ?from=YYYY-MM&to=YYYY-MM&by=month (разбивка по месяцам).
+    """
+    this_month = rollups.month_of(date.today())
+    date_from = _month_arg("from", this_month.replace(month=1))
+    date_to = _month_arg("to", this_month)
+    by_month = request.args.get("by") == "month"
+
+    m = TicketSaleMonthly
+    keys = [m.airline_code, m.currency]
+    if by_month:
+        keys.insert(0, m.month)
+    rows = (
+        db.session.query(
+            *keys,
+            db.func.sum(m.tickets).label("tickets"),
+            *(db.func.sum(getattr(m, f)).label(f) for f in rollups.AMOUNTS),
+        )
+        .filter(m.month >= date_from, m.month <= date_to)
+        .group_by(*keys)
+        .order_by(*keys)
+        .all()
+    )
+    return render_template(
+        "tickets/airlines.html",
+        rows=rows,
+        date_from=date_from,
+        date_to=date_to,
+        by_month=by_month,
+    )
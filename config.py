@@ -5,6 +5,16 @@ class Config:
     SECRET_KEY = os.getenv("SECRET_KEY", "devkey")
     SQLALCHEMY_DATABASE_URI = os.getenv("SQLALCHEMY_DATABASE_URI")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # процессов для пакетной печати ордеров (None — по числу CPU)
+    ORDER_RENDER_WORKERS = int(os.getenv("ORDER_RENDER_WORKERS", "0")) or None
+    # аудит: фоновая пакетная запись (0 — писать синхронно)
+    AUDIT_ASYNC = os.getenv("AUDIT_ASYNC", "1") != "0"
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+    AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2"))
+    # фоновые задания: потоков на процесс (0 — только `manage.py run-jobs`)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_DIR = os.getenv("JOB_DIR")  # по умолчанию instance/jobs
+    JOB_RESULT_TTL_HOURS = float(os.getenv("JOB_RESULT_TTL_HOURS", "24"))
 
 
 class DevelopmentConfig(Config):
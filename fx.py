@@ -0,0 +1,376 @@
+# C:\tourismops\fx.py
+"""
+Курсы валют (FxRate) и пересчёт сумм в одну валюту для сводных отчётов.
+
+Курсы — дневные котировки пар base/quote, загружаются из CSV
+(`python manage.py import-fx-rates`). Курс на дату — последняя котировка
+не позже этой даты (выходные и праздники берут курс пятницы).
+
+Все курсы держатся в памяти процесса: по каждой паре отсортированный
+список дат и параллельный список курсов, поиск — bisect. Таблица мала
+(валюты × дни), поэтому грузится целиком одним SELECT при первом
+обращении. Кэш сбрасывается при записи курсов в этом процессе
+(after_flush) и при загрузке CSV; правки из других процессов видны
+не позже чем через CHECK_SECONDS — по отпечатку (count, max(updated_at)).
+
+convert_many пересчитывает весь результат отчёта за один проход:
+курс ищется один раз на каждую пару (валюта, дата), а не на строку.
+"""
+
+import csv
+import io
+import re
+import time
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import FxRate
+
+# валюта, к которой котируются курсы по умолчанию (курсы ЦБ)
+DEFAULT_QUOTE = "UZS"
+# через эти валюты считается кросс-курс, если прямой пары нет
+PIVOTS = ("UZS", "USD")
+# как часто сверять кэш с БД (правки из других процессов)
+CHECK_SECONDS = 60
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+CENT = Decimal("0.01")
+_CURRENCY = re.compile(r"^[A-Z]{3}$")
+
+# заголовок CSV → поле
+COLUMNS = {
+    "date": "day",
+    "day": "day",
+    "дата": "day",
+    "base": "base",
+    "currency": "base",
+    "ccy": "base",
+    "code": "base",
+    "валюта": "base",
+    "код": "base",
+    "quote": "quote",
+    "котировка": "quote",
+    "rate": "rate",
+    "курс": "rate",
+    "nominal": "nominal",
+    "номинал": "nominal",
+}
+
+DATE_FORMATS = ("%Y-%m-%d", "%d.%m.%Y", "%d/%m/%Y", "%Y%m%d")
+
+
+class FxError(Exception):
+    """Файл курсов нельзя разобрать целиком (формат, заголовок)."""
+
+
+@dataclass
+class FxLoadResult:
+    total: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)  # [(номер строки, сообщение)]
+    error_count: int = 0
+
+    def add_error(self, line: int, message: str):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+# ---- кэш курсов ------------------------------------------------------------
+class _RateCache:
+    """{(base, quote): (даты по возрастанию, курсы)} и отпечаток таблицы."""
+
+    def __init__(self):
+        self.pairs = None
+        self.fingerprint = None
+        self.checked = 0.0
+
+    def clear(self):
+        self.pairs = None
+
+    def _fingerprint(self):
+        t = FxRate.__table__
+        return tuple(
+            db.session.execute(select(func.count(), func.max(t.c.updated_at))).one()
+        )
+
+    def _load(self):
+        t = FxRate.__table__
+        pairs = {}
+        rows = db.session.execute(
+            select(t.c.base, t.c.quote, t.c.day, t.c.rate).order_by(
+                t.c.base, t.c.quote, t.c.day
+            )
+        )
+        for base, quote, day, rate in rows:
+            days, rates = pairs.setdefault((base, quote), ([], []))
+            days.append(day)
+            rates.append(Decimal(rate))
+        return pairs
+
+    def get(self) -> dict:
+        now = time.monotonic()
+        if self.pairs is not None and now - self.checked < CHECK_SECONDS:
+            return self.pairs
+        fingerprint = self._fingerprint()
+        if self.pairs is None or fingerprint != self.fingerprint:
+            self.pairs = self._load()
+            self.fingerprint = fingerprint
+        self.checked = now
+        return self.pairs
+
+
+_cache = _RateCache()
+
+
+def clear_cache():
+    _cache.clear()
+
+
+@event.listens_for(Session, "after_flush")
+def _drop_cached_rates(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, FxRate):
+            _cache.clear()
+            return
+
+
+# ---- курс на дату ----------------------------------------------------------
+def _quoted(pairs: dict, base: str, quote: str, day: date):
+    """Курс пары как есть или обратный; None, если котировок до day нет."""
+    series = pairs.get((base, quote))
+    if series:
+        i = bisect_right(series[0], day)
+        if i:
+            return series[1][i - 1]
+    series = pairs.get((quote, base))
+    if series:
+        i = bisect_right(series[0], day)
+        if i and series[1][i - 1]:
+            return 1 / series[1][i - 1]
+    return None
+
+
+def _rate(pairs: dict, base: str, quote: str, day: date):
+    if base == quote:
+        return Decimal(1)
+    rate = _quoted(pairs, base, quote, day)
+    if rate is not None:
+        return rate
+    for pivot in PIVOTS:
+        if pivot in (base, quote):
+            continue
+        to_pivot = _quoted(pairs, base, pivot, day)
+        if to_pivot is None:
+            continue
+        from_pivot = _quoted(pairs, pivot, quote, day)
+        if from_pivot is not None:
+            return to_pivot * from_pivot
+    return None
+
+
+def rate(base: str, quote: str, day: date | None = None):
+    """Сколько quote за 1 base на дату day (по умолчанию сегодня); None — нет курса."""
+    return _rate(_cache.get(), base.upper(), quote.upper(), day or date.today())
+
+
+def convert(amount, base: str, quote: str, day: date | None = None):
+    r = rate(base, quote, day)
+    if r is None or amount is None:
+        return None
+    return (Decimal(amount) * r).quantize(CENT)
+
+
+def _getter(name):
+    def get(row):
+        if isinstance(row, dict):
+            return row.get(name)
+        return getattr(row, name)
+
+    return get
+
+
+def convert_many(rows, to: str, fields=("amount",), currency="currency", day="day"):
+    """
+    Пересчитать поля fields каждой строки rows в валюту to.
+
+    rows — словари или объекты (строки Row, модели); currency и day — имена
+    их полей, day может быть и самой датой (пересчёт всего по одному курсу).
+    Возвращает список кортежей пересчитанных значений в порядке rows;
+    строка без курса даёт кортеж из None.
+    """
+    to = to.upper()
+    pairs = _cache.get()
+    get_currency = _getter(currency)
+    get_day = (lambda row: day) if isinstance(day, date) else _getter(day)
+    getters = [_getter(f) for f in fields]
+
+    rates = {}
+    result = []
+    for row in rows:
+        key = ((get_currency(row) or "").upper(), get_day(row))
+        if key not in rates:
+            rates[key] = _rate(pairs, key[0], to, key[1] or date.today())
+        r = rates[key]
+        if r is None:
+            result.append((None,) * len(getters))
+            continue
+        values = (g(row) for g in getters)
+        result.append(
+            tuple(
+                None if v is None else (Decimal(v) * r).quantize(CENT) for v in values
+            )
+        )
+    return result
+
+
+# ---- загрузка из CSV -------------------------------------------------------
+def _text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _parse_date(value) -> date:
+    raw = _text(value)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw[:10], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"неверная дата «{raw}»")
+
+
+def _parse_decimal(value, label: str) -> Decimal:
+    raw = _text(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+    try:
+        number = Decimal(raw)
+    except (InvalidOperation, ValueError):
+        raise ValueError(f"{label}: не число «{_text(value)}»")
+    if number <= 0:
+        raise ValueError(f"{label}: должен быть больше нуля")
+    return number
+
+
+def _currency(value, label: str) -> str:
+    code = _text(value).upper()
+    if not _CURRENCY.match(code):
+        raise ValueError(f"{label}: «{_text(value)}» не код валюты")
+    return code
+
+
+def iter_csv(stream, quote: str = DEFAULT_QUOTE):
+    """
+    (номер строки, (base, quote, day, rate) | ValueError). Без колонки
+    котировки все курсы — к quote; «Номинал» (курс за 100 единиц и т.п.)
+    приводится к курсу за одну единицу.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    first = text.readline()
+    delimiter = ";" if first.count(";") >= first.count(",") else ","
+    header = next(csv.reader([first], delimiter=delimiter), [])
+    mapping = [COLUMNS.get(_text(h).lower()) for h in header]
+    if not {"day", "base", "rate"} <= set(mapping):
+        raise FxError("В файле курсов нужны колонки «Дата», «Валюта» и «Курс»")
+
+    for line, values in enumerate(csv.reader(text, delimiter=delimiter), start=2):
+        if not any(_text(v) for v in values):
+            continue
+        data = {name: v for name, v in zip(mapping, values) if name}
+        try:
+            base = _currency(data.get("base"), "валюта")
+            quote_ccy = (
+                _currency(data["quote"], "котировка")
+                if _text(data.get("quote"))
+                else quote
+            )
+            if base == quote_ccy:
+                raise ValueError(f"валюта {base} котируется сама к себе")
+            value = _parse_decimal(data.get("rate"), "курс")
+            if _text(data.get("nominal")):
+                value = value / _parse_decimal(data["nominal"], "номинал")
+            yield line, (base, quote_ccy, _parse_date(data.get("day")), value)
+        except ValueError as exc:
+            yield line, exc
+
+
+def load_rates(records, source: str | None = None) -> FxLoadResult:
+    """
+    Записать курсы: новые пары-даты вставляются, изменившиеся курсы
+    обновляются, совпавшие пропускаются. Повторная загрузка того же
+    файла ничего не меняет. Всё — одной транзакцией, пачками executemany.
+    """
+    result = FxLoadResult()
+    incoming = {}
+    for line, rec in records:
+        result.total += 1
+        if isinstance(rec, Exception):
+            result.add_error(line, str(rec))
+            continue
+        base, quote, day, value = rec
+        incoming[(base, quote, day)] = value.quantize(Decimal("0.00000001"))
+    if not incoming:
+        return result
+
+    t = FxRate.__table__
+    existing = {}
+    pairs = {(base, quote) for base, quote, _day in incoming}
+    lo = min(day for *_pair, day in incoming)
+    hi = max(day for *_pair, day in incoming)
+    rows = db.session.execute(
+        select(t.c.id, t.c.base, t.c.quote, t.c.day, t.c.rate).where(
+            t.c.day.between(lo, hi)
+        )
+    )
+    for row in rows:
+        if (row.base, row.quote) in pairs:
+            existing[(row.base, row.quote, row.day)] = (row.id, Decimal(row.rate))
+
+    now = datetime.utcnow()
+    new, changed = [], []
+    for (base, quote, day), value in sorted(incoming.items()):
+        known = existing.get((base, quote, day))
+        if known is None:
+            new.append(
+                {
+                    "base": base,
+                    "quote": quote,
+                    "day": day,
+                    "rate": value,
+                    "source": source,
+                    "updated_at": now,
+                }
+            )
+        elif known[1] != value:
+            changed.append(
+                {"id": known[0], "rate": value, "source": source, "updated_at": now}
+            )
+        else:
+            result.unchanged += 1
+
+    try:
+        for i in range(0, len(new), BATCH_SIZE):
+            db.session.execute(insert(t), new[i : i + BATCH_SIZE])
+        # ORM bulk UPDATE по первичному ключу — executemany
+        for i in range(0, len(changed), BATCH_SIZE):
+            db.session.execute(update(FxRate), changed[i : i + BATCH_SIZE])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        clear_cache()
+    result.inserted, result.updated = len(new), len(changed)
+    return result
+
+
+def load_csv(stream, quote: str = DEFAULT_QUOTE, source: str | None = None):
+    return load_rates(iter_csv(stream, quote.upper()), source=source)
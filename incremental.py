@@ -0,0 +1,140 @@
+# C:\tourismops\incremental.py
+"""
+Инкрементальное ведение сводов по журналам: свод сдвигается в той же
+транзакции, что и правка журнала, вместо пересчёта по всей истории.
+
+FlushTracker — общая механика событий сессии: before_flush читает из БД
+прежние значения правленых и удаляемых строк журнала, after_flush
+складывает вклады (минус прежний, плюс текущий) и записывает их на
+соединении flush, в той же транзакции, что и сама правка. Свод задаёт
+только поля, функцию вклада строки и функцию записи накопленного.
+
+upsert_add — прибавить дельту к строке свода одним атомарным
+INSERT … ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE
+(SQLite, PostgreSQL). Пара «UPDATE, а если 0 строк — INSERT» здесь не
+годится: две транзакции, впервые задевшие один ключ (первая операция
+дня), обе вставляют строку и одна из них падает на уникальном ключе
+или на взаимоблокировке по gap-lock InnoDB — вместе с коммитом
+пользователя.
+"""
+
+from typing import Callable
+
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from extensions import db
+
+
+def upsert_add(conn, table, key: dict, add: dict, initial: dict | None = None):
+    """
+    Прибавить add ({колонка: дельта}) к строке table с ключом key; если
+    строки ещё нет — вставить key + initial (по умолчанию сами дельты).
+    Колонки key должны составлять уникальный ключ таблицы.
+    """
+    row = dict(key, **(add if initial is None else initial))
+    increments = {col: table.c[col] + delta for col, delta in add.items()}
+    dialect = conn.dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(table).values(**row).on_duplicate_key_update(increments)
+    elif dialect in ("sqlite", "postgresql"):
+        ins = sqlite_insert if dialect == "sqlite" else pg_insert
+        stmt = (
+            ins(table)
+            .values(**row)
+            .on_conflict_do_update(index_elements=list(key), set_=increments)
+        )
+    else:
+        where = [table.c[col] == value for col, value in key.items()]
+        if conn.execute(update(table).where(*where).values(increments)).rowcount:
+            return
+        stmt = insert(table).values(**row)
+    conn.execute(stmt)
+
+
+# ---- вклады строк журналов -------------------------------------------------
+def _pk(obj):
+    """id сохранённой строки без загрузки просроченных атрибутов."""
+    identity = db.inspect(obj).identity
+    return identity[0] if identity else None
+
+
+def _changed(obj, fields) -> bool:
+    state = db.inspect(obj)
+    return any(state.attrs[f].history.has_changes() for f in fields)
+
+
+class FlushTracker:
+    """
+    Вклады строк журналов в свод на каждом flush.
+
+    fields — {модель: поля, от которых зависит вклад строки};
+    add(deltas, model, values, sign) — прибавить к deltas вклад строки
+    values (словарь полей) со знаком sign;
+    apply(conn, deltas) — записать накопленное;
+    new() — пустой накопитель deltas.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        fields: dict,
+        add: Callable,
+        apply: Callable,
+        new: Callable = dict,
+    ):
+        self.info_key = f"{name}_prev"
+        self.fields = {model: tuple(f) for model, f in fields.items()}
+        self.add = add
+        self.apply = apply
+        self.new = new
+        event.listen(Session, "before_flush", self._remember)
+        event.listen(Session, "after_flush", self._track)
+
+    def _current(self, obj) -> dict:
+        return {f: getattr(obj, f) for f in self.fields[type(obj)]}
+
+    def _remember(self, session, flush_context, instances):
+        # Прежние значения читаем из БД: у просроченного после commit объекта
+        # ORM не хранит старое значение изменённого атрибута.
+        ids = {}
+        for obj in session.deleted:
+            if type(obj) in self.fields and _pk(obj) is not None:
+                ids.setdefault(type(obj), []).append(_pk(obj))
+        for obj in session.dirty:
+            fields = self.fields.get(type(obj))
+            if fields and _pk(obj) is not None and _changed(obj, fields):
+                ids.setdefault(type(obj), []).append(_pk(obj))
+        if not ids:
+            return
+        prev = {}
+        conn = session.connection()
+        for model, pks in ids.items():
+            t = model.__table__
+            rows = conn.execute(
+                select(t.c.id, *(t.c[f] for f in self.fields[model])).where(
+                    t.c.id.in_(pks)
+                )
+            )
+            for row in rows:
+                prev[(model, row.id)] = dict(row._mapping)
+        session.info[self.info_key] = prev
+
+    def _track(self, session, flush_context):
+        prev = session.info.pop(self.info_key, {})
+        deltas = self.new()
+        for obj in session.new:
+            if type(obj) in self.fields:
+                self.add(deltas, type(obj), self._current(obj), 1)
+        for obj in list(session.dirty) + list(session.deleted):
+            key = (type(obj), _pk(obj))
+            if key not in prev:
+                continue
+            self.add(deltas, type(obj), prev[key], -1)
+            if obj not in session.deleted:
+                self.add(deltas, type(obj), self._current(obj), 1)
+        if deltas:
+            self.apply(session.connection(), deltas)
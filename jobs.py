@@ -0,0 +1,343 @@
+# C:\tourismops\jobs.py
+"""
+Фоновые задания: выгрузки, пакетная печать и тяжёлые отчёты вне потока
+запроса.
+
+Очередь — таблица Job, без внешних брокеров. Запрос только ставит
+задание (submit) и отдаёт страницу с прогрессом; задания берут
+фоновые потоки каждого процесса приложения (JOB_WORKERS) или отдельный
+процесс `python manage.py run-jobs`. Поток «забирает» задание условным
+UPDATE … WHERE status = 'queued', поэтому несколько процессов не
+возьмут одно задание дважды. CPU-ёмкий рендер (ордера DOCX) внутри
+задания раскладывается по пулу процессов, как и раньше.
+
+Обработчик задания регистрируется декоратором @handler(вид, заголовок),
+получает JobContext (параметры, прогресс, файл результата) и
+возвращает (имя файла для скачивания, mimetype). Результат лежит в
+JOB_DIR до истечения JOB_RESULT_TTL_HOURS, затем удаляется.
+"""
+
+import atexit
+import json
+import os
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Callable
+
+from sqlalchemy import func, select, update
+
+from extensions import db
+from models import Job, User
+
+# как часто писать прогресс в БД из одного задания
+PROGRESS_INTERVAL = 1.0
+# как часто простаивающий поток чистит просроченные результаты
+PURGE_INTERVAL = 300.0
+
+STATUS_LABELS = {
+    "queued": "В очереди",
+    "running": "Выполняется",
+    "done": "Готово",
+    "failed": "Ошибка",
+    "expired": "Файл удалён",
+}
+
+
+class JobError(Exception):
+    """Задание нельзя выполнить (неизвестный вид, неверные параметры)."""
+
+
+@dataclass(frozen=True)
+class Handler:
+    kind: str
+    title: str
+    fn: Callable
+
+
+HANDLERS = {}
+
+
+def handler(kind: str, title: str):
+    """Зарегистрировать обработчик задания вида kind."""
+
+    def decorator(fn):
+        HANDLERS[kind] = Handler(kind, title, fn)
+        return fn
+
+    return decorator
+
+
+def title_of(kind: str) -> str:
+    h = HANDLERS.get(kind)
+    return h.title if h else kind
+
+
+class JobContext:
+    """То, что видит обработчик: параметры, владелец, прогресс, файл результата."""
+
+    def __init__(self, job: Job, path: str):
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.params = json.loads(job.params or "{}")
+        self.path = path
+        self._reported = 0.0
+
+    @property
+    def user(self):
+        return db.session.get(User, self.user_id)
+
+    def progress(self, done: int, total: int | None = None, message: str = None):
+        """
+        Сообщить прогресс (не чаще PROGRESS_INTERVAL, отдельной транзакцией).
+        Заодно это пульс задания: purge() закрывает задания без пульса.
+        """
+        now = monotonic()
+        if now - self._reported < PROGRESS_INTERVAL:
+            return
+        self._reported = now
+        percent = min(99, done * 100 // total) if total else 0
+        values = {"progress": percent, "heartbeat_at": datetime.utcnow()}
+        if message is not None:
+            values["message"] = message[:255]
+        t = Job.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(t).where(t.c.id == self.job_id).values(**values))
+
+    def open(self, mode: str = "wb", **kw):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        return open(self.path, mode, **kw)
+
+
+class JobRunner:
+    def __init__(self, app=None):
+        self._app = None
+        self._threads = []
+        self._pid = None
+        self._atexit = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._purged = 0.0
+        self.workers = 2
+        self.inline = False
+        self.directory = None
+        self.ttl = timedelta(hours=24)
+        self.poll = 5.0
+        self.stale = timedelta(minutes=30)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self._app = app
+        self.workers = int(app.config.get("JOB_WORKERS", 2))
+        # в тестах задания выполняются сразу, в потоке запроса
+        self.inline = app.testing
+        self.directory = app.config.get("JOB_DIR") or os.path.join(
+            app.instance_path, "jobs"
+        )
+        self.ttl = timedelta(hours=float(app.config.get("JOB_RESULT_TTL_HOURS", 24)))
+        self.poll = float(app.config.get("JOB_POLL_INTERVAL", 5))
+        self.stale = timedelta(minutes=float(app.config.get("JOB_STALE_MINUTES", 30)))
+        app.extensions["job_runner"] = self
+        if not self._atexit:
+            atexit.register(self.shutdown)
+            self._atexit = True
+
+    # ---- API ---------------------------------------------------------------
+    def submit(self, kind: str, user_id: int, params: dict | None = None) -> Job:
+        """Поставить задание в очередь (коммитит сессию)."""
+        if kind not in HANDLERS:
+            raise JobError(f"Неизвестный вид задания: {kind}")
+        job = Job(
+            kind=kind,
+            user_id=user_id,
+            params=json.dumps(params or {}, ensure_ascii=False),
+            status="queued",
+        )
+        db.session.add(job)
+        db.session.commit()
+        if self.inline:
+            self.execute(job.id)
+            db.session.refresh(job)
+        else:
+            self.wake()
+        return job
+
+    def wake(self):
+        """Разбудить потоки процесса (и запустить их, если ещё нет)."""
+        if self.workers > 0 and not self.inline:
+            self._ensure_threads()
+            self._wake.set()
+
+    def result_path(self, job_id: int) -> str:
+        return os.path.join(self.directory, f"job_{job_id}")
+
+    def run_forever(self):
+        """Цикл отдельного процесса-исполнителя (manage.py run-jobs)."""
+        self._pid = os.getpid()
+        self._run()
+
+    def shutdown(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            if thread.is_alive() and self._pid == os.getpid():
+                thread.join(timeout=1)
+
+    # ---- выполнение --------------------------------------------------------
+    def _ensure_threads(self):
+        # после fork (gunicorn/pre-fork) потоки родителя в дочернем процессе мертвы
+        alive = [t for t in self._threads if t.is_alive()]
+        if self._pid == os.getpid() and len(alive) >= self.workers:
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._threads = []
+                self._pid = os.getpid()
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"job-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker_name(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"[:64]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with self._app.app_context():
+                    job_id = self._claim()
+                    if job_id is not None:
+                        self.execute(job_id, claimed=True)
+                        continue
+                    if monotonic() - self._purged > PURGE_INTERVAL:
+                        self._purged = monotonic()
+                        self.purge()
+            except Exception as exc:
+                self._app.logger.warning("Фоновые задания: %s", exc)
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    def _claim(self):
+        """id взятого в работу задания или None, если очередь пуста."""
+        t = Job.__table__
+        now = datetime.utcnow()
+        with db.engine.begin() as conn:
+            ids = conn.execute(
+                select(t.c.id).where(t.c.status == "queued").order_by(t.c.id).limit(5)
+            ).scalars()
+            for job_id in ids.all():
+                res = conn.execute(
+                    update(t)
+                    .where(t.c.id == job_id, t.c.status == "queued")
+                    .values(
+                        status="running",
+                        worker=self._worker_name(),
+                        started_at=now,
+                        heartbeat_at=now,
+                    )
+                )
+                if res.rowcount == 1:
+                    return job_id
+        return None
+
+    def _finish(self, job_id: int, **values) -> bool:
+        """
+        Закрыть задание. False — его уже закрыл purge() (пульс пропал), и
+        итог исполнителя не записан.
+        """
+        t = Job.__table__
+        values["finished_at"] = datetime.utcnow()
+        res = db.session.execute(
+            update(t).where(t.c.id == job_id, t.c.status == "running").values(**values)
+        )
+        db.session.commit()
+        return res.rowcount == 1
+
+    def execute(self, job_id: int, claimed: bool = False):
+        """Выполнить задание в текущем потоке (нужен контекст приложения)."""
+        job = db.session.get(Job, job_id)
+        if job is None or (not claimed and job.status != "queued"):
+            return
+        if not claimed:
+            job.status, job.worker = "running", self._worker_name()
+            job.started_at = job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+        ctx = JobContext(job, self.result_path(job_id))
+        try:
+            h = HANDLERS.get(job.kind)
+            if h is None:
+                raise JobError(f"Неизвестный вид задания: {job.kind}")
+            name, mimetype = h.fn(ctx)
+            db.session.rollback()  # обработчик мог оставить открытую транзакцию
+            finished = self._finish(
+                job_id,
+                status="done",
+                progress=100,
+                message=None,
+                result_path=ctx.path,
+                result_name=name[:255],
+                mimetype=mimetype,
+                expires_at=datetime.utcnow() + self.ttl,
+            )
+            if not finished:
+                _remove(ctx.path)  # задание уже помечено прерванным
+        except Exception as exc:
+            db.session.rollback()
+            if not isinstance(exc, JobError):
+                self._app.logger.exception(
+                    "Задание %s (%s) не выполнено", job_id, job.kind
+                )
+            _remove(ctx.path)
+            self._finish(job_id, status="failed", message=str(exc)[:255] or "Ошибка")
+
+    def purge(self) -> int:
+        """Удалить просроченные результаты и закрыть зависшие задания."""
+        t = Job.__table__
+        now = datetime.utcnow()
+        expired = db.session.execute(
+            select(t.c.id, t.c.result_path).where(
+                t.c.status == "done", t.c.expires_at < now
+            )
+        ).all()
+        for job_id, path in expired:
+            _remove(path)
+        if expired:
+            db.session.execute(
+                update(t)
+                .where(t.c.id.in_([job_id for job_id, _path in expired]))
+                .values(status="expired", result_path=None)
+            )
+        # исполнитель умер посреди задания (рестарт процесса): пульса нет
+        # дольше stale, как бы давно задание ни началось
+        last_seen = func.coalesce(t.c.heartbeat_at, t.c.started_at)
+        db.session.execute(
+            update(t)
+            .where(t.c.status == "running", last_seen < now - self.stale)
+            .values(status="failed", message="Прервано", finished_at=now)
+        )
+        db.session.commit()
+        return len(expired)
+
+
+def _remove(path: str | None):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+job_runner = JobRunner()
+
+
+def submit(kind: str, user_id: int, params: dict | None = None) -> Job:
+    return job_runner.submit(kind, user_id, params)
@@ -0,0 +1,144 @@
+# C:\tourismops\ko_render.py
+"""
+Рендер кассового ордера KO-1 / KO-2 (DOCX) по готовому контексту.
+
+Шаблон компилируется один раз на процесс (кэш сбрасывается при смене
+mtime файла): docxtpl рендерит его с маркерами вместо значений, и дальше
+каждый ордер — это подстановка значений в готовый XML и упаковка в ZIP,
+без повторного разбора DOCX и jinja. Шаблоны с логикой ({% ... %},
+фильтры) рендерятся через docxtpl целиком.
+
+Модуль намеренно не зависит от приложения (ни blueprints, ни моделей):
+его импортируют рабочие процессы пула пакетной печати
+(blueprints/cash/orders.py), и импорт должен оставаться дешёвым.
+"""
+
+import io
+import os
+import re
+import threading
+import zipfile
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+# плейсхолдеры шаблонов KO-1/KO-2
+FIELDS = ("doc_no", "date", "from", "basis", "amount_rub", "amount_words")
+_MARK = "[[ko:{}]]"
+_JINJA_LOGIC = re.compile(rb"\{%|\{\{[^}]*\|")
+
+_tpl_cache = {}  # path -> (mtime, compiled)
+_tpl_lock = threading.Lock()
+
+
+# ---- шаблоны ---------------------------------------------------------------
+def _is_plain(blob: bytes) -> bool:
+    """В шаблоне только простые {{ поле }} — без условий, циклов и фильтров."""
+    with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+        for name in zf.namelist():
+            if name.startswith("word/") and name.endswith(".xml"):
+                text = re.sub(rb"<[^>]+>", b"", zf.read(name))
+                if _JINJA_LOGIC.search(text):
+                    return False
+    return True
+
+
+def _compile(blob: bytes):
+    """
+    Байты шаблона → список (ZipInfo, данные) уже отрендеренного DOCX
+    с маркерами на месте значений, либо None для шаблонов с логикой.
+    """
+    if not _is_plain(blob):
+        return None
+
+    from docxtpl import DocxTemplate
+
+    doc = DocxTemplate(io.BytesIO(blob))
+    doc.render({k: _MARK.format(k) for k in FIELDS})
+    mem = io.BytesIO()
+    doc.save(mem)
+    with zipfile.ZipFile(mem) as zf:
+        return [(info, zf.read(info)) for info in zf.infolist()]
+
+
+def _template(path: str):
+    """(байты, скомпилированный шаблон) из кэша процесса; сброс по mtime."""
+    mtime = os.stat(path).st_mtime_ns
+    cached = _tpl_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with _tpl_lock:
+        cached = _tpl_cache.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as fh:
+            blob = fh.read()
+        entry = (blob, _compile(blob))
+        _tpl_cache[path] = (mtime, entry)
+        return entry
+
+
+def _fill(members, ctx: dict) -> bytes:
+    """Подстановка значений в скомпилированный шаблон."""
+    repl = [
+        (_MARK.format(k).encode(), escape(str(v)).encode("utf-8"))
+        for k, v in ctx.items()
+    ]
+    mem = io.BytesIO()
+    with zipfile.ZipFile(mem, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for info, data in members:
+            if b"[[ko:" in data:
+                for mark, value in repl:
+                    data = data.replace(mark, value)
+            zf.writestr(info, data)
+    return mem.getvalue()
+
+
+# ---- рендер ----------------------------------------------------------------
+def order_filename(op_type: str, item_id: int) -> str:
+    return f"{'KO-1' if op_type == 'income' else 'KO-2'}_{item_id}.docx"
+
+
+def render_order(tpl_path: str, data: dict) -> tuple[str, bytes]:
+    """Рендер одного ордера → (имя файла, содержимое DOCX)."""
+    from num2words import num2words
+
+    # сумма цифрами (две цифры после запятой)
+    try:
+        amount_rub = f"{Decimal(data['amount']):.2f}"
+    except Exception:
+        amount_rub = data["amount"]
+
+    # сумма прописью (ru)
+    try:
+        amount_words_base = num2words(Decimal(data["amount"]), lang="ru").capitalize()
+    except Exception:
+        amount_words_base = ""
+
+    # контекст под плейсхолдеры (doc_no, date, from, basis, amount_rub, amount_words)
+    ctx = {
+        "doc_no": str(data["id"]),
+        "date": data["date"],
+        "from": data["from"],
+        "basis": data["basis"],
+        "amount_rub": amount_rub,
+        "amount_words": f"{amount_words_base} {data['currency']}".strip(),
+    }
+
+    fname = order_filename(data["op_type"], data["id"])
+    blob, compiled = _template(tpl_path)
+    if compiled is not None:
+        return fname, _fill(compiled, ctx)
+
+    from docxtpl import DocxTemplate
+
+    # docxtpl рендерит документ на месте — собираем новый из байтов кэша
+    doc = DocxTemplate(io.BytesIO(blob))
+    doc.render(ctx)
+    mem = io.BytesIO()
+    doc.save(mem)
+    return fname, mem.getvalue()
+
+
+def render_job(job):
+    """render_order для пула: job — (tpl_path, данные)."""
+    return render_order(*job)
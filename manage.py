@@ -1,5 +1,7 @@
+import argparse
 import os
 import sys
+from datetime import datetime
 
 from sqlalchemy import text
 
@@ -10,28 +12,313 @@ from models import User
 app = create_app()
 
 
-def main():
+def _parse_date(value: str):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _parse_month(value: str):
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def cmd_init(args):
     print("== Manage: init DB and admin ==")
+    db.session.execute(text("SELECT 1"))
+    print("DB connection: OK")
+
+    db.create_all()
+    print("Tables: created/verified")
+
+    username = os.getenv("ADMIN_USERNAME", "admin")
+    password = os.getenv("ADMIN_PASSWORD", "admin123")
+
+    u = User.query.filter_by(username=username).first()
+    if not u:
+        u = User(username=username, role="admin")
+        u.set_password(password)
+        db.session.add(u)
+        db.session.commit()
+        print(f"Admin user created: {username}")
+    else:
+        print(f"Admin already exists: {username}")
+
+
+def cmd_rebuild_cash_balances(args):
+    from blueprints.cash import balances
+
+    print("== Manage: rebuild cash daily balances ==")
+    rows = balances.rebuild(args.date_from)
+    print(f"Snapshots written: {rows}")
+
+
+def cmd_rebuild_ticket_rollups(args):
+    from blueprints.tickets import rollups
+
+    print("== Manage: rebuild monthly ticket rollups ==")
+    rows = rollups.rebuild(args.month)
+    print(f"Rollup rows written: {rows}")
+
+
+def cmd_rebuild_sales_rollups(args):
+    from blueprints.reports import sales
+
+    print("== Manage: rebuild sales summary rollups ==")
+    rows = sales.rebuild(args.date_from, args.date_to)
+    print(f"Rollup rows written: {rows}")
+
+
+def cmd_rebuild_tour_occupancy(args):
+    import schedule
+
+    print("== Manage: rebuild tour occupancy by day ==")
+    rows = schedule.rebuild(args.kind)
+    print(f"Occupancy rows written: {rows}")
+
+
+def cmd_rebuild_search_index(args):
+    import search
+
+    print("== Manage: rebuild full-text search index ==")
+    search.rebuild()
+    print("Search index: rebuilt")
+
+
+def cmd_import_cash(args):
+    from blueprints.cash.importer import import_file
+
+    username = args.user or os.getenv("ADMIN_USERNAME", "admin")
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise SystemExit(f"User not found: {username}")
+
+    print(f"== Manage: import cash operations from {args.path} as {username} ==")
+
+    def progress(result):
+        print(f"  rows: {result.total}, valid: {result.inserted}", end="\r")
+
+    with open(args.path, "rb") as fh:
+        result = import_file(
+            fh,
+            args.path,
+            user.id,
+            skip_invalid=args.skip_invalid,
+            dry_run=args.dry_run,
+            progress=progress,
+        )
+    print()
+    for line, message in result.errors:
+        print(f"  line {line}: {message}", file=sys.stderr)
+    if result.error_count > len(result.errors):
+        print(
+            f"  ... and {result.error_count - len(result.errors)} more", file=sys.stderr
+        )
+    state = "committed" if result.committed else "NOT committed"
+    print(
+        f"Rows: {result.total}, imported: {result.inserted}, "
+        f"errors: {result.error_count} ({state})"
+    )
+
+
+def cmd_import_bank_statement(args):
+    from blueprints.bank.statements import import_file
+
+    username = args.user or os.getenv("ADMIN_USERNAME", "admin")
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise SystemExit(f"User not found: {username}")
+
+    print(f"== Manage: import bank statement {args.path} ==")
+    with open(args.path, "rb") as fh:
+        result = import_file(fh, args.path, user.id, fmt=args.format)
+    for line, message in result.errors:
+        print(f"  line {line}: {message}", file=sys.stderr)
+    print(
+        f"Rows: {result.total}, new: {result.inserted}, "
+        f"duplicates: {result.duplicates}, errors: {result.error_count}"
+    )
+
+
+def cmd_import_bsp(args):
+    from blueprints.tickets.bsp import import_file
+
+    username = args.user or os.getenv("ADMIN_USERNAME", "admin")
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise SystemExit(f"User not found: {username}")
+
+    print(f"== Manage: import BSP file {args.path} ==")
+
+    def progress(result):
+        print(
+            f"  rows: {result.total}, new: {result.inserted}, "
+            f"duplicates: {result.duplicates}",
+            end="\r",
+        )
+
+    with open(args.path, "rb") as fh:
+        result = import_file(fh, args.path, user.id, fmt=args.format, progress=progress)
+    print()
+    for line, message in result.errors:
+        print(f"  line {line}: {message}", file=sys.stderr)
+    print(
+        f"Tickets: {result.total}, new: {result.inserted}, "
+        f"duplicates: {result.duplicates}, errors: {result.error_count}"
+    )
+
+
+def cmd_import_fx_rates(args):
+    import fx
+
+    print(f"== Manage: import FX rates {args.path} ==")
+    with open(args.path, "rb") as fh:
+        result = fx.load_csv(fh, quote=args.quote, source=args.source)
+    for line, message in result.errors:
+        print(f"  line {line}: {message}", file=sys.stderr)
+    print(
+        f"Rows: {result.total}, new: {result.inserted}, updated: {result.updated}, "
+        f"unchanged: {result.unchanged}, errors: {result.error_count}"
+    )
+
+
+def cmd_run_jobs(args):
+    from jobs import job_runner
+
+    if args.purge:
+        print(f"Expired results removed: {job_runner.purge()}")
+        return
+    print("== Manage: background job worker (Ctrl+C to stop) ==")
+    try:
+        job_runner.run_forever()
+    except KeyboardInterrupt:
+        job_runner.shutdown()
+
+
+def cmd_reconcile_bank(args):
+    from blueprints.bank.reconcile import reconcile
+
+    print(f"== Manage: reconcile bank {args.date_from}..{args.date_to} ==")
+    result = reconcile(args.date_from, args.date_to, args.tolerance)
+    print(
+        f"Matched: {len(result.matched)}, ambiguous: {len(result.ambiguous)}, "
+        f"bank unmatched: {len(result.unmatched_bank)}, "
+        f"ledger unmatched: {len(result.unmatched_ledger)}"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="TourismOps: обслуживание БД")
+    sub = parser.add_subparsers(dest="command")
+
+    p = sub.add_parser("init", help="создать таблицы и админа (по умолчанию)")
+    p.set_defaults(func=cmd_init)
+
+    p = sub.add_parser(
+        "rebuild-cash-balances", help="пересобрать дневные снимки остатков кассы"
+    )
+    p.add_argument(
+        "--from",
+        dest="date_from",
+        type=_parse_date,
+        default=None,
+        help="YYYY-MM-DD: пересчитать только с этой даты",
+    )
+    p.set_defaults(func=cmd_rebuild_cash_balances)
+
+    p = sub.add_parser(
+        "rebuild-ticket-rollups", help="пересобрать месячные своды продаж билетов"
+    )
+    p.add_argument(
+        "--month",
+        type=_parse_month,
+        default=None,
+        help="YYYY-MM: пересчитать только этот месяц",
+    )
+    p.set_defaults(func=cmd_rebuild_ticket_rollups)
+
+    p = sub.add_parser(
+        "rebuild-sales-rollups", help="пересобрать свод продаж по сегментам"
+    )
+    p.add_argument(
+        "--from",
+        dest="date_from",
+        type=_parse_date,
+        required=True,
+        help="YYYY-MM-DD (округляется до начала месяца)",
+    )
+    p.add_argument(
+        "--to",
+        dest="date_to",
+        type=_parse_date,
+        default=datetime.now().date(),
+        help="YYYY-MM-DD (округляется до конца месяца), по умолчанию сегодня",
+    )
+    p.set_defaults(func=cmd_rebuild_sales_rollups)
+
+    p = sub.add_parser(
+        "rebuild-tour-occupancy", help="пересобрать загрузку туров по дням"
+    )
+    p.add_argument(
+        "--kind",
+        choices=["internal", "external"],
+        default=None,
+        help="только туры этого вида",
+    )
+    p.set_defaults(func=cmd_rebuild_tour_occupancy)
+
+    p = sub.add_parser(
+        "rebuild-search-index", help="пересобрать индекс полнотекстового поиска"
+    )
+    p.set_defaults(func=cmd_rebuild_search_index)
+
+    p = sub.add_parser("import-cash", help="массовый импорт кассы из CSV/XLSX")
+    p.add_argument("path", help="файл .csv или .xlsx")
+    p.add_argument("--user", help="от имени пользователя (по умолчанию админ)")
+    p.add_argument(
+        "--skip-invalid", action="store_true", help="загрузить корректные строки"
+    )
+    p.add_argument("--dry-run", action="store_true", help="только проверить")
+    p.set_defaults(func=cmd_import_cash)
+
+    p = sub.add_parser("import-bank-statement", help="загрузить выписку CSV/MT940")
+    p.add_argument("path", help="файл выписки")
+    p.add_argument("--format", choices=["csv", "mt940"], default=None)
+    p.add_argument("--user", help="от имени пользователя (по умолчанию админ)")
+    p.set_defaults(func=cmd_import_bank_statement)
+
+    p = sub.add_parser("import-bsp", help="загрузить расчётный файл BSP (HOT/CSV)")
+    p.add_argument("path", help="файл HOT или .csv")
+    p.add_argument("--format", choices=["hot", "csv"], default=None)
+    p.add_argument("--user", help="от имени пользователя (по умолчанию админ)")
+    p.set_defaults(func=cmd_import_bsp)
+
+    p = sub.add_parser("import-fx-rates", help="загрузить курсы валют из CSV")
+    p.add_argument("path", help="файл .csv: дата, валюта, курс[, номинал]")
+    p.add_argument(
+        "--quote", default="UZS", help="к какой валюте курсы без колонки котировки"
+    )
+    p.add_argument("--source", default=None, help="источник курсов (ЦБ, банк)")
+    p.set_defaults(func=cmd_import_fx_rates)
+
+    p = sub.add_parser("run-jobs", help="исполнитель фоновых заданий")
+    p.add_argument(
+        "--purge", action="store_true", help="только удалить просроченные результаты"
+    )
+    p.set_defaults(func=cmd_run_jobs)
+
+    p = sub.add_parser("reconcile-bank", help="сверить банк с билетами и турами")
+    p.add_argument("--from", dest="date_from", type=_parse_date, required=True)
+    p.add_argument("--to", dest="date_to", type=_parse_date, required=True)
+    p.add_argument("--tolerance", type=int, default=3, help="допуск по дате, дней")
+    p.set_defaults(func=cmd_reconcile_bank)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    handler = getattr(args, "func", cmd_init)
     try:
         with app.app_context():
-            db.session.execute(text("SELECT 1"))
-            print("DB connection: OK")
-
-            db.create_all()
-            print("Tables: created/verified")
-
-            username = os.getenv("ADMIN_USERNAME", "admin")
-            password = os.getenv("ADMIN_PASSWORD", "admin123")
-
-            u = User.query.filter_by(username=username).first()
-            if not u:
-                u = User(username=username, role="admin")
-                u.set_password(password)
-                db.session.add(u)
-                db.session.commit()
-                print(f"Admin user created: {username}")
-            else:
-                print(f"Admin already exists: {username}")
+            handler(args)
     except Exception as e:
         print("ERROR:", e, file=sys.stderr)
         raise
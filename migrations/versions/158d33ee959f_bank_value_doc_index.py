@@ -0,0 +1,35 @@
+"""bank_operation: (value_date, doc_number) index for statement dedup
+
+Revision ID: 158d33ee959f
+Revises: c04247d212bb
+Create Date: 2026-10-17 11:20:41.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "158d33ee959f"
+down_revision = "c04247d212bb"
+branch_labels = None
+depends_on = None
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    insp = sa.inspect(op.get_bind())
+    try:
+        idx = insp.get_indexes(table_name)
+    except Exception:
+        return False
+    return index_name in {i.get("name") for i in idx if i.get("name")}
+
+
+def upgrade():
+    if not _index_exists("bank_operation", "ix_bank_value_doc"):
+        op.create_index(
+            "ix_bank_value_doc", "bank_operation", ["value_date", "doc_number"]
+        )
+
+
+def downgrade():
+    op.drop_index("ix_bank_value_doc", table_name="bank_operation")
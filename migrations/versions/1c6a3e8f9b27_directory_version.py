@@ -0,0 +1,32 @@
+"""directory_version: change counters for client and supplier directories
+
+Revision ID: 1c6a3e8f9b27
+Revises: e5b19c7d4a36
+Create Date: 2026-10-17 19:48:05.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "1c6a3e8f9b27"
+down_revision = "e5b19c7d4a36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table = op.create_table(
+        "directory_version",
+        sa.Column("name", sa.String(length=32), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.bulk_insert(
+        table,
+        [{"name": "client", "version": 0}, {"name": "supplier", "version": 0}],
+    )
+
+
+def downgrade():
+    op.drop_table("directory_version")
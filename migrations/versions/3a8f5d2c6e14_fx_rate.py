@@ -0,0 +1,35 @@
+"""fx_rate: daily exchange rates per currency pair
+
+Revision ID: 3a8f5d2c6e14
+Revises: 7c3e9a1d5f82
+Create Date: 2026-10-17 18:12:40.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3a8f5d2c6e14"
+down_revision = "7c3e9a1d5f82"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "fx_rate",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("base", sa.String(length=3), nullable=False),
+        sa.Column("quote", sa.String(length=3), nullable=False),
+        sa.Column("rate", sa.Numeric(18, 8), nullable=False),
+        sa.Column("source", sa.String(length=32), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("base", "quote", "day", name="uq_fx_rate_key"),
+    )
+    # загрузить курсы: python manage.py import-fx-rates rates.csv
+
+
+def downgrade():
+    op.drop_table("fx_rate")
@@ -0,0 +1,23 @@
+"""job.heartbeat_at: last sign of life from the job's worker
+
+Revision ID: 4d7b2e9a1c60
+Revises: 8b3f1d6a2e47
+Create Date: 2026-10-17 23:12:05.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d7b2e9a1c60"
+down_revision = "8b3f1d6a2e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("job", sa.Column("heartbeat_at", sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("job", "heartbeat_at")
@@ -0,0 +1,69 @@
+"""tours: functional indexes on net_profit / margin
+
+Revision ID: 4f7a2c9e1b36
+Revises: 9d4c1e7f3a20
+Create Date: 2026-10-17 14:55:12.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4f7a2c9e1b36"
+down_revision = "9d4c1e7f3a20"
+branch_labels = None
+depends_on = None
+
+TABLES = (("internal_tour", "inttour"), ("external_tour", "exttour"))
+
+# выражения — те же, что в models.TourProfitMixin, иначе СУБД не применит индекс
+_ZERO = sa.literal_column("0")
+
+
+def _expressions(table_name: str):
+    t = sa.table(
+        table_name,
+        sa.column("cost", sa.Numeric(14, 2)),
+        sa.column("sale_price", sa.Numeric(14, 2)),
+    )
+    net = sa.type_coerce(
+        sa.func.coalesce(t.c.sale_price, _ZERO) - sa.func.coalesce(t.c.cost, _ZERO),
+        sa.Numeric(14, 2),
+    )
+    margin = sa.case(
+        (sa.func.coalesce(t.c.sale_price, _ZERO) == _ZERO, sa.null()),
+        else_=net / t.c.sale_price,
+    )
+    return net, margin
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    # инспектор пропускает индексы по выражениям — смотрим каталог напрямую
+    bind = op.get_bind()
+    if bind.dialect.name == "sqlite":
+        sql = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = :i"
+    else:
+        sql = (
+            "SELECT 1 FROM information_schema.statistics "
+            "WHERE table_schema = DATABASE() AND table_name = :t AND index_name = :i"
+        )
+    return (
+        bind.execute(sa.text(sql), {"t": table_name, "i": index_name}).first()
+        is not None
+    )
+
+
+def upgrade():
+    # MySQL: функциональные индексы с 8.0.13
+    for table, prefix in TABLES:
+        net, margin = _expressions(table)
+        if not _index_exists(table, f"ix_{prefix}_net_profit"):
+            op.create_index(f"ix_{prefix}_net_profit", table, [net])
+        if not _index_exists(table, f"ix_{prefix}_margin"):
+            op.create_index(f"ix_{prefix}_margin", table, [margin])
+
+
+def downgrade():
+    for table, prefix in TABLES:
+        op.drop_index(f"ix_{prefix}_margin", table_name=table)
+        op.drop_index(f"ix_{prefix}_net_profit", table_name=table)
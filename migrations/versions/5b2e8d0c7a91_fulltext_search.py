@@ -0,0 +1,61 @@
+"""full-text search: MySQL FULLTEXT indexes / SQLite FTS5 table
+
+Revision ID: 5b2e8d0c7a91
+Revises: a867c9ef4417
+Create Date: 2026-10-17 13:20:05.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5b2e8d0c7a91"
+down_revision = "a867c9ef4417"
+branch_labels = None
+depends_on = None
+
+FULLTEXT = (
+    ("ft_cash_description", "cash_operation", "description", 1),
+    ("ft_bank_description", "bank_operation", "description", 2),
+    ("ft_ticket_route", "ticket_sale", "route", 3),
+    ("ft_inttour_notes", "internal_tour", "notes", 4),
+    ("ft_exttour_notes", "external_tour", "notes", 5),
+)
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    insp = sa.inspect(op.get_bind())
+    try:
+        idx = insp.get_indexes(table_name)
+    except Exception:
+        return False
+    return index_name in {i.get("name") for i in idx if i.get("name")}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "mysql":
+        for name, table, column, _no in FULLTEXT:
+            if not _index_exists(table, name):
+                op.create_index(name, table, [column], mysql_prefix="FULLTEXT")
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5("
+            "body, user_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute("DELETE FROM search_fts")
+        for _name, table, column, no in FULLTEXT:
+            op.execute(
+                f"INSERT INTO search_fts(rowid, body, user_id) "
+                f"SELECT id * 8 + {no}, {column}, user_id FROM {table} "
+                f"WHERE {column} IS NOT NULL AND {column} != ''"
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == "mysql":
+        for name, table, _column, _no in FULLTEXT:
+            op.drop_index(name, table_name=table)
+    elif dialect == "sqlite":
+        op.execute("DROP TABLE IF EXISTS search_fts")
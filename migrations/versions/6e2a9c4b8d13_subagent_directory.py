@@ -0,0 +1,44 @@
+"""subagent directory: table (if the legacy one is missing) and version counter
+
+Revision ID: 6e2a9c4b8d13
+Revises: 1c6a3e8f9b27
+Create Date: 2026-10-17 21:06:40.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6e2a9c4b8d13"
+down_revision = "1c6a3e8f9b27"
+branch_labels = None
+depends_on = None
+
+
+def _table_exists(table_name: str) -> bool:
+    return table_name in sa.inspect(op.get_bind()).get_table_names()
+
+
+def upgrade():
+    # в старых базах таблица subagent осталась от прежней схемы (baseline)
+    if not _table_exists("subagent"):
+        op.create_table(
+            "subagent",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("code", sa.String(length=64), nullable=False),
+            sa.Column("name", sa.String(length=255), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_subagent_code", "subagent", ["code"], unique=True)
+
+    version = sa.table(
+        "directory_version",
+        sa.column("name", sa.String),
+        sa.column("version", sa.Integer),
+    )
+    op.bulk_insert(version, [{"name": "subagent", "version": 0}])
+
+
+def downgrade():
+    # саму таблицу не удаляем: она могла существовать до этой ревизии
+    op.execute("DELETE FROM directory_version WHERE name = 'subagent'")
@@ -0,0 +1,45 @@
+"""sales_rollup: daily and monthly sales by segment, user and currency
+
+Revision ID: 7c3e9a1d5f82
+Revises: d84b1f6c2e59
+Create Date: 2026-10-17 17:05:19.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7c3e9a1d5f82"
+down_revision = "d84b1f6c2e59"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "sales_rollup",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("grain", sa.String(length=1), nullable=False),
+        sa.Column("period", sa.Date(), nullable=False),
+        sa.Column("segment", sa.String(length=16), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("orders", sa.Integer(), nullable=False),
+        sa.Column("revenue", sa.Numeric(16, 2), nullable=False),
+        sa.Column("cost", sa.Numeric(16, 2), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "grain",
+            "period",
+            "segment",
+            "user_id",
+            "currency",
+            name="uq_sales_rollup_key",
+        ),
+    )
+    # заполнить свод по уже существующим продажам:
+    #   python manage.py rebuild-sales-rollups --from 2020-01-01
+
+
+def downgrade():
+    op.drop_table("sales_rollup")
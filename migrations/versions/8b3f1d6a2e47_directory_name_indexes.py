@@ -0,0 +1,33 @@
+"""directory name indexes: supplier.name, subagent.name for keyset listings
+
+Revision ID: 8b3f1d6a2e47
+Revises: 6e2a9c4b8d13
+Create Date: 2026-10-17 22:14:30.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8b3f1d6a2e47"
+down_revision = "6e2a9c4b8d13"
+branch_labels = None
+depends_on = None
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    insp = sa.inspect(op.get_bind())
+    return any(ix["name"] == index_name for ix in insp.get_indexes(table_name))
+
+
+def upgrade():
+    # списки справочников идут по (name, id); id уже входит во вторичный индекс InnoDB
+    op.create_index("ix_supplier_name", "supplier", ["name"])
+    # у унаследованной таблицы subagent индекс мог уже быть
+    if not _index_exists("subagent", "ix_subagent_name"):
+        op.create_index("ix_subagent_name", "subagent", ["name"])
+
+
+def downgrade():
+    op.drop_index("ix_subagent_name", table_name="subagent")
+    op.drop_index("ix_supplier_name", table_name="supplier")
@@ -0,0 +1,50 @@
+"""ticket_sale_monthly: monthly ticket sales rollups
+
+Revision ID: 9d4c1e7f3a20
+Revises: e31f6a2b9c54
+Create Date: 2026-10-17 14:10:44.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9d4c1e7f3a20"
+down_revision = "e31f6a2b9c54"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "ticket_sale_monthly",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("airline_code", sa.String(length=8), nullable=False),
+        sa.Column("supplier_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("tickets", sa.Integer(), nullable=False),
+        sa.Column("fare_supplier", sa.Numeric(16, 2), nullable=False),
+        sa.Column("tax_supplier", sa.Numeric(16, 2), nullable=False),
+        sa.Column("other_fees_supplier", sa.Numeric(16, 2), nullable=False),
+        sa.Column("our_fee_supplier", sa.Numeric(16, 2), nullable=False),
+        sa.Column("total_supplier", sa.Numeric(16, 2), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "month",
+            "airline_code",
+            "supplier_id",
+            "currency",
+            name="uq_ticket_monthly_key",
+        ),
+    )
+    op.create_index(
+        "ix_ticket_monthly_airline", "ticket_sale_monthly", ["airline_code", "month"]
+    )
+    # заполнить своды по уже существующим билетам:
+    #   python manage.py rebuild-ticket-rollups
+
+
+def downgrade():
+    op.drop_index("ix_ticket_monthly_airline", table_name="ticket_sale_monthly")
+    op.drop_table("ticket_sale_monthly")
@@ -0,0 +1,43 @@
+"""bank_match: bank-to-ledger reconciliation results
+
+Revision ID: a867c9ef4417
+Revises: 158d33ee959f
+Create Date: 2026-10-17 12:02:18.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a867c9ef4417"
+down_revision = "158d33ee959f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "bank_match",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("bank_operation_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(length=10), nullable=False),
+        sa.Column("ledger_type", sa.String(length=20), nullable=True),
+        sa.Column("ledger_id", sa.Integer(), nullable=True),
+        sa.Column("method", sa.String(length=20), nullable=True),
+        sa.Column("day_diff", sa.Integer(), nullable=True),
+        sa.Column("candidates", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["bank_operation_id"], ["bank_operation.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("bank_operation_id"),
+    )
+    op.create_index("ix_bank_match_status", "bank_match", ["status"])
+    op.create_index("ix_bank_match_ledger", "bank_match", ["ledger_type", "ledger_id"])
+
+
+def downgrade():
+    op.drop_index("ix_bank_match_ledger", table_name="bank_match")
+    op.drop_index("ix_bank_match_status", table_name="bank_match")
+    op.drop_table("bank_match")
@@ -0,0 +1,56 @@
+"""tour schedule: date-range indexes and tour_occupancy day buckets
+
+Revision ID: b62d8e4f0a17
+Revises: 4f7a2c9e1b36
+Create Date: 2026-10-17 15:40:31.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b62d8e4f0a17"
+down_revision = "4f7a2c9e1b36"
+branch_labels = None
+depends_on = None
+
+DATE_INDEXES = (
+    ("ix_inttour_dates", "internal_tour", ["start_date", "end_date"]),
+    ("ix_inttour_end_date", "internal_tour", ["end_date", "start_date"]),
+    ("ix_exttour_dates", "external_tour", ["start_date", "end_date"]),
+    ("ix_exttour_end_date", "external_tour", ["end_date", "start_date"]),
+)
+
+
+def _index_exists(table_name: str, index_name: str) -> bool:
+    insp = sa.inspect(op.get_bind())
+    try:
+        idx = insp.get_indexes(table_name)
+    except Exception:
+        return False
+    return index_name in {i.get("name") for i in idx if i.get("name")}
+
+
+def upgrade():
+    for name, table, columns in DATE_INDEXES:
+        if not _index_exists(table, name):
+            op.create_index(name, table, columns)
+
+    op.create_table(
+        "tour_occupancy",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=16), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("direction", sa.String(length=255), nullable=False),
+        sa.Column("tours", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("kind", "day", "direction", name="uq_tour_occupancy_key"),
+    )
+    # заполнить загрузку по уже существующим турам:
+    #   python manage.py rebuild-tour-occupancy
+
+
+def downgrade():
+    op.drop_table("tour_occupancy")
+    for name, table, _columns in DATE_INDEXES:
+        op.drop_index(name, table_name=table)
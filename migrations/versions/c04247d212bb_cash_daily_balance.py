@@ -0,0 +1,39 @@
+"""cash_daily_balance: daily cash snapshots per user and currency
+
+Revision ID: c04247d212bb
+Revises: cee3f3dee836
+Create Date: 2026-10-17 10:05:12.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c04247d212bb"
+down_revision = "cee3f3dee836"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "cash_daily_balance",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("income", sa.Numeric(16, 2), nullable=False),
+        sa.Column("expense", sa.Numeric(16, 2), nullable=False),
+        sa.Column("closing", sa.Numeric(16, 2), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("user_id", "currency", "day", name="uq_cash_balance_key"),
+    )
+    op.create_index("ix_cash_balance_day", "cash_daily_balance", ["currency", "day"])
+    # заполнить снимки по уже существующим операциям:
+    #   python manage.py rebuild-cash-balances
+
+
+def downgrade():
+    op.drop_index("ix_cash_balance_day", table_name="cash_daily_balance")
+    op.drop_table("cash_daily_balance")
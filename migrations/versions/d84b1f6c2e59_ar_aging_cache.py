@@ -0,0 +1,57 @@
+"""ar aging: cached receivables snapshots per as-of date
+
+Revision ID: d84b1f6c2e59
+Revises: b62d8e4f0a17
+Create Date: 2026-10-17 16:25:47.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d84b1f6c2e59"
+down_revision = "b62d8e4f0a17"
+branch_labels = None
+depends_on = None
+
+AMOUNTS = (
+    "sales",
+    "paid",
+    "days_0_30",
+    "days_31_60",
+    "days_61_90",
+    "days_90_plus",
+    "advance",
+)
+
+
+def upgrade():
+    op.create_table(
+        "ar_aging_snapshot",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("as_of", sa.Date(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("as_of"),
+    )
+    op.create_table(
+        "ar_aging_line",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("as_of", sa.Date(), nullable=False),
+        sa.Column("client_id", sa.Integer(), nullable=False),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("stale", sa.Boolean(), nullable=False),
+        *(sa.Column(name, sa.Numeric(16, 2), nullable=False) for name in AMOUNTS),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "as_of", "client_id", "currency", name="uq_ar_aging_line_key"
+        ),
+    )
+    op.create_index("ix_ar_aging_client", "ar_aging_line", ["client_id", "as_of"])
+    # снимки строятся при первом открытии отчёта на дату
+
+
+def downgrade():
+    op.drop_index("ix_ar_aging_client", table_name="ar_aging_line")
+    op.drop_table("ar_aging_line")
+    op.drop_table("ar_aging_snapshot")
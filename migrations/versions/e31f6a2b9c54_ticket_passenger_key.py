@@ -0,0 +1,58 @@
+"""ticket_sale.passenger_key: transliterated passenger name search key
+
+Revision ID: e31f6a2b9c54
+Revises: 5b2e8d0c7a91
+Create Date: 2026-10-17 13:48:30.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e31f6a2b9c54"
+down_revision = "5b2e8d0c7a91"
+branch_labels = None
+depends_on = None
+
+BATCH = 5000
+
+
+def upgrade():
+    from translit import name_key
+
+    op.add_column(
+        "ticket_sale", sa.Column("passenger_key", sa.String(length=255), nullable=True)
+    )
+
+    # заполнение ключей пачками по id
+    bind = op.get_bind()
+    t = sa.table(
+        "ticket_sale",
+        sa.column("id", sa.Integer),
+        sa.column("passenger_name", sa.String),
+        sa.column("passenger_key", sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(t.c.id, t.c.passenger_name)
+            .where(t.c.id > last_id, t.c.passenger_name.isnot(None))
+            .order_by(t.c.id)
+            .limit(BATCH)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            t.update()
+            .where(t.c.id == sa.bindparam("_id"))
+            .values(passenger_key=sa.bindparam("_key")),
+            [{"_id": r.id, "_key": name_key(r.passenger_name)} for r in rows],
+        )
+        last_id = rows[-1].id
+
+    op.create_index("ix_ticket_sale_passenger_key", "ticket_sale", ["passenger_key"])
+
+
+def downgrade():
+    op.drop_index("ix_ticket_sale_passenger_key", table_name="ticket_sale")
+    op.drop_column("ticket_sale", "passenger_key")
@@ -0,0 +1,46 @@
+"""job: background jobs (exports, batch printing, heavy reports)
+
+Revision ID: e5b19c7d4a36
+Revises: 3a8f5d2c6e14
+Create Date: 2026-10-17 19:02:11.000000
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5b19c7d4a36"
+down_revision = "3a8f5d2c6e14"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(length=32), nullable=False),
+        sa.Column("params", sa.Text(), nullable=True),
+        sa.Column("status", sa.String(length=10), nullable=False),
+        sa.Column("progress", sa.Integer(), nullable=False),
+        sa.Column("message", sa.String(length=255), nullable=True),
+        sa.Column("worker", sa.String(length=64), nullable=True),
+        sa.Column("result_path", sa.String(length=255), nullable=True),
+        sa.Column("result_name", sa.String(length=255), nullable=True),
+        sa.Column("mimetype", sa.String(length=100), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("started_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("expires_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_job_status", "job", ["status", "id"])
+    op.create_index("ix_job_user_time", "job", ["user_id", "created_at"])
+
+
+def downgrade():
+    op.drop_index("ix_job_user_time", table_name="job")
+    op.drop_index("ix_job_status", table_name="job")
+    op.drop_table("job")
@@ -3,9 +3,15 @@ from datetime import date, datetime
 from decimal import Decimal
 
 from flask_login import UserMixin
+from sqlalchemy import case, func, literal_column, null, type_coerce
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import validates
 from werkzeug.security import check_password_hash, generate_password_hash
 
 from extensions import db, login_manager
+from translit import name_key
+
+_SQL_ZERO = literal_column("0")
 
 
 # ========= Пользователи и справочники =========
@@ -90,7 +96,8 @@ class Supplier(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     code = db.Column(db.String(64), unique=True, nullable=False, index=True)
-    name = db.Column(db.String(255), nullable=False)
+    # индекс под сортировку и keyset-пагинацию списка по (name, id)
+    name = db.Column(db.String(255), nullable=False, index=True)
     phone = db.Column(db.String(32))
 
     cash_operations = db.relationship(
@@ -113,6 +120,33 @@ class Supplier(db.Model):
         return f"<Supplier {self.code} - {self.name}>"
 
 
+class Subagent(db.Model):
+    __tablename__ = "subagent"
+
+    id = db.Column(db.Integer, primary_key=True)
+    code = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Subagent {self.code} - {self.name}>"
+
+
+class DirectoryVersion(db.Model):
+    """
+    Счётчик версий справочника (client, supplier, subagent): растёт в той
+    же транзакции, что и правка справочника. По нему процессы видят, что
+    их копия справочника в памяти (refdata.py) устарела.
+    """
+
+    __tablename__ = "directory_version"
+
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DirectoryVersion {self.name}={self.version}>"
+
+
 # ========= Касса (наличные) =========
 class CashOperation(db.Model):
     __tablename__ = "cash_operation"
@@ -157,6 +191,34 @@ class CashOperation(db.Model):
         return f"<CashOperation {self.op_type} {self.amount} {self.currency} user={self.user_id}>"
 
 
+class CashDailyBalance(db.Model):
+    """
+    Снимок кассы за день по кассиру и валюте: обороты дня и остаток на конец дня.
+    Ведётся инкрементально при изменении CashOperation (blueprints/cash/balances.py),
+    пересобирается командой `python manage.py rebuild-cash-balances`.
+    """
+
+    __tablename__ = "cash_daily_balance"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    currency = db.Column(db.String(3), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+
+    income = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    expense = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    closing = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("user_id", "currency", "day", name="uq_cash_balance_key"),
+    )
+
+    def __repr__(self):
+        return f"<CashDailyBalance {self.day} {self.currency} user={self.user_id} {self.closing}>"
+
+
 # ========= Банк (безнал) =========
 class BankOperation(db.Model):
     __tablename__ = "bank_operation"
@@ -202,6 +264,35 @@ class BankOperation(db.Model):
         return f"<BankOperation {self.op_type} {self.amount} {self.currency} user={self.user_id}>"
 
 
+class BankMatch(db.Model):
+    """
+    Результат сверки банковской операции с учётом (билеты, туры).
+    status: matched | ambiguous | unmatched; ledger_type: ticket | internal_tour | external_tour.
+    """
+
+    __tablename__ = "bank_match"
+
+    id = db.Column(db.Integer, primary_key=True)
+    bank_operation_id = db.Column(
+        db.Integer,
+        db.ForeignKey("bank_operation.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    status = db.Column(db.String(10), nullable=False, index=True)
+    ledger_type = db.Column(db.String(20), nullable=True)
+    ledger_id = db.Column(db.Integer, nullable=True)
+    method = db.Column(db.String(20), nullable=True)  # doc_number | amount
+    day_diff = db.Column(db.Integer, nullable=True)
+    candidates = db.Column(db.Text, nullable=True)  # для ambiguous: type:id,...
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    bank_operation = db.relationship("BankOperation")
+
+    def __repr__(self):
+        return f"<BankMatch bank={self.bank_operation_id} {self.status} {self.ledger_type}:{self.ledger_id}>"
+
+
 # ========= Реестр продаж авиабилетов =========
 class TicketSale(db.Model):
     __tablename__ = "ticket_sale"
@@ -226,6 +317,8 @@ class TicketSale(db.Model):
 
     airline_code = db.Column(db.String(8), nullable=True, index=True)  # Код А/К
     passenger_name = db.Column(db.String(255), nullable=True)  # ФИО/Пассажира
+    # ключ поиска по ФИО: транслит, нижний регистр (translit.name_key)
+    passenger_key = db.Column(db.String(255), nullable=True, index=True)
     ticket_number = db.Column(db.String(32), nullable=True, index=True)  # Номер А/Б
     order_number = db.Column(db.String(64), nullable=True, index=True)  # Номер заказа
     route = db.Column(db.String(255), nullable=True)  # Маршрут
@@ -253,12 +346,104 @@ class TicketSale(db.Model):
     client = db.relationship("Client", back_populates="ticket_sales")
     supplier = db.relationship("Supplier", back_populates="ticket_sales")
 
+    @validates("passenger_name")
+    def _set_passenger_key(self, _key, value):
+        self.passenger_key = name_key(value)
+        return value
+
     def __repr__(self):
         return f"<TicketSale {self.ticket_number} {self.passenger_name} {self.airline_code}>"
 
 
+class TicketSaleMonthly(db.Model):
+    """
+    Свод продаж билетов за месяц sale_date по (авиакомпания, поставщик, валюта).
+    Ведётся инкрементально при изменении TicketSale (blueprints/tickets/rollups.py),
+    пересобирается командой `python manage.py rebuild-ticket-rollups`.
+    Пустой код А/К хранится как "", отсутствующий поставщик — как 0.
+    """
+
+    __tablename__ = "ticket_sale_monthly"
+
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False)  # первое число месяца
+    airline_code = db.Column(db.String(8), nullable=False, default="")
+    supplier_id = db.Column(db.Integer, nullable=False, default=0)
+    currency = db.Column(db.String(3), nullable=False)
+
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+    fare_supplier = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    tax_supplier = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    other_fees_supplier = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    our_fee_supplier = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    total_supplier = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "month",
+            "airline_code",
+            "supplier_id",
+            "currency",
+            name="uq_ticket_monthly_key",
+        ),
+    )
+
+    def __repr__(self):
+        return f"<TicketSaleMonthly {self.month} {self.airline_code} {self.currency} {self.tickets}>"
+
+
+# ========= Туры: экономика =========
+class TourProfitMixin:
+    """
+    net_profit и margin туров — гибридные атрибуты: у объекта считаются
+    в Python, в запросах — SQL-выражением, по которому можно фильтровать,
+    сортировать и агрегировать (и по которому построены индексы ниже).
+    Литерал 0 без bind-параметра, чтобы выражение запроса совпадало
+    с выражением индекса.
+    """
+
+    @hybrid_property
+    def net_profit(self):
+        try:
+            c = Decimal(self.cost or 0)
+            s = Decimal(self.sale_price or 0)
+            return s - c
+        except Exception:
+            return None
+
+    @net_profit.inplace.expression
+    @classmethod
+    def _net_profit_expression(cls):
+        return type_coerce(
+            func.coalesce(cls.sale_price, _SQL_ZERO)
+            - func.coalesce(cls.cost, _SQL_ZERO),
+            db.Numeric(14, 2),
+        )
+
+    @hybrid_property
+    def margin(self):
+        try:
+            s = Decimal(self.sale_price or 0)
+            if s == 0:
+                return None
+            return (self.net_profit or Decimal(0)) / s
+        except Exception:
+            return None
+
+    @margin.inplace.expression
+    @classmethod
+    def _margin_expression(cls):
+        return type_coerce(
+            case(
+                (func.coalesce(cls.sale_price, _SQL_ZERO) == _SQL_ZERO, null()),
+                else_=cls.net_profit / cls.sale_price,
+            ),
+            db.Numeric(12, 6),
+        )
+
+
 # ========= Внутренний туризм =========
-class InternalTour(db.Model):
+class InternalTour(TourProfitMixin, db.Model):
     """
     Внутренние туры: расчёт нетто и маржи по формуле в приложении.
     """
@@ -302,31 +487,12 @@ class InternalTour(db.Model):
     client = db.relationship("Client", back_populates="internal_tours")
     supplier = db.relationship("Supplier", back_populates="internal_tours")
 
-    @property
-    def net_profit(self):
-        try:
-            c = Decimal(self.cost or 0)
-            s = Decimal(self.sale_price or 0)
-            return s - c
-        except Exception:
-            return None
-
-    @property
-    def margin(self):
-        try:
-            s = Decimal(self.sale_price or 0)
-            if s == 0:
-                return None
-            return (self.net_profit or Decimal(0)) / s
-        except Exception:
-            return None
-
     def __repr__(self):
         return f"<InternalTour {self.fio or ''} {self.direction or ''}>"
 
 
 # ========= Внешний туризм =========
-class ExternalTour(db.Model):
+class ExternalTour(TourProfitMixin, db.Model):
     __tablename__ = "external_tour"
 
     id = db.Column(db.Integer, primary_key=True)
@@ -366,27 +532,194 @@ class ExternalTour(db.Model):
     client = db.relationship("Client", back_populates="external_tours")
     supplier = db.relationship("Supplier", back_populates="external_tours")
 
+    def __repr__(self):
+        return f"<ExternalTour {self.fio or ''} {self.direction or ''}>"
+
+
+class TourOccupancy(db.Model):
+    """
+    Загрузка по дням: сколько туров вида kind ("internal"/"external") идёт
+    в день day по направлению direction. Ведётся инкрементально при изменении
+    туров (schedule.py), пересобирается командой
+    `python manage.py rebuild-tour-occupancy`. Пустое направление — "".
+    """
+
+    __tablename__ = "tour_occupancy"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(16), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    direction = db.Column(db.String(255), nullable=False, default="")
+    tours = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint("kind", "day", "direction", name="uq_tour_occupancy_key"),
+    )
+
+    def __repr__(self):
+        return f"<TourOccupancy {self.kind} {self.day} {self.direction} {self.tours}>"
+
+
+# ========= Курсы валют =========
+class FxRate(db.Model):
+    """
+    Курс на дату: 1 base = rate quote (например USD → UZS 12650.00).
+    Загружается из CSV (fx.py, `python manage.py import-fx-rates`);
+    курс на дату без котировки — последний известный до неё.
+    """
+
+    __tablename__ = "fx_rate"
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    base = db.Column(db.String(3), nullable=False)
+    quote = db.Column(db.String(3), nullable=False)
+    rate = db.Column(db.Numeric(18, 8), nullable=False)
+    source = db.Column(db.String(32), nullable=True)  # откуда загружен (ЦБ, банк)
+
+    # меняется при каждой перезагрузке курса: по нему кэш fx.py видит правки
+    updated_at = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    __table_args__ = (
+        db.UniqueConstraint("base", "quote", "day", name="uq_fx_rate_key"),
+    )
+
+    def __repr__(self):
+        return f"<FxRate {self.day} {self.base}/{self.quote} {self.rate}>"
+
+
+# ========= Отчёты: свод продаж =========
+class SalesRollup(db.Model):
+    """
+    Свод продаж по сегментам (билеты, внутренние и внешние туры) за день
+    (grain="d") и за месяц (grain="m", period — первое число) в разрезе
+    пользователя и валюты. Ведётся инкрементально (blueprints/reports/sales.py),
+    пересобирается командой `python manage.py rebuild-sales-rollups`.
+    """
+
+    __tablename__ = "sales_rollup"
+
+    id = db.Column(db.Integer, primary_key=True)
+    grain = db.Column(db.String(1), nullable=False)
+    period = db.Column(db.Date, nullable=False)
+    segment = db.Column(db.String(16), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    cost = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "grain",
+            "period",
+            "segment",
+            "user_id",
+            "currency",
+            name="uq_sales_rollup_key",
+        ),
+    )
+
+    def __repr__(self):
+        return f"<SalesRollup {self.grain} {self.period} {self.segment} {self.currency} {self.orders}>"
+
+
+# ========= Аналитика: дебиторка по срокам =========
+class ArAgingSnapshot(db.Model):
+    """
+    Кэш дебиторки по срокам на дату as_of (blueprints/analytics/aging.py).
+    Строки — ArAgingLine с тем же as_of.
+    """
+
+    __tablename__ = "ar_aging_snapshot"
+
+    id = db.Column(db.Integer, primary_key=True)
+    as_of = db.Column(db.Date, nullable=False, unique=True)
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ArAgingSnapshot {self.as_of} {self.computed_at}>"
+
+
+class ArAgingLine(db.Model):
+    """
+    Задолженность клиента в валюте на дату as_of по корзинам сроков.
+    stale=True — строка-метка: журналы клиента изменились, строку нужно
+    пересчитать (валюта у метки пустая).
+    """
+
+    __tablename__ = "ar_aging_line"
+
+    id = db.Column(db.Integer, primary_key=True)
+    as_of = db.Column(db.Date, nullable=False)
+    client_id = db.Column(db.Integer, nullable=False)
+    currency = db.Column(db.String(3), nullable=False, default="")
+    stale = db.Column(db.Boolean, nullable=False, default=False)
+
+    sales = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    paid = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    days_0_30 = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    days_31_60 = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    days_61_90 = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    days_90_plus = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    advance = db.Column(db.Numeric(16, 2), nullable=False, default=0)  # переплата
+
+    __table_args__ = (
+        db.UniqueConstraint(
+            "as_of", "client_id", "currency", name="uq_ar_aging_line_key"
+        ),
+    )
+
     @property
-    def net_profit(self):
-        try:
-            c = Decimal(self.cost or 0)
-            s = Decimal(self.sale_price or 0)
-            return s - c
-        except Exception:
-            return None
+    def outstanding(self):
+        return self.days_0_30 + self.days_31_60 + self.days_61_90 + self.days_90_plus
+
+    def __repr__(self):
+        return f"<ArAgingLine {self.as_of} client={self.client_id} {self.currency}>"
+
+
+# ========= Фоновые задания =========
+class Job(db.Model):
+    """
+    Фоновое задание (выгрузка, пакетная печать, тяжёлый отчёт): jobs.py.
+    queued → running → done | failed; у готового результата — файл на
+    диске до expires_at, затем статус expired и файл удаляется.
+    """
+
+    __tablename__ = "job"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id", ondelete="CASCADE"), nullable=False
+    )
+    kind = db.Column(db.String(32), nullable=False)
+    params = db.Column(db.Text, nullable=True)  # JSON
+    status = db.Column(db.String(10), nullable=False, default="queued")
+
+    progress = db.Column(db.Integer, nullable=False, default=0)  # 0..100
+    message = db.Column(db.String(255), nullable=True)
+    worker = db.Column(db.String(64), nullable=True)  # хост:pid, взявший задание
+
+    result_path = db.Column(db.String(255), nullable=True)
+    result_name = db.Column(db.String(255), nullable=True)
+    mimetype = db.Column(db.String(100), nullable=True)
+
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    # последний признак жизни исполнителя (взятие задания, прогресс)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    expires_at = db.Column(db.DateTime, nullable=True)
 
     @property
-    def margin(self):
-        try:
-            s = Decimal(self.sale_price or 0)
-            if s == 0:
-                return None
-            return (self.net_profit or Decimal(0)) / s
-        except Exception:
-            return None
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "expired")
 
     def __repr__(self):
-        return f"<ExternalTour {self.fio or ''} {self.direction or ''}>"
+        return f"<Job {self.id} {self.kind} {self.status}>"
 
 
 # ========= Аудит =========
@@ -410,13 +743,42 @@ class AuditLog(db.Model):
 # ========= Индексы для типовых выборок =========
 db.Index("ix_cash_user_time", CashOperation.user_id, CashOperation.created_at)
 db.Index("ix_cash_type_time", CashOperation.op_type, CashOperation.created_at)
+db.Index("ix_cash_balance_day", CashDailyBalance.currency, CashDailyBalance.day)
 db.Index("ix_bank_user_time", BankOperation.user_id, BankOperation.created_at)
 db.Index("ix_bank_type_time", BankOperation.op_type, BankOperation.created_at)
+db.Index("ix_bank_value_doc", BankOperation.value_date, BankOperation.doc_number)
+db.Index("ix_bank_match_ledger", BankMatch.ledger_type, BankMatch.ledger_id)
 db.Index("ix_ticket_user_time", TicketSale.user_id, TicketSale.created_at)
 db.Index("ix_ticket_sale_date", TicketSale.sale_date)
 db.Index("ix_ticket_dep_date", TicketSale.departure_date)
+db.Index(
+    "ix_ticket_monthly_airline", TicketSaleMonthly.airline_code, TicketSaleMonthly.month
+)
 db.Index("ix_inttour_user_time", InternalTour.user_id, InternalTour.created_at)
 db.Index("ix_exttour_user_time", ExternalTour.user_id, ExternalTour.created_at)
+# пересечение периодов: начало в окне / идёт на момент начала окна (schedule.py)
+db.Index("ix_inttour_dates", InternalTour.start_date, InternalTour.end_date)
+db.Index("ix_inttour_end_date", InternalTour.end_date, InternalTour.start_date)
+db.Index("ix_exttour_dates", ExternalTour.start_date, ExternalTour.end_date)
+db.Index("ix_exttour_end_date", ExternalTour.end_date, ExternalTour.start_date)
+# функциональные индексы по экономике туров (TourProfitMixin)
+db.Index("ix_inttour_net_profit", InternalTour.net_profit)
+db.Index("ix_inttour_margin", InternalTour.margin)
+db.Index("ix_exttour_net_profit", ExternalTour.net_profit)
+db.Index("ix_exttour_margin", ExternalTour.margin)
+db.Index("ix_ar_aging_client", ArAgingLine.client_id, ArAgingLine.as_of)
+db.Index("ix_job_status", Job.status, Job.id)
+db.Index("ix_job_user_time", Job.user_id, Job.created_at)
+
+# Полнотекстовый поиск (search.py): в MySQL — FULLTEXT, в SQLite — таблица FTS5
+for _name, _col in (
+    ("ft_cash_description", CashOperation.description),
+    ("ft_bank_description", BankOperation.description),
+    ("ft_ticket_route", TicketSale.route),
+    ("ft_inttour_notes", InternalTour.notes),
+    ("ft_exttour_notes", ExternalTour.notes),
+):
+    db.Index(_name, _col, mysql_prefix="FULLTEXT").ddl_if(dialect="mysql")
 
 
 # ========= Flask-Login user loader =========
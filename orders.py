@@ -0,0 +1,165 @@
+# C:\tourismops\orders.py
+"""
+Единый слой заказов туров: внутренние и внешние туры как одна выборка.
+
+InternalTour и ExternalTour совпадают по колонкам, поэтому общий список —
+UNION ALL двух SELECT с дискриминатором segment. order_key = id * 4 + номер
+сегмента уникален по обоим журналам и служит вторым полем keyset-курсора.
+
+Страница — один запрос: в каждой ветке свои фильтры, условие курсора и
+ORDER BY created_at … LIMIT per_page + 1 (по индексу created_at), снаружи
+сливаются два коротких списка. Итоги — GROUP BY поверх того же UNION ALL.
+"""
+
+from dataclasses import dataclass
+from datetime import date
+
+from sqlalchemy import func, literal, select, union_all
+
+from extensions import db
+from models import ExternalTour, InternalTour
+from pagination import DEFAULT_PER_PAGE, KeysetPage, decode_cursor, encode_cursor, seek
+
+# сегмент → (номер в order_key, модель)
+SEGMENTS = {"internal": (1, InternalTour), "external": (2, ExternalTour)}
+_KEY_STRIDE = 4
+
+COLUMNS = (
+    "id",
+    "user_id",
+    "client_id",
+    "supplier_id",
+    "order_type",
+    "fio",
+    "start_date",
+    "end_date",
+    "direction",
+    "currency",
+    "cost",
+    "sale_price",
+    "created_at",
+)
+
+
+@dataclass
+class OrderFilters:
+    segments: list | None = None
+    user_id: int | None = None
+    client_id: int | None = None
+    supplier_id: int | None = None
+    currency: str | None = None
+    date_from: date | None = None  # по start_date
+    date_to: date | None = None
+
+    def kinds(self) -> list:
+        return [s for s in SEGMENTS if not self.segments or s in self.segments]
+
+
+def _order_key(segment: str):
+    no, model = SEGMENTS[segment]
+    return model.id * _KEY_STRIDE + no
+
+
+def _branch(segment: str, f: OrderFilters):
+    """SELECT одного сегмента с общими колонками и фильтрами."""
+    _no, model = SEGMENTS[segment]
+    q = select(
+        literal(segment).label("segment"),
+        _order_key(segment).label("order_key"),
+        *(getattr(model, c).label(c) for c in COLUMNS),
+        model.net_profit.label("net_profit"),
+    )
+    for name in ("user_id", "client_id", "supplier_id", "currency"):
+        value = getattr(f, name)
+        if value is not None:
+            q = q.where(getattr(model, name) == value)
+    if f.date_from:
+        q = q.where(model.start_date >= f.date_from)
+    if f.date_to:
+        q = q.where(model.start_date <= f.date_to)
+    return q
+
+
+def union(f: OrderFilters | None = None):
+    """Подзапрос tour_orders (UNION ALL сегментов) для отчётов и своих выборок."""
+    f = f or OrderFilters()
+    return union_all(*(_branch(s, f) for s in f.kinds())).subquery("tour_orders")
+
+
+def page(
+    f: OrderFilters,
+    *,
+    after: str | None = None,
+    before: str | None = None,
+    per_page: int = DEFAULT_PER_PAGE,
+) -> KeysetPage:
+    """
+    Страница заказов всех сегментов f, новые сверху, по (created_at, order_key).
+    Курсоры — как у pagination.keyset_paginate.
+    """
+    kinds = f.kinds()
+    if not kinds:
+        return KeysetPage()
+    after_key = decode_cursor(after, InternalTour.created_at)
+    before_key = (
+        decode_cursor(before, InternalTour.created_at) if after_key is None else None
+    )
+    # назад: идём по возрастанию от курсора и разворачиваем результат
+    older = before_key is None
+    key = after_key if older else before_key
+
+    branches = []
+    for segment in kinds:
+        model = SEGMENTS[segment][1]
+        order_key = _order_key(segment)
+        q = _branch(segment, f)
+        if key is not None:
+            q = q.where(seek(model.created_at, order_key, key, older=older))
+        if older:
+            q = q.order_by(model.created_at.desc(), order_key.desc())
+        else:
+            q = q.order_by(model.created_at.asc(), order_key.asc())
+        # SQLite не допускает ORDER BY/LIMIT в частях UNION — оборачиваем
+        branches.append(select(q.limit(per_page + 1).subquery()))
+
+    u = union_all(*branches).subquery("tour_orders")
+    if older:
+        stmt = select(u).order_by(u.c.created_at.desc(), u.c.order_key.desc())
+    else:
+        stmt = select(u).order_by(u.c.created_at.asc(), u.c.order_key.asc())
+    rows = db.session.execute(stmt.limit(per_page + 1)).all()
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if older:
+        has_prev, has_next = after_key is not None, has_more
+    else:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+
+    result = KeysetPage(items=rows)
+    if rows:
+        first, last = rows[0], rows[-1]
+        if has_prev:
+            result.prev_cursor = encode_cursor(first.created_at, first.order_key)
+        if has_next:
+            result.next_cursor = encode_cursor(last.created_at, last.order_key)
+    return result
+
+
+def totals(f: OrderFilters | None = None) -> list:
+    """Итоги по (сегмент, валюта): заказов, себестоимость, продажи, прибыль."""
+    u = union(f)
+    stmt = (
+        select(
+            u.c.segment,
+            u.c.currency,
+            func.count().label("orders"),
+            func.sum(u.c.cost).label("cost"),
+            func.sum(u.c.sale_price).label("sale_price"),
+            func.sum(u.c.net_profit).label("net_profit"),
+        )
+        .group_by(u.c.segment, u.c.currency)
+        .order_by(u.c.segment, u.c.currency)
+    )
+    return db.session.execute(stmt).all()
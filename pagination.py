@@ -0,0 +1,156 @@
+"""
+Keyset-пагинация (курсорная) для длинных журналов.
+
+Вместо OFFSET страница выбирается условием по составному ключу
+(колонка сортировки, id), поэтому СУБД идёт по индексу от курсора
+и читает только per_page + 1 строк — независимо от размера таблицы.
+"""
+
+import base64
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime
+
+from flask import request, url_for
+from sqlalchemy import Date, DateTime, and_, func, or_, select
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+# дальше этого числа строки выборки не пересчитываются (capped_count)
+COUNT_CAP = 10000
+
+
+@dataclass
+class KeysetPage:
+    items: list = field(default_factory=list)
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self) -> bool:
+        return self.prev_cursor is not None
+
+
+# ---- курсоры ---------------------------------------------------------------
+def encode_cursor(value, item_id: int) -> str:
+    if isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    raw = json.dumps([value, item_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str | None, sort_col):
+    """Курсор → (значение, id) или None, если курсор битый."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, item_id = json.loads(raw.decode("utf-8"))
+        col_type = sort_col.type
+        if value is not None and isinstance(col_type, DateTime):
+            value = datetime.fromisoformat(value)
+        elif value is not None and isinstance(col_type, Date):
+            value = date.fromisoformat(value)
+        return value, int(item_id)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def per_page_arg(default: int = DEFAULT_PER_PAGE) -> int:
+    """?per_page=N из запроса, ограниченный сверху MAX_PER_PAGE."""
+    n = request.args.get("per_page", type=int) or default
+    return max(1, min(n, MAX_PER_PAGE))
+
+
+# ---- выборка страницы ------------------------------------------------------
+def seek(sort_col, id_col, key, older: bool):
+    """Условие «строго после ключа (значение, id)» в сторону older/newer."""
+    value, item_id = key
+    if older:
+        return or_(sort_col < value, and_(sort_col == value, id_col < item_id))
+    return or_(sort_col > value, and_(sort_col == value, id_col > item_id))
+
+
+def keyset_paginate(
+    query,
+    sort_col,
+    id_col,
+    *,
+    after: str | None = None,
+    before: str | None = None,
+    per_page: int = DEFAULT_PER_PAGE,
+    descending: bool = True,
+) -> KeysetPage:
+    """
+    Страница query, упорядоченная по (sort_col, id_col).
+
+    after  — курсор последней строки предыдущей страницы (ссылка «дальше»);
+    before — курсор первой строки следующей страницы (ссылка «назад»).
+    Сортируемая колонка должна быть NOT NULL.
+    """
+    after_key = decode_cursor(after, sort_col)
+    before_key = decode_cursor(before, sort_col) if after_key is None else None
+
+    if descending:
+        forward = (sort_col.desc(), id_col.desc())
+        backward = (sort_col.asc(), id_col.asc())
+    else:
+        forward = (sort_col.asc(), id_col.asc())
+        backward = (sort_col.desc(), id_col.desc())
+
+    if before_key is not None:
+        # идём в обратную сторону от курсора и разворачиваем результат
+        rows = (
+            query.filter(seek(sort_col, id_col, before_key, older=not descending))
+            .order_by(*backward)
+            .limit(per_page + 1)
+            .all()
+        )
+        has_more = len(rows) > per_page
+        rows = list(reversed(rows[:per_page]))
+        has_prev, has_next = has_more, True
+    else:
+        if after_key is not None:
+            query = query.filter(seek(sort_col, id_col, after_key, older=descending))
+        rows = query.order_by(*forward).limit(per_page + 1).all()
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_prev = after_key is not None
+
+    page = KeysetPage(items=rows)
+    if rows:
+        sort_attr, id_attr = sort_col.key, id_col.key
+        first, last = rows[0], rows[-1]
+        if has_prev:
+            page.prev_cursor = encode_cursor(
+                getattr(first, sort_attr), getattr(first, id_attr)
+            )
+        if has_next:
+            page.next_cursor = encode_cursor(
+                getattr(last, sort_attr), getattr(last, id_attr)
+            )
+    return page
+
+
+def capped_count(query, id_col, cap: int = COUNT_CAP) -> tuple[int, bool]:
+    """
+    (число строк query, точное ли оно). Считается по подзапросу с
+    LIMIT cap + 1, поэтому широкая выборка не пересчитывается целиком:
+    если строк больше cap, возвращается (cap, False) — «больше cap».
+    """
+    sub = query.order_by(None).with_entities(id_col).limit(cap + 1).subquery()
+    n = query.session.execute(select(func.count()).select_from(sub)).scalar() or 0
+    return (n, True) if n <= cap else (cap, False)
+
+
+def page_url(endpoint: str, **cursor) -> str:
+    """URL соседней страницы с сохранением текущих фильтров query-string."""
+    args = {
+        k: v for k, v in request.args.to_dict().items() if k not in ("after", "before")
+    }
+    args.update({k: v for k, v in cursor.items() if v})
+    return url_for(endpoint, **args)
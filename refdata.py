@@ -0,0 +1,173 @@
+# C:\tourismops\refdata.py
+"""
+Справочники в памяти процесса: клиенты, поставщики, субагенты.
+
+По каждому справочнику держится словарь id → запись (namedtuple с
+полями справочника) и его версия из DirectoryVersion. Словари общие для
+всех запросов процесса и только читаются: списки журналов берут из них
+наименования контрагентов (в шаблонах — counterparty / ref_name) вместо
+JOIN или ленивой загрузки на каждую строку, импорты — коды (ids_by_code).
+
+Версия справочника растёт в той же транзакции, что и его правка
+(after_flush). После коммита свой процесс сбрасывает копию сразу
+(after_commit), остальные сверяют версии всех справочников одним
+запросом не чаще раза в CHECK_SECONDS. Массовые правки мимо ORM
+вызывают bump() сами.
+"""
+
+import threading
+from collections import namedtuple
+from time import monotonic
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from incremental import upsert_add
+from models import Client, DirectoryVersion, Subagent, Supplier
+
+KINDS = {"client": Client, "supplier": Supplier, "subagent": Subagent}
+_KIND_BY_MODEL = {model: kind for kind, model in KINDS.items()}
+
+# поля записи справочника (кроме id)
+FIELDS = {
+    "client": ("code", "name", "account_type", "account_status", "status"),
+    "supplier": ("code", "name", "phone"),
+    "subagent": ("code", "name"),
+}
+RECORDS = {
+    kind: namedtuple(f"{kind.capitalize()}Ref", ("id",) + fields)
+    for kind, fields in FIELDS.items()
+}
+
+# как часто сверять версии справочников с БД
+CHECK_SECONDS = 2.0
+
+
+class Directory:
+    """Снимок справочника: версия, id → запись, код → id."""
+
+    def __init__(self, kind: str, version: int, records: dict):
+        self.kind = kind
+        self.version = version
+        self.records = records
+        self.by_code = {r.code: r.id for r in records.values()}
+
+
+class _Cache:
+    def __init__(self):
+        self.directories = {}  # вид → Directory
+        self.versions = {}  # вид → версия на момент последней сверки
+        self.checked = 0.0
+        self.lock = threading.Lock()
+
+    def _versions(self) -> dict:
+        t = DirectoryVersion.__table__
+        return dict(db.session.execute(select(t.c.name, t.c.version)).all())
+
+    def _load(self, kind: str, version: int) -> Directory:
+        model = KINDS[kind]
+        record = RECORDS[kind]
+        columns = [model.id] + [getattr(model, f) for f in FIELDS[kind]]
+        records = {row[0]: record(*row) for row in db.session.execute(select(*columns))}
+        return Directory(kind, version, records)
+
+    def get(self, kind: str, fresh: bool = False) -> Directory:
+        now = monotonic()
+        if fresh or now - self.checked >= CHECK_SECONDS:
+            self.versions = self._versions()
+            self.checked = now
+        version = self.versions.get(kind, 0)
+        d = self.directories.get(kind)
+        if d is not None and d.version == version:
+            return d
+        with self.lock:
+            d = self.directories.get(kind)
+            if d is None or d.version != version:
+                d = self.directories[kind] = self._load(kind, version)
+        return d
+
+    def drop(self, kinds):
+        for kind in kinds:
+            self.directories.pop(kind, None)
+        self.checked = 0.0  # версия уже другая — перечитать при следующем обращении
+
+
+_cache = _Cache()
+
+
+def directory(kind: str, fresh: bool = False) -> Directory:
+    """
+    Справочник kind. fresh=True — сверить версию с БД сейчас, не дожидаясь
+    CHECK_SECONDS (импорты, которым нужны только что заведённые коды).
+    """
+    return _cache.get(kind, fresh)
+
+
+def records(kind: str) -> dict:
+    """id → запись справочника kind (не изменять)."""
+    return directory(kind).records
+
+
+def record(kind: str, pk):
+    return directory(kind).records.get(pk) if pk is not None else None
+
+
+def ref_name(kind: str, pk, default: str = "") -> str:
+    r = record(kind, pk)
+    return r.name if r is not None else default
+
+
+def ids_by_code(kind: str, fresh: bool = True) -> dict:
+    """Код → id справочника kind (не изменять)."""
+    return directory(kind, fresh).by_code
+
+
+def counterparty(row) -> str:
+    """Наименование клиента строки журнала, а без клиента — поставщика."""
+    client_id = getattr(row, "client_id", None)
+    if client_id is not None:
+        return ref_name("client", client_id, f"#{client_id}")
+    supplier_id = getattr(row, "supplier_id", None)
+    if supplier_id is not None:
+        return ref_name("supplier", supplier_id, f"#{supplier_id}")
+    return ""
+
+
+def clear_cache(*kinds):
+    _cache.drop(kinds or list(_cache.directories))
+
+
+# ---- версия справочника ----------------------------------------------------
+def bump(conn, kind: str):
+    """Увеличить версию справочника kind (массовые правки мимо ORM)."""
+    upsert_add(conn, DirectoryVersion.__table__, {"name": kind}, {"version": 1})
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_directory_versions(session, flush_context):
+    kinds = set()
+    for obj in list(session.new) + list(session.deleted):
+        if type(obj) in _KIND_BY_MODEL:
+            kinds.add(_KIND_BY_MODEL[type(obj)])
+    for obj in session.dirty:
+        if type(obj) in _KIND_BY_MODEL and session.is_modified(obj):
+            kinds.add(_KIND_BY_MODEL[type(obj)])
+    if not kinds:
+        return
+    conn = session.connection()
+    for kind in sorted(kinds):
+        bump(conn, kind)
+    session.info.setdefault("directory_dirty", set()).update(kinds)
+
+
+@event.listens_for(Session, "after_commit")
+def _drop_local_directories(session):
+    kinds = session.info.pop("directory_dirty", None)
+    if kinds:
+        clear_cache(*kinds)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_directory_changes(session):
+    session.info.pop("directory_dirty", None)
@@ -0,0 +1,155 @@
+# C:\tourismops\schedule.py
+"""
+Расписание туров: выборки по периодам и загрузка направлений по дням.
+
+Период тура — [start_date, end_date]; без end_date тур однодневный.
+«Тур идёт в окне [from, to]» = начался в окне ИЛИ начался раньше и не
+закончился к from. Первая ветка — диапазон по индексу (start_date,
+end_date), вторая — по (end_date, start_date), так что СУБД читает
+только подходящий участок индекса, а не всю историю туров.
+
+Загрузка (TourOccupancy) — число идущих туров на день по направлению.
+Ведётся событиями сессии (incremental.FlushTracker): before_flush
+запоминает прежние периоды из БД, after_flush сдвигает счётчики.
+"""
+
+from collections import defaultdict
+from datetime import date, timedelta
+
+from sqlalchemy import and_, insert, or_, select
+
+from extensions import db
+from incremental import FlushTracker, upsert_add
+from models import ExternalTour, InternalTour, TourOccupancy
+
+KINDS = {"internal": InternalTour, "external": ExternalTour}
+_KIND_BY_MODEL = {model: kind for kind, model in KINDS.items()}
+_FIELDS = ("start_date", "end_date", "direction")
+
+# дольше этого срока тур по дням не раскладывается (ошибочные даты)
+MAX_SPAN_DAYS = 366
+# самое длинное окно сетки загрузки
+MAX_WINDOW_DAYS = 92
+
+
+def week_of(day: date):
+    """(понедельник, воскресенье) недели, в которую попадает day."""
+    monday = day - timedelta(days=day.weekday())
+    return monday, monday + timedelta(days=6)
+
+
+def tour_days(start: date | None, end: date | None) -> list:
+    """Дни тура для загрузки (без start_date — ни одного)."""
+    if start is None:
+        return []
+    if end is None or end < start:
+        end = start
+    span = min((end - start).days + 1, MAX_SPAN_DAYS)
+    return [start + timedelta(days=i) for i in range(span)]
+
+
+def _direction(value) -> str:
+    return (value or "").strip()[:255]
+
+
+# ---- выборки по периодам ---------------------------------------------------
+def active_between(kind: str, date_from: date, date_to: date):
+    """Query туров вида kind, идущих хотя бы один день в [date_from, date_to]."""
+    model = KINDS[kind]
+    return model.query.filter(
+        or_(
+            and_(model.start_date >= date_from, model.start_date <= date_to),
+            and_(model.end_date >= date_from, model.start_date < date_from),
+        )
+    )
+
+
+def departing_between(kind: str, date_from: date, date_to: date):
+    """Query туров вида kind с началом в [date_from, date_to]."""
+    model = KINDS[kind]
+    return model.query.filter(
+        model.start_date >= date_from, model.start_date <= date_to
+    )
+
+
+def departing_this_week(kind: str, today: date | None = None):
+    return departing_between(kind, *week_of(today or date.today()))
+
+
+def occupancy(kind: str, date_from: date, date_to: date, direction=None) -> dict:
+    """
+    {направление: {день: туров}} по своду TourOccupancy; окно ограничено
+    MAX_WINDOW_DAYS от date_from.
+    """
+    date_to = min(date_to, date_from + timedelta(days=MAX_WINDOW_DAYS - 1))
+    t = TourOccupancy.__table__
+    q = select(t.c.direction, t.c.day, t.c.tours).where(
+        t.c.kind == kind,
+        t.c.day >= date_from,
+        t.c.day <= date_to,
+        t.c.tours > 0,
+    )
+    if direction is not None:
+        q = q.where(t.c.direction == _direction(direction))
+    grid = defaultdict(dict)
+    for row_direction, day, tours in db.session.execute(q.order_by(t.c.direction)):
+        grid[row_direction][day] = tours
+    return dict(grid)
+
+
+# ---- инкрементальное ведение загрузки --------------------------------------
+def add_tour(deltas: dict, kind: str, values: dict, sign: int = 1):
+    direction = _direction(values.get("direction"))
+    for day in tour_days(values.get("start_date"), values.get("end_date")):
+        deltas[(kind, day, direction)] += sign
+
+
+def apply_deltas(conn, deltas: dict):
+    """deltas: {(вид, день, направление): изменение числа туров}"""
+    t = TourOccupancy.__table__
+    for (kind, day, direction), delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        key = {"kind": kind, "day": day, "direction": direction}
+        upsert_add(conn, t, key, {"tours": delta})
+
+
+def _add(deltas, model, values, sign):
+    add_tour(deltas, _KIND_BY_MODEL[model], values, sign)
+
+
+FlushTracker(
+    "tour",
+    {model: _FIELDS for model in KINDS.values()},
+    _add,
+    apply_deltas,
+    new=lambda: defaultdict(int),
+)
+
+
+# ---- пересборка ------------------------------------------------------------
+def rebuild(kind: str | None = None) -> int:
+    """
+    Пересчитать загрузку по турам вида kind (или всех видов).
+    Возвращает число записанных строк.
+    """
+    t = TourOccupancy.__table__
+    kinds = [kind] if kind else list(KINDS)
+
+    counts = defaultdict(int)
+    for k in kinds:
+        src = KINDS[k].__table__
+        q = select(*(src.c[f] for f in _FIELDS)).where(src.c.start_date.isnot(None))
+        for row in db.session.execute(q.execution_options(yield_per=5000)):
+            add_tour(counts, k, row._mapping)
+
+    db.session.execute(t.delete().where(t.c.kind.in_(kinds)))
+    rows = [
+        {"kind": k, "day": day, "direction": direction, "tours": tours}
+        for (k, day, direction), tours in sorted(counts.items())
+        if tours
+    ]
+    for i in range(0, len(rows), 1000):
+        db.session.execute(insert(t), rows[i : i + 1000])
+    db.session.commit()
+    return len(rows)
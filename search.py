@@ -0,0 +1,265 @@
+# C:\tourismops\search.py
+"""
+Полнотекстовый поиск по свободным полям всех журналов.
+
+MySQL: FULLTEXT-индексы прямо на колонках (их ведёт сама СУБД),
+запрос — MATCH … AGAINST по каждой таблице, UNION ALL, сортировка по
+релевантности.
+
+SQLite (локально): одна виртуальная таблица FTS5 search_fts. rowid
+кодирует (вид, id) как id * 8 + номер вида, поэтому обновление строки —
+это удаление/вставка по rowid. Синхронизация — событием after_flush для
+ORM-изменений; массовые загрузки (executemany мимо ORM) дописывают индекс
+через bulk_mark / index_since.
+"""
+
+import re
+from dataclasses import dataclass
+
+from sqlalchemy import DDL, event, func, literal, select, text, union_all
+from sqlalchemy.dialects.mysql import match as mysql_match
+from sqlalchemy.orm import Session
+
+from extensions import db
+from models import BankOperation, CashOperation, ExternalTour, InternalTour, TicketSale
+
+FTS_TABLE = "search_fts"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# вид → (номер для rowid, модель, индексируемая колонка)
+SOURCES = {
+    "cash": (1, CashOperation, CashOperation.description),
+    "bank": (2, BankOperation, BankOperation.description),
+    "ticket": (3, TicketSale, TicketSale.route),
+    "internal_tour": (4, InternalTour, InternalTour.notes),
+    "external_tour": (5, ExternalTour, ExternalTour.notes),
+}
+_KIND_BY_NO = {no: kind for kind, (no, _m, _c) in SOURCES.items()}
+_KIND_BY_MODEL = {model: kind for kind, (_n, model, _c) in SOURCES.items()}
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+_FTS_DDL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "body, user_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')"
+)
+
+event.listen(db.metadata, "after_create", DDL(_FTS_DDL).execute_if(dialect="sqlite"))
+event.listen(
+    db.metadata,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {FTS_TABLE}").execute_if(dialect="sqlite"),
+)
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    id: int
+    score: float
+    snippet: str
+    created_at: object = None
+
+
+def _rowid(kind: str, item_id: int) -> int:
+    return item_id * 8 + SOURCES[kind][0]
+
+
+def _uses_fts(conn) -> bool:
+    """
+    SQLite с созданной таблицей search_fts. Кэшируется на движок только
+    положительный ответ: таблица может появиться позже (create_all после
+    первого запроса), отказ проверяется заново.
+    """
+    if conn.dialect.name != "sqlite":
+        return False
+    cache = conn.engine.__dict__.setdefault("_search_fts", {})
+    if not cache.get("ready"):
+        cache["ready"] = bool(
+            conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = :n"), {"n": FTS_TABLE}
+            ).first()
+        )
+    return cache["ready"]
+
+
+def _indexed_changed(obj) -> bool:
+    """Менялись ли у изменённого объекта поля, попадающие в индекс."""
+    attrs = db.inspect(obj).attrs
+    body = SOURCES[_KIND_BY_MODEL[type(obj)]][2].key
+    return attrs[body].history.has_changes() or attrs.user_id.history.has_changes()
+
+
+# ---- синхронизация индекса (SQLite) ----------------------------------------
+@event.listens_for(Session, "after_flush")
+def _sync_search_index(session, flush_context):
+    changed = [
+        obj
+        for obj in list(session.new) + list(session.deleted)
+        if type(obj) in _KIND_BY_MODEL
+    ]
+    # правка суммы или даты индекс не трогает
+    changed += [
+        obj
+        for obj in session.dirty
+        if type(obj) in _KIND_BY_MODEL and _indexed_changed(obj)
+    ]
+    if not changed:
+        return
+    conn = session.connection()
+    if not _uses_fts(conn):
+        return
+
+    drop, put = [], []
+    for obj in changed:
+        kind = _KIND_BY_MODEL[type(obj)]
+        # у новых объектов identity ещё нет, но id уже присвоен
+        key = db.inspect(obj).identity
+        item_id = key[0] if key else obj.id
+        if item_id is None:
+            continue
+        rowid = _rowid(kind, item_id)
+        if obj not in session.new:
+            drop.append({"r": rowid})
+        if obj not in session.deleted:
+            body = getattr(obj, SOURCES[kind][2].key)
+            if body:
+                put.append({"r": rowid, "b": body, "u": obj.user_id})
+
+    if drop:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid = :r"), drop)
+    if put:
+        conn.execute(
+            text(f"INSERT INTO {FTS_TABLE}(rowid, body, user_id) VALUES (:r, :b, :u)"),
+            put,
+        )
+
+
+def bulk_mark(conn, kind: str):
+    """Максимальный id вида перед массовой вставкой (None — индекс не нужен)."""
+    if not _uses_fts(conn):
+        return None
+    model = SOURCES[kind][1]
+    return conn.execute(select(func.coalesce(func.max(model.id), 0))).scalar()
+
+
+def index_since(conn, kind: str, after_id):
+    """Проиндексировать строки вида с id > after_id (после bulk_mark)."""
+    if after_id is None:
+        return
+    _index(conn, kind, after_id)
+
+
+def _index(conn, kind: str, after_id: int = 0):
+    no, model, col = SOURCES[kind]
+    t = model.__table__
+    conn.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE}(rowid, body, user_id) "
+            f"SELECT id * 8 + {no}, {col.key}, user_id FROM {t.name} "
+            f"WHERE id > :after AND {col.key} IS NOT NULL AND {col.key} != ''"
+        ),
+        {"after": after_id},
+    )
+
+
+def rebuild() -> None:
+    """Пересобрать индекс FTS5 целиком (SQLite; в MySQL индексы ведёт СУБД)."""
+    conn = db.session.connection()
+    if conn.dialect.name != "sqlite":
+        return
+    conn.execute(text(f"DROP TABLE IF EXISTS {FTS_TABLE}"))
+    conn.execute(text(_FTS_DDL))
+    conn.engine.__dict__.pop("_search_fts", None)
+    for kind in SOURCES:
+        _index(conn, kind)
+    db.session.commit()
+
+
+# ---- поиск -----------------------------------------------------------------
+def _terms(query: str) -> list:
+    return _WORD.findall(query.lower())[:10]
+
+
+def _search_fts(conn, terms, kinds, user_ids, limit):
+    match = " ".join(f'"{t}"*' for t in terms)
+    kind_nos = [SOURCES[k][0] for k in kinds]
+    sql = (
+        f"SELECT rowid, -bm25({FTS_TABLE}) AS score, "
+        f"snippet({FTS_TABLE}, 0, '', '', '…', 16) AS snip, user_id "
+        f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :m "
+        f"AND (rowid % 8) IN ({', '.join(str(n) for n in kind_nos)}) "
+        "ORDER BY rank"
+    )
+    hits = []
+    for rowid, score, snip, user_id in conn.execute(text(sql), {"m": match}):
+        kind = _KIND_BY_NO[rowid % 8]
+        allowed = user_ids.get(kind)
+        if allowed is not None and user_id != allowed:
+            continue
+        hits.append(SearchHit(kind, rowid // 8, float(score), snip))
+        if len(hits) >= limit:
+            break
+    return hits
+
+
+def _search_mysql(conn, terms, kinds, user_ids, limit):
+    against = " ".join(f"+{t}*" for t in terms)
+    parts = []
+    for kind in kinds:
+        _no, model, col = SOURCES[kind]
+        match = mysql_match(col, against=against).in_boolean_mode()
+        q = select(
+            literal(kind).label("kind"),
+            model.id.label("id"),
+            match.label("score"),
+            func.substr(col, 1, 200).label("snip"),
+        ).where(match > 0)
+        allowed = user_ids.get(kind)
+        if allowed is not None:
+            q = q.where(model.user_id == allowed)
+        parts.append(q)
+    stmt = union_all(*parts).order_by(text("score DESC")).limit(limit)
+    return [
+        SearchHit(kind, item_id, float(score), snip or "")
+        for kind, item_id, score, snip in conn.execute(stmt)
+    ]
+
+
+def search(query: str, kinds=None, user_ids=None, limit: int = DEFAULT_LIMIT):
+    """
+    Ранжированные совпадения по всем видам (или по kinds).
+    user_ids: {вид: user_id} — ограничить вид записями одного пользователя.
+    """
+    terms = _terms(query or "")
+    kinds = [k for k in (kinds or SOURCES) if k in SOURCES]
+    if not terms or not kinds:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+    user_ids = user_ids or {}
+
+    conn = db.session.connection()
+    if conn.dialect.name == "mysql":
+        hits = _search_mysql(conn, terms, kinds, user_ids, limit)
+    elif _uses_fts(conn):
+        hits = _search_fts(conn, terms, kinds, user_ids, limit)
+    else:
+        return []
+
+    # даты записей — по одному запросу на вид
+    by_kind = {}
+    for hit in hits:
+        by_kind.setdefault(hit.kind, []).append(hit)
+    for kind, items in by_kind.items():
+        model = SOURCES[kind][1]
+        dates = dict(
+            conn.execute(
+                select(model.id, model.created_at).where(
+                    model.id.in_([h.id for h in items])
+                )
+            ).all()
+        )
+        for hit in items:
+            hit.created_at = dates.get(hit.id)
+    return hits
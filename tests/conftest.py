@@ -0,0 +1,68 @@
+# C:\tourismops\tests\conftest.py
+"""
+Общие фикстуры: приложение на временной SQLite, чистая схема на каждый
+тест, пользователи и клиент с входом.
+
+Переменные окружения задаются до импорта app — экземпляр приложения
+создаётся при импорте модуля.
+"""
+
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="tourismops-tests-")
+os.environ["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + os.path.join(_TMP, "test.db")
+os.environ["AUDIT_ASYNC"] = "0"
+os.environ["JOB_WORKERS"] = "0"
+os.environ["JOB_DIR"] = os.path.join(_TMP, "jobs")
+
+import pytest  # noqa: E402
+
+import autocomplete  # noqa: E402
+import fx  # noqa: E402
+import refdata  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from blueprints.core import dashboard  # noqa: E402
+from extensions import db  # noqa: E402
+from jobs import job_runner  # noqa: E402
+from models import User  # noqa: E402
+
+PASSWORD = "secret123"
+
+
+@pytest.fixture
+def app():
+    flask_app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    job_runner.inline = True
+    with flask_app.app_context():
+        db.create_all()
+        for cache in (refdata, autocomplete, dashboard, fx):
+            cache.clear_cache()
+        yield flask_app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def make_user(app):
+    def make(username="admin", role="admin"):
+        user = User(username=username, role=role)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        return user
+
+    return make
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def client(app, user):
+    """Тестовый клиент, вошедший под user."""
+    c = app.test_client()
+    c.post("/login", data={"username": user.username, "password": PASSWORD})
+    return c
@@ -0,0 +1,125 @@
+"""
+Правки журналов помечают клиента устаревшим в кэше дебиторки; отчёт из
+кэша после пересчёта устаревших совпадает со свежим расчётом.
+"""
+
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from blueprints.analytics import aging
+from blueprints.bank import statements
+from blueprints.cash import importer
+from extensions import db
+from models import ArAgingLine, CashOperation, Client, TicketSale
+
+AS_OF = date(2026, 3, 1)
+FIELDS = ("client_id", "currency", "sales", "paid") + aging.BUCKETS + ("advance",)
+
+
+@pytest.fixture
+def customer(app):
+    client = Client(code="00001", name="ООО Тест", account_type="corporate")
+    db.session.add(client)
+    db.session.commit()
+    return client
+
+
+@pytest.fixture
+def ledger(user, customer):
+    ticket = TicketSale(
+        user_id=user.id,
+        client_id=customer.id,
+        ticket_number="001",
+        sale_date=date(2026, 1, 10),
+        total_supplier=Decimal("300"),
+        currency="USD",
+    )
+    payment = CashOperation(
+        user_id=user.id,
+        client_id=customer.id,
+        op_type="income",
+        amount=Decimal("100"),
+        currency="USD",
+        created_at=datetime(2026, 1, 15, 12, 0),
+    )
+    db.session.add_all([ticket, payment])
+    db.session.commit()
+    aging.report(AS_OF)
+    return ticket, payment
+
+
+def _stale(client_id) -> bool:
+    return (
+        db.session.execute(
+            select(ArAgingLine.id).where(
+                ArAgingLine.as_of == AS_OF,
+                ArAgingLine.client_id == client_id,
+                ArAgingLine.stale.is_(True),
+            )
+        ).first()
+        is not None
+    )
+
+
+def assert_report_fresh():
+    cached = [
+        {k: getattr(line, k) for k in FIELDS} for line in aging.report(AS_OF).lines
+    ]
+    assert cached == aging.compute(AS_OF)
+
+
+def test_orm_changes_invalidate(customer, ledger):
+    ticket, payment = ledger
+    assert not _stale(customer.id)
+
+    payment.amount = Decimal("250")
+    db.session.commit()
+    assert _stale(customer.id)
+    assert_report_fresh()
+
+    db.session.delete(ticket)
+    db.session.commit()
+    assert _stale(customer.id)
+    assert_report_fresh()
+
+
+def test_change_after_as_of_keeps_snapshot(customer, ledger):
+    _ticket, payment = ledger
+    payment.created_at = datetime(2026, 4, 1)
+    db.session.commit()
+    # прежняя дата платежа — до AS_OF, снимок всё равно устарел
+    assert _stale(customer.id)
+    assert_report_fresh()
+
+    payment.amount = Decimal("90")
+    db.session.commit()
+    assert not _stale(customer.id)
+
+
+def test_imports_invalidate(user, customer, ledger):
+    result = importer.import_file(
+        io.BytesIO(
+            b"date,type,amount,currency,client\n2026-02-01,income,50,USD,00001\n"
+        ),
+        "cash.csv",
+        user.id,
+    )
+    assert result.committed
+    assert _stale(customer.id)
+    assert_report_fresh()
+
+    result = statements.import_file(
+        io.BytesIO(
+            b"date;doc_number;type;amount;currency;client\n"
+            b"2026-02-10;77;incoming;40;USD;00001\n"
+        ),
+        "bank.csv",
+        user.id,
+    )
+    assert result.inserted == 1
+    assert _stale(customer.id)
+    assert_report_fresh()
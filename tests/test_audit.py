@@ -0,0 +1,68 @@
+"""Журнал аудита: фоновая пакетная запись и запасной построчный путь."""
+
+import logging
+import threading
+from datetime import datetime
+
+from audit import AuditSink
+from models import AuditLog
+
+
+def _entry(action, user_id=None):
+    return {
+        "user_id": user_id,
+        "action": action,
+        "details": None,
+        "timestamp": datetime.utcnow(),
+    }
+
+
+def test_async_batches(app, user, monkeypatch):
+    # conftest выключает очередь (AUDIT_ASYNC=0), здесь она включена;
+    # init_app регистрирует новый sink в app.extensions — вернём прежний
+    monkeypatch.setitem(app.extensions, "audit_sink", app.extensions["audit_sink"])
+    monkeypatch.setitem(app.config, "AUDIT_ASYNC", True)
+    monkeypatch.setitem(app.config, "AUDIT_BATCH_SIZE", 3)
+    monkeypatch.setitem(app.config, "AUDIT_FLUSH_INTERVAL", 0.05)
+    monkeypatch.setattr(app, "testing", False)
+    sink = AuditSink(app)
+    monkeypatch.setattr(app, "testing", True)
+    assert sink.enabled
+
+    writes = []
+    write = sink._write
+
+    def spy(batch):
+        writes.append((threading.current_thread().name, len(batch)))
+        write(batch)
+
+    monkeypatch.setattr(sink, "_write", spy)
+
+    for n in range(7):
+        sink.log(f"test:{n}", user_id=user.id)
+    sink.shutdown()
+
+    assert not sink._thread.is_alive()
+    assert sorted(a for (a,) in AuditLog.query.with_entities(AuditLog.action)) == [
+        f"test:{n}" for n in range(7)
+    ]
+    # пишет фоновый поток, пачками не больше AUDIT_BATCH_SIZE
+    assert writes and {name for name, _n in writes} == {"audit-sink"}
+    assert max(n for _name, n in writes) <= 3
+    assert sum(n for _name, n in writes) == 7
+
+
+def test_failed_batch_falls_back_to_rows(app, user, caplog, monkeypatch):
+    monkeypatch.setitem(app.extensions, "audit_sink", app.extensions["audit_sink"])
+    sink = AuditSink(app)
+    batch = [_entry("ok:1", user.id), _entry(None), _entry("ok:2", user.id)]
+
+    with caplog.at_level(logging.WARNING):
+        sink._write(batch)
+
+    assert sorted(a for (a,) in AuditLog.query.with_entities(AuditLog.action)) == [
+        "ok:1",
+        "ok:2",
+    ]
+    lost = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert len(lost) == 1 and "строка потеряна" in lost[0].getMessage()
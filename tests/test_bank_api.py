@@ -0,0 +1,52 @@
+"""JSON API банка: ETag окна меняется при правке содержимого строки."""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from extensions import db
+from models import BankOperation
+
+URL = "/bank/api/operations"
+
+
+@pytest.fixture
+def operation(user):
+    item = BankOperation(
+        user_id=user.id,
+        op_type="incoming",
+        amount=Decimal("100"),
+        currency="USD",
+        value_date=date(2026, 3, 1),
+        description="оплата тура",
+    )
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def test_unchanged_window_not_modified(client, operation):
+    etag = client.get(URL).headers["ETag"]
+
+    resp = client.get(URL, headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [
+        ("amount", Decimal("150")),
+        ("description", "возврат"),
+        ("value_date", date(2026, 3, 2)),
+    ],
+)
+def test_row_edit_changes_etag(client, operation, field, value):
+    etag = client.get(URL).headers["ETag"]
+
+    setattr(operation, field, value)
+    db.session.commit()
+
+    resp = client.get(URL, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
@@ -0,0 +1,23 @@
+from decimal import Decimal
+
+from models import AuditLog, CashOperation
+
+
+def test_create_operation(client, user):
+    resp = client.post(
+        "/cash/",
+        data={
+            "type": "income",
+            "amount": "150.00",
+            "currency": "USD",
+            "description": "Оплата тура",
+        },
+    )
+
+    assert resp.status_code == 302
+    item = CashOperation.query.one()
+    assert item.op_type == "income"
+    assert item.amount == Decimal("150.00")
+    assert item.user_id == user.id
+    log = AuditLog.query.filter_by(action="cash:create").one()
+    assert log.details == f"id={item.id} income 150.00 USD"
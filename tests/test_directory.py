@@ -0,0 +1,57 @@
+"""Списки справочников: постраничный обход и ограниченный подсчёт строк."""
+
+import html
+import re
+
+import pytest
+
+from extensions import db
+from models import Supplier
+from pagination import capped_count
+
+NAMES = ["Альфа"] * 4 + ["Бета"] * 3 + ["Вега"] * 4
+
+
+@pytest.fixture
+def suppliers(app):
+    items = [
+        Supplier(code=f"S{n:03}", name=name) for n, name in enumerate(NAMES, start=1)
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _walk(client, url):
+    """Коды поставщиков со всех страниц, по ссылкам «Вперёд»."""
+    codes, pages = [], 0
+    while url:
+        body = client.get(url).get_data(as_text=True)
+        codes += re.findall(r'<td class="py-2">(S\d+)</td>', body)
+        pages += 1
+        nxt = re.search(r'href="([^"]+)">Вперёд', body)
+        url = html.unescape(nxt.group(1)) if nxt else None
+    return codes, pages
+
+
+@pytest.mark.parametrize("query", ["", "&q=S0"])
+def test_suppliers_pages_cover_every_row(client, suppliers, query):
+    codes, pages = _walk(client, f"/directory/suppliers?per_page=3{query}")
+
+    assert pages == 4
+    assert sorted(codes) == sorted(item.code for item in suppliers)
+    # порядок — по (name, id), дубли имён не теряются и не повторяются
+    expected = sorted(suppliers, key=lambda i: (i.name, i.id))
+    assert codes == [item.code for item in expected]
+
+
+def test_capped_count(suppliers):
+    query = Supplier.query.order_by(Supplier.name)
+
+    assert capped_count(query, Supplier.id, cap=5) == (5, False)
+    assert capped_count(query, Supplier.id, cap=len(NAMES)) == (len(NAMES), True)
+    assert capped_count(query, Supplier.id, cap=100) == (len(NAMES), True)
+    assert capped_count(query.filter(Supplier.name == "Бета"), Supplier.id) == (
+        3,
+        True,
+    )
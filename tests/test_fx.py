@@ -0,0 +1,122 @@
+"""Курсы валют: курс на дату, кэш курсов и загрузка CSV."""
+
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import update
+
+import fx
+from extensions import db
+from models import FxRate
+
+CSV = (
+    "Дата;Валюта;Курс;Номинал\n"
+    "02.03.2026;USD;12600;1\n"
+    "06.03.2026;USD;12700;1\n"
+    "02.03.2026;RUB;14000;100\n"
+)
+
+
+def _load(text):
+    return fx.load_csv(io.BytesIO(text.encode("utf-8")), source="test")
+
+
+@pytest.fixture
+def rates(app):
+    result = _load(CSV)
+    assert (result.inserted, result.errors) == (3, [])
+
+
+def test_rate_as_of(rates):
+    assert fx.rate("USD", "UZS", date(2026, 3, 2)) == Decimal("12600")
+    # между котировками — последняя не позже даты
+    assert fx.rate("USD", "UZS", date(2026, 3, 4)) == Decimal("12600")
+    assert fx.rate("USD", "UZS", date(2026, 3, 6)) == Decimal("12700")
+    assert fx.rate("USD", "UZS", date(2026, 3, 9)) == Decimal("12700")
+    # номинал 100 приводится к курсу за единицу
+    assert fx.rate("RUB", "UZS", date(2026, 3, 2)) == Decimal("140")
+
+
+def test_rate_before_first_quote(rates):
+    assert fx.rate("USD", "UZS", date(2026, 3, 1)) is None
+    assert fx.convert(100, "USD", "UZS", date(2026, 3, 1)) is None
+
+
+def test_convert_many(rates):
+    rows = [
+        {"amount": Decimal("2"), "currency": "usd", "day": date(2026, 3, 5)},
+        {"amount": Decimal("2"), "currency": "USD", "day": date(2026, 3, 1)},
+        {"amount": None, "currency": "USD", "day": date(2026, 3, 6)},
+        {"amount": Decimal("1400"), "currency": "RUB", "day": date(2026, 3, 6)},
+        {"amount": Decimal("5"), "currency": "UZS", "day": date(2026, 1, 1)},
+    ]
+
+    assert fx.convert_many(rows, "uzs") == [
+        (Decimal("25200.00"),),
+        (None,),
+        (None,),
+        (Decimal("196000.00"),),
+        (Decimal("5.00"),),
+    ]
+    # кросс-курс через UZS и обратная пара
+    assert fx.convert_many(rows[3:4], "USD") == [(Decimal("15.43"),)]
+    assert fx.convert_many(
+        [{"amount": 12700, "currency": "UZS"}], "USD", day=date(2026, 3, 6)
+    ) == [(Decimal("1.00"),)]
+
+
+def test_cache_reloads_on_fingerprint_change(rates, monkeypatch):
+    day = date(2026, 3, 6)
+    assert fx.rate("USD", "UZS", day) == Decimal("12700")
+
+    # правка мимо ORM (как из другого процесса): after_flush её не видит
+    db.session.execute(
+        update(FxRate.__table__)
+        .where(FxRate.day == day, FxRate.base == "USD")
+        .values(rate=Decimal("12800"), updated_at=datetime(2030, 1, 1))
+    )
+    db.session.commit()
+    # до следующей сверки — прежний курс из памяти
+    assert fx.rate("USD", "UZS", day) == Decimal("12700")
+
+    monkeypatch.setattr(fx, "CHECK_SECONDS", 0)
+    assert fx.rate("USD", "UZS", day) == Decimal("12800")
+
+
+def test_orm_write_drops_cache(rates):
+    day = date(2026, 3, 9)
+    assert fx.rate("USD", "UZS", day) == Decimal("12700")
+
+    db.session.add(FxRate(base="USD", quote="UZS", day=day, rate=Decimal("12750")))
+    db.session.commit()
+    assert fx.rate("USD", "UZS", day) == Decimal("12750")
+
+
+def test_load_csv_upsert_counts(rates):
+    again = _load(CSV)
+    assert (again.total, again.inserted, again.updated, again.unchanged) == (3, 0, 0, 3)
+
+    result = _load(
+        "date,currency,rate\n"
+        "2026-03-02,USD,12600\n"
+        "2026-03-06,USD,12750\n"
+        "2026-03-09,USD,12800\n"
+        "2026-03-10,XX,1\n"
+        "2026-03-10,EUR,-5\n"
+    )
+    assert (result.total, result.inserted, result.updated, result.unchanged) == (
+        5,
+        1,
+        1,
+        1,
+    )
+    assert [line for line, _msg in result.errors] == [5, 6]
+    assert fx.rate("USD", "UZS", date(2026, 3, 6)) == Decimal("12750")
+    assert db.session.query(FxRate).count() == 4
+
+
+def test_load_csv_requires_columns(app):
+    with pytest.raises(fx.FxError):
+        _load("day;amount\n2026-03-02;1\n")
@@ -0,0 +1,67 @@
+"""Проверочный прогон и пропуск ошибочных строк при загрузке кассы."""
+
+import io
+from decimal import Decimal
+
+from blueprints.cash import balances, importer
+from extensions import db
+from models import CashDailyBalance, CashOperation
+
+FILE = (
+    "Дата,Тип,Сумма,Валюта\n"
+    "2026-01-01,income,100,USD\n"
+    "2026-01-01,перевод,5,USD\n"
+    "2026-01-02,expense,30,USD\n"
+    "2026-01-02,income,-1,USD\n"
+)
+
+
+def _import(user, **kwargs):
+    return importer.import_file(
+        io.BytesIO(FILE.encode("utf-8")), "cash.csv", user.id, **kwargs
+    )
+
+
+def _balances():
+    return [
+        (b.day, b.income, b.expense, b.closing)
+        for b in CashDailyBalance.query.order_by(CashDailyBalance.day)
+    ]
+
+
+def test_errors_roll_back_whole_file(user):
+    result = _import(user)
+
+    assert not result.committed
+    assert (result.total, result.inserted, result.error_count) == (4, 0, 2)
+    assert [line for line, _message in result.errors] == [3, 5]
+    assert CashOperation.query.count() == 0
+    assert _balances() == []
+
+
+def test_skip_invalid(user):
+    result = _import(user, skip_invalid=True)
+
+    assert result.committed
+    assert (result.inserted, result.error_count) == (2, 2)
+    assert sorted(op.amount for op in CashOperation.query) == [
+        Decimal("30.00"),
+        Decimal("100.00"),
+    ]
+    incremental = _balances()
+    assert incremental[-1][3] == Decimal("70.00")
+    balances.rebuild()
+    assert _balances() == incremental
+
+
+def test_dry_run(user):
+    result = _import(user, dry_run=True, skip_invalid=True)
+
+    assert not result.committed
+    assert (result.inserted, result.error_count) == (2, 2)
+    assert CashOperation.query.count() == 0
+    assert _balances() == []
+    # откат проверочного прогона не мешает следующей настоящей загрузке
+    assert _import(user, skip_invalid=True).committed
+    db.session.expire_all()
+    assert CashOperation.query.count() == 2
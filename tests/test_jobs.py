@@ -0,0 +1,93 @@
+"""Фоновые задания: пульс, зависшие задания, удалённый владелец."""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import jobs
+from extensions import db
+from jobs import job_runner
+from models import CashOperation, Job, User
+
+
+def _job(user_id, **values):
+    job = Job(kind="cash_export", user_id=user_id, params="{}", **values)
+    db.session.add(job)
+    db.session.commit()
+    return job
+
+
+def _running(user, started, heartbeat=None):
+    return _job(user.id, status="running", started_at=started, heartbeat_at=heartbeat)
+
+
+def test_purge_uses_heartbeat(user):
+    now = datetime.utcnow()
+    alive = _running(user, now - timedelta(hours=6), now - timedelta(minutes=1))
+    dead = _running(user, now - timedelta(hours=6), now - timedelta(hours=1))
+    legacy = _running(user, now - timedelta(hours=6))
+
+    job_runner.purge()
+
+    db.session.expire_all()
+    assert alive.status == "running"
+    assert (dead.status, dead.message) == ("failed", "Прервано")
+    assert legacy.status == "failed"
+
+
+def test_finish_keeps_purged_status(user):
+    now = datetime.utcnow()
+    job = _running(user, now - timedelta(hours=6), now - timedelta(hours=1))
+    job_runner.purge()
+
+    assert not job_runner._finish(job.id, status="done", progress=100)
+    db.session.expire_all()
+    assert job.status == "failed"
+
+
+def test_deleted_owner_fails_job(make_user):
+    owner = make_user("cashier", role="cashier")
+    job = _job(owner.id, status="queued")
+    db.session.delete(db.session.get(User, owner.id))
+    db.session.commit()
+
+    job_runner.execute(job.id)
+
+    db.session.expire_all()
+    assert job.status == "failed"
+    assert job.message == "Пользователь, поставивший задание, удалён"
+
+
+def test_export_job_reports_heartbeat(user, monkeypatch):
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 0)
+    db.session.add_all(
+        CashOperation(user_id=user.id, op_type="income", amount=n, currency="USD")
+        for n in (1, 2)
+    )
+    db.session.commit()
+
+    # что записал каждый вызов progress(): итог задания их затирает
+    reports = []
+    report = jobs.JobContext.progress
+
+    def spy(ctx, *args, **kwargs):
+        report(ctx, *args, **kwargs)
+        with db.engine.connect() as conn:
+            reports.append(
+                conn.execute(
+                    select(Job.progress, Job.message, Job.heartbeat_at).where(
+                        Job.id == ctx.job_id
+                    )
+                ).one()
+            )
+
+    monkeypatch.setattr(jobs.JobContext, "progress", spy)
+
+    job = job_runner.submit("cash_export", user.id)
+
+    assert job.status == "done"
+    # с нулевым интервалом пишется каждый кусок CSV, последний — все строки
+    assert len(reports) > 1
+    assert tuple(reports[-1][:2]) == (99, "2 из 2 строк")
+    assert all(hb > job.started_at for *_pm, hb in reports)
+    assert job.heartbeat_at > job.started_at
@@ -0,0 +1,14 @@
+"""Страница заказов туров: заголовок и подключение автодополнения."""
+
+import re
+
+
+def test_orders_page_renders(client):
+    resp = client.get("/orders")
+
+    assert resp.status_code == 200
+    html = resp.get_data(as_text=True)
+    title = re.search(r"<title>(.*?)</title>", html, re.S).group(1)
+    assert title.strip() == "Заказы туров"
+    # скрипт автодополнения подключён один раз — в теле страницы
+    assert html.count("querySelectorAll('input[data-autocomplete]')") == 1
@@ -0,0 +1,125 @@
+"""Keyset-пагинация: обход по равным ключам, битые курсоры, per_page."""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from extensions import db
+from models import CashOperation
+from pagination import (
+    DEFAULT_PER_PAGE,
+    MAX_PER_PAGE,
+    decode_cursor,
+    encode_cursor,
+    keyset_paginate,
+    per_page_arg,
+)
+
+STAMP = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def operations(user):
+    # семь строк, из них пять — с одинаковым created_at
+    stamps = [datetime(2026, 3, 2)] + [STAMP] * 5 + [datetime(2026, 2, 28)]
+    items = [
+        CashOperation(
+            user_id=user.id,
+            op_type="income",
+            amount=Decimal("1"),
+            currency="USD",
+            created_at=stamp,
+        )
+        for stamp in stamps
+    ]
+    db.session.add_all(items)
+    db.session.commit()
+    return items
+
+
+def _page(**kwargs):
+    return keyset_paginate(
+        CashOperation.query, CashOperation.created_at, CashOperation.id, **kwargs
+    )
+
+
+def _ids(page):
+    return [item.id for item in page.items]
+
+
+def test_forward_and_back_across_equal_keys(operations):
+    expected = [
+        item.id
+        for item in sorted(operations, key=lambda i: (i.created_at, i.id), reverse=True)
+    ]
+
+    pages, page = [], _page(per_page=2)
+    while True:
+        pages.append(page)
+        if not page.has_next:
+            break
+        page = _page(after=page.next_cursor, per_page=2)
+
+    assert [i for p in pages for i in _ids(p)] == expected
+    assert not pages[0].has_prev and all(p.has_prev for p in pages[1:])
+
+    # назад от последней страницы — те же страницы в обратном порядке
+    for prev in reversed(pages[:-1]):
+        page = _page(before=page.prev_cursor, per_page=2)
+        assert _ids(page) == _ids(prev)
+        assert page.has_next
+    assert not page.has_prev
+
+
+def test_ascending_order(operations):
+    page = _page(per_page=3, descending=False)
+    page = _page(after=page.next_cursor, per_page=3, descending=False)
+
+    rows = sorted(operations, key=lambda i: (i.created_at, i.id))
+    assert _ids(page) == [item.id for item in rows[3:6]]
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(STAMP, 42)
+    assert decode_cursor(cursor, CashOperation.created_at) == (STAMP, 42)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "не-курсор",
+        "!!!",
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        base64.urlsafe_b64encode(json.dumps([1, 2, 3]).encode()).decode(),
+        base64.urlsafe_b64encode(json.dumps(["вчера", 5]).encode()).decode(),
+        base64.urlsafe_b64encode(
+            json.dumps([STAMP.isoformat(), "x"]).encode()
+        ).decode(),
+        base64.urlsafe_b64encode(json.dumps(7).encode()).decode(),
+    ],
+)
+def test_invalid_cursor_starts_from_first_page(operations, cursor):
+    assert decode_cursor(cursor, CashOperation.created_at) is None
+
+    page = _page(after=cursor, per_page=2)
+    assert _ids(page) == _ids(_page(per_page=2))
+    assert not page.has_prev
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("", DEFAULT_PER_PAGE),
+        ("?per_page=10", 10),
+        ("?per_page=0", DEFAULT_PER_PAGE),
+        ("?per_page=-5", 1),
+        ("?per_page=abc", DEFAULT_PER_PAGE),
+        (f"?per_page={MAX_PER_PAGE * 10}", MAX_PER_PAGE),
+    ],
+)
+def test_per_page_arg_clamp(app, query, expected):
+    with app.test_request_context(f"/{query}"):
+        assert per_page_arg() == expected
@@ -0,0 +1,206 @@
+"""
+Инкрементальные своды совпадают с полной пересборкой (rebuild) после
+вставки, правки и удаления строк журналов через ORM и массовых загрузок.
+"""
+
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+import schedule
+from blueprints.cash import balances, importer
+from blueprints.reports import sales
+from blueprints.tickets import bsp, rollups
+from extensions import db
+from models import (
+    CashDailyBalance,
+    CashOperation,
+    ExternalTour,
+    InternalTour,
+    SalesRollup,
+    TicketSale,
+    TicketSaleMonthly,
+    TourOccupancy,
+)
+
+
+def _rows(model, *measures):
+    """Строки свода без id; строки с нулевыми оборотами rebuild не пишет."""
+    t = model.__table__
+    rows = db.session.execute(select(*(c for c in t.c if c.name != "id")))
+    return sorted(tuple(r) for r in rows if any(r._mapping[m] for m in measures))
+
+
+def assert_matches_rebuild(model, rebuild, *measures):
+    incremental = _rows(model, *measures)
+    assert incremental
+    rebuild()
+    assert incremental == _rows(model, *measures)
+
+
+def _csv(text: str):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def check_balances():
+    assert_matches_rebuild(CashDailyBalance, balances.rebuild, "income", "expense")
+
+
+def check_tickets():
+    assert_matches_rebuild(TicketSaleMonthly, rollups.rebuild, "tickets")
+
+
+def check_sales():
+    assert_matches_rebuild(
+        SalesRollup,
+        lambda: sales.rebuild(date(2020, 1, 1), date(2030, 12, 31)),
+        "orders",
+    )
+
+
+def check_occupancy():
+    assert_matches_rebuild(TourOccupancy, schedule.rebuild, "tours")
+
+
+# ---- касса -----------------------------------------------------------------
+def _cash(user, day, op_type, amount, currency="USD"):
+    return CashOperation(
+        user_id=user.id,
+        op_type=op_type,
+        amount=Decimal(amount),
+        currency=currency,
+        created_at=datetime.combine(day, datetime.min.time()),
+    )
+
+
+def test_cash_balances_orm(user):
+    ops = [
+        _cash(user, date(2026, 1, 1), "income", "100"),
+        _cash(user, date(2026, 1, 2), "expense", "30"),
+        _cash(user, date(2026, 1, 3), "income", "12.50", "UZS"),
+        _cash(user, date(2026, 1, 5), "income", "7"),
+    ]
+    db.session.add_all(ops)
+    db.session.commit()
+
+    # правка просроченного после commit объекта: сумма, тип и день
+    ops[0].amount = Decimal("80")
+    ops[1].op_type = "income"
+    ops[2].created_at = datetime(2025, 12, 31, 10, 0)
+    db.session.commit()
+    db.session.delete(ops[3])
+    db.session.add(_cash(user, date(2026, 1, 2), "expense", "5"))
+    db.session.commit()
+
+    check_balances()
+
+
+def test_cash_balances_import(user):
+    db.session.add(_cash(user, date(2026, 1, 2), "income", "10"))
+    db.session.commit()
+
+    result = importer.import_file(
+        _csv(
+            "Дата,Тип,Сумма,Валюта\n"
+            "2026-01-01,income,100,USD\n"
+            "2026-01-02,expense,40.5,USD\n"
+            "2026-01-03,Расход,1,EUR\n"
+        ),
+        "cash.csv",
+        user.id,
+    )
+
+    assert result.committed and result.inserted == 3
+    check_balances()
+
+
+# ---- билеты ----------------------------------------------------------------
+def _ticket(user, number, sale_date, total, **kw):
+    return TicketSale(
+        user_id=user.id,
+        ticket_number=number,
+        airline_code=kw.pop("airline_code", "HY"),
+        sale_date=sale_date,
+        total_supplier=Decimal(total),
+        our_fee_supplier=Decimal("5"),
+        currency=kw.pop("currency", "USD"),
+        **kw,
+    )
+
+
+def test_ticket_rollups_orm(user):
+    tickets = [
+        _ticket(user, "001", date(2026, 1, 10), "300"),
+        _ticket(user, "002", date(2026, 1, 20), "200", airline_code="SU"),
+        _ticket(user, "003", date(2026, 2, 1), "150"),
+        _ticket(user, "004", None, "90"),
+    ]
+    db.session.add_all(tickets)
+    db.session.commit()
+
+    tickets[0].total_supplier = Decimal("310")
+    tickets[1].sale_date = date(2026, 3, 1)
+    tickets[3].sale_date = date(2026, 2, 15)
+    db.session.commit()
+    db.session.delete(tickets[2])
+    db.session.commit()
+
+    check_tickets()
+    check_sales()
+
+
+def test_ticket_rollups_import(user):
+    db.session.add(_ticket(user, "100", date(2026, 1, 5), "50"))
+    db.session.commit()
+
+    result = bsp.import_file(
+        _csv(
+            "ticket,airline,issue_date,currency,fare,tax,our_fee\n"
+            "101,HY,2026-01-05,USD,100,20,5\n"
+            "102,SU,2026-02-07,EUR,80,,\n"
+            "100,HY,2026-01-05,USD,50,,\n"
+        ),
+        "bsp.csv",
+        user.id,
+    )
+
+    assert (result.inserted, result.duplicates) == (2, 1)
+    check_tickets()
+    check_sales()
+
+
+# ---- туры ------------------------------------------------------------------
+@pytest.mark.parametrize("model", [InternalTour, ExternalTour])
+def test_tours_orm(user, model):
+    tours = [
+        model(
+            user_id=user.id,
+            direction="Самарканд",
+            start_date=date(2026, 5, 1),
+            end_date=date(2026, 5, 4),
+            sale_price=Decimal("500"),
+            cost=Decimal("400"),
+        ),
+        model(
+            user_id=user.id,
+            direction="Бухара",
+            start_date=date(2026, 5, 3),
+            sale_price=Decimal("120"),
+        ),
+        model(user_id=user.id, direction="Хива", start_date=date(2026, 6, 1)),
+    ]
+    db.session.add_all(tours)
+    db.session.commit()
+
+    tours[0].end_date = date(2026, 5, 2)
+    tours[1].direction = "Хива"
+    tours[1].sale_price = Decimal("150")
+    db.session.commit()
+    db.session.delete(tours[2])
+    db.session.commit()
+
+    check_occupancy()
+    check_sales()
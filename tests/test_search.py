@@ -0,0 +1,66 @@
+"""Индекс FTS5 (SQLite): синхронизация с журналом и проверка наличия таблицы."""
+
+from decimal import Decimal
+
+from sqlalchemy import event, text
+
+import search
+from extensions import db
+from models import CashOperation
+
+
+def _cash(user, description):
+    item = CashOperation(
+        user_id=user.id,
+        op_type="income",
+        amount=Decimal("10"),
+        currency="USD",
+        description=description,
+    )
+    db.session.add(item)
+    db.session.commit()
+    return item
+
+
+def _ids(query):
+    return [hit.id for hit in search.search(query, kinds=["cash"])]
+
+
+def test_description_change_reindexes(user):
+    item = _cash(user, "оплата визы")
+    assert _ids("визы") == [item.id]
+
+    item.description = "возврат билета"
+    db.session.commit()
+    assert _ids("визы") == []
+    assert _ids("билета") == [item.id]
+
+
+def test_other_fields_skip_index(user):
+    item = _cash(user, "оплата визы")
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.session.get_bind()
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        item.amount = Decimal("20")
+        db.session.commit()
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert statements
+    assert not [s for s in statements if search.FTS_TABLE in s]
+    assert _ids("визы") == [item.id]
+
+
+def test_missing_table_not_cached(app):
+    conn = db.session.connection()
+    conn.execute(text(f"DROP TABLE {search.FTS_TABLE}"))
+    conn.engine.__dict__.pop("_search_fts", None)
+    assert not search._uses_fts(conn)
+
+    conn.execute(text(search._FTS_DDL))
+    assert search._uses_fts(conn)
@@ -0,0 +1,96 @@
+# C:\tourismops\translit.py
+"""
+Поисковый ключ для ФИО: кириллица → латиница (ICAO 9303, как в
+паспортах и билетах), нижний регистр, без пунктуации и титулов, с
+выравниванием типичных вариантов латинского написания, чтобы
+«Юсупов Евгений», «YUSUPOV/YEVGENIY MR» и «Iusupov Evgenii» давали
+один и тот же ключ.
+"""
+
+import re
+import unicodedata
+
+_CYR = {
+    "а": "a",
+    "б": "b",
+    "в": "v",
+    "г": "g",
+    "д": "d",
+    "е": "e",
+    "ё": "e",
+    "ж": "zh",
+    "з": "z",
+    "и": "i",
+    "й": "i",
+    "к": "k",
+    "л": "l",
+    "м": "m",
+    "н": "n",
+    "о": "o",
+    "п": "p",
+    "р": "r",
+    "с": "s",
+    "т": "t",
+    "у": "u",
+    "ф": "f",
+    "х": "kh",
+    "ц": "ts",
+    "ч": "ch",
+    "ш": "sh",
+    "щ": "shch",
+    "ъ": "ie",
+    "ы": "y",
+    "ь": "",
+    "э": "e",
+    "ю": "iu",
+    "я": "ia",
+    # узбекская и таджикская кириллица
+    "ў": "o",
+    "қ": "k",
+    "ғ": "g",
+    "ҳ": "h",
+    "ӣ": "i",
+    "ӯ": "u",
+    "ҷ": "j",
+}
+_CYR_TABLE = str.maketrans(_CYR)
+
+# титулы из BSP/GDS: IVANOV/IVAN MR
+_TITLES = {"mr", "mrs", "ms", "miss", "mstr", "chd", "inf", "dr"}
+
+# выравнивание латинских вариантов; порядок важен
+_FOLD = (
+    (re.compile(r"\bye"), "e"),  # Yevgeniy / Evgenii
+    (re.compile(r"dzh|zh"), "j"),  # Zhasur / Jasur
+    (re.compile(r"kh"), "h"),  # Khamidov / Hamidov
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"tz"), "ts"),
+    (re.compile(r"x"), "ks"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"q"), "k"),
+    (re.compile(r"y"), "i"),  # Yusupov / Iusupov, -iy / -ii
+    (re.compile(r"(\w)\1+"), r"\1"),  # двойные буквы
+)
+_APOSTROPHES = re.compile(r"['`’‘ʻʼ]")
+_NON_WORD = re.compile(r"[^a-z ]+")
+
+
+def name_key(value) -> str | None:
+    """Ключ поиска для ФИО или None для пустого значения."""
+    if not value:
+        return None
+    text = str(value).lower().replace("/", " ").translate(_CYR_TABLE)
+    # диакритика латиницы (ş, ğ, é …) и апострофы o'/g'
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _NON_WORD.sub(" ", _APOSTROPHES.sub("", text))
+    words = [w for w in text.split() if w not in _TITLES]
+    text = " ".join(words)
+    for pattern, repl in _FOLD:
+        text = pattern.sub(repl, text)
+    return text[:255] or None
+
+
+def prefix_range(prefix: str):
+    """(нижняя, верхняя) граница для поиска по префиксу через индекс."""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)